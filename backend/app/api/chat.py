@@ -0,0 +1,67 @@
+import time
+
+from fastapi import APIRouter, Depends, status, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from sqlmodel import Session
+
+from app.core.database import get_session
+from app.llm.model_client import get_model_client
+from app.schemas.chat import ChatStreamRequest
+from app.services.rag.rag_chat_service import RagChatService, stream_chat_answer
+
+# 创建路由实例，设置前缀和标签
+router = APIRouter(prefix="/chat", tags=["chat"])
+
+
+@router.post("/stream", status_code=status.HTTP_200_OK)
+def chat_stream(
+        request: ChatStreamRequest,
+        http_request: Request,
+        db: Session = Depends(get_session)
+):
+    """
+    基于知识库的流式问答
+
+    先在请求线程中完成检索，检索失败时直接返回错误状态码；之后以 Server-Sent Events 推送：
+    sources（参考的知识块）、逐段的 token、done（检索耗时、首字耗时、总耗时和 token 数），生成失败时推送 error。
+    客户端断开连接后停止生成。
+
+    Args:
+        request (ChatStreamRequest): 用户ID、问题、知识库范围、参考数量和过滤条件
+        http_request (Request): 原始请求，用于检查客户端是否已断开
+        db (Session): 数据库会话
+
+    Returns:
+        StreamingResponse: text/event-stream 格式的流式响应
+
+    Raises:
+        HTTPException: 当参数不合法或检索过程中出现错误时抛出异常
+    """
+    started = time.perf_counter()
+    logger.info(f"知识库问答: user_id={request.user_id}, knowledge_ids={request.knowledge_ids}, k={request.k}")
+
+    try:
+        prepared = RagChatService(db_session=db).prepare(
+            request.user_id, request.query, knowledge_ids=request.knowledge_ids, k=request.k,
+            filters=request.filters)
+    except ValueError as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        error_msg = f"知识库问答检索失败: {str(e)}"
+        logger.error("{}", error_msg, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=error_msg
+        )
+
+    return StreamingResponse(
+        stream_chat_answer(get_model_client(), prepared, started, is_disconnected=http_request.is_disconnected),
+        media_type="text/event-stream",
+        # 禁止缓存和反向代理（如 Nginx）缓冲，保证每段输出立即送达客户端
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
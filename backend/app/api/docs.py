@@ -9,11 +9,33 @@ from sqlmodel import Session
 from app.core.database import get_session
 from app.crud.docs import DocsCRUD
 from app.crud.knowledge import KnowledgeBaseDB
+from app.services.rag.document_parsers import document_parser_registry
 from app.services.rag.document_processing_service import DocumentProcessingService
 
 router = APIRouter(prefix="/docs", tags=["docs"])
 
 
+def _check_file_types(files: List[UploadFile]) -> None:
+    """
+    在写入文件前检查文件类型，存在没有解析器的文件类型时拒绝整个请求
+
+    Args:
+        files (List[UploadFile]): 上传的文件列表
+
+    Raises:
+        HTTPException: 存在不支持的文件类型
+    """
+    unsupported_files = [file.filename for file in files
+                         if not document_parser_registry.is_supported((file.filename or "").rstrip(". "))]
+    if unsupported_files:
+        logger.warning(f"拒绝不支持的文件类型: {unsupported_files}")
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"不支持的文件类型: {', '.join(unsupported_files)}，"
+                   f"支持的类型: {', '.join(document_parser_registry.supported_types)}"
+        )
+
+
 @router.get("/document_list", status_code=status.HTTP_200_OK)
 def document_list(
         knowledge_id: int,
@@ -101,6 +123,7 @@ async def add_documents_to_knowledge_base(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="知识库未找到"
         )
+    _check_file_types(files)
 
     document_processing_service = DocumentProcessingService(db_session=db)
     vector_store_type = knowledge_bases.vector_db_type.value if knowledge_bases.vector_db_type else "default_type"
@@ -112,6 +135,7 @@ async def add_documents_to_knowledge_base(
         "kb_uuid": knowledge_bases.uuid,
         "chunk_size": knowledge_bases.chunk_size,
         "chunk_overlap": knowledge_bases.chunk_overlap,
+        "splitter_type": knowledge_bases.splitter_type.value,
         "vector_store_type": vector_store_type,
         "tags": knowledge_bases.tags
     }
@@ -203,6 +227,8 @@ def delete_document(
     """
     删除指定文档及其相关知识块
 
+    文档被标记删除后立即从所有查询中隐藏，向量、文件和数据库记录由后台回收器清理。
+
     Args:
         document_id (int): 文档ID
         db (Session): 数据库会话
@@ -226,15 +252,8 @@ def delete_document(
             )
 
         document_processing_service = DocumentProcessingService(db_session=db)
-        logger.info(f"从向量存储中删除文档 {document_id}")
         document_processing_service.delete_document(document_id=document_id, knowledge_id=document.knowledge_base_id)
 
-        # 先删除相关知识块，再删除文档
-        logger.info(f"删除文档 {document_id} 相关的知识块")
-        docs_crud.delete_chunks_by_document_id(document_id)
-        logger.info(f"删除文档 {document_id}")
-        docs_crud.delete_document(document_id)
-
         logger.info(f"成功删除文档 {document_id}")
         return JSONResponse(
             content={
@@ -254,6 +273,60 @@ def delete_document(
         )
 
 
+@router.put("/replace_document/{document_id}", status_code=status.HTTP_200_OK)
+async def replace_document(
+        document_id: int,
+        file: UploadFile = File(...),
+        db: Session = Depends(get_session),
+):
+    """
+    用新版本文件替换指定文档，只对变化的知识块重新嵌入
+
+    Args:
+        document_id (int): 文档ID
+        file (UploadFile): 新版本文件
+        db (Session): 数据库会话
+
+    Returns:
+        JSONResponse: 包含新增、删除和复用知识块数量的响应
+    """
+    logger.info(f"开始替换文档 {document_id}")
+
+    document = DocsCRUD(db).get_document_by_id(document_id)
+    if not document:
+        logger.warning(f"尝试替换不存在的文档 {document_id}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="文档未找到"
+        )
+    _check_file_types([file])
+
+    try:
+        document_processing_service = DocumentProcessingService(db_session=db)
+        result = await document_processing_service.replace_document(
+            document_id=document_id,
+            knowledge_id=document.knowledge_base_id,
+            file=file
+        )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"文档 {document_id} 替换失败 - 错误信息: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"文档替换失败: {str(e)}"
+        )
+
+    logger.info(f"成功替换文档 {document_id}")
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "文档替换成功",
+            "data": result
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
 @router.get("/download/{document_id}", status_code=status.HTTP_200_OK)
 def download_document(
         document_id: int,
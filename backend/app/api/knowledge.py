@@ -1,6 +1,7 @@
 import uuid
+from typing import Optional
 
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, BackgroundTasks
 from fastapi.responses import JSONResponse
 from loguru import logger
 from sqlmodel import Session
@@ -8,8 +9,19 @@ from sqlmodel import Session
 from app.core.database import get_session
 from app.crud.docs import DocsCRUD
 from app.crud.knowledge import KnowledgeBaseDB
-from app.models.knowledge import KnowledgeBaseStatus
-from app.schemas.knowledge import KnowledgeBaseCreate, KnowledgeBaseUpdate, KnowledgeStatusUpdate
+from app.models.knowledge import KnowledgeBaseStatus, VectorDatabaseType
+from app.schemas.knowledge import (
+    KnowledgeBaseCreate, KnowledgeBaseUpdate, KnowledgeStatusUpdate, BatchSearchRequest, FederatedSearchRequest
+)
+from app.core.config import settings
+from app.llm.projected_embeddings import load_projection
+from app.services.multi_rag.federated_search_service import FederatedSearchService
+from app.services.rag.document_processing_service import DocumentProcessingService, run_knowledge_base_reindex
+from app.services.rag.embedding_projection_service import EmbeddingProjectionService, run_embedding_projection
+from app.services.rag.knowledge_search_service import KnowledgeSearchService
+from app.services.rag.knowledge_task_registry import knowledge_task_registry, REINDEX_TASK
+from app.services.rag.search_shard_service import check_shards_supported, run_search_shard_build
+from app.services.rag.vector_store_migration_service import run_vector_store_migration
 
 # 创建路由实例，设置前缀和标签
 router = APIRouter(prefix="/knowledge", tags=["knowledge"])
@@ -59,7 +71,8 @@ def create_knowledge_base(req: KnowledgeBaseCreate, db: Session = Depends(get_se
             chunk_size=req.chunk_size,
             tags=req.tags,
             chunk_overlap=req.chunk_overlap,
-            is_public=req.is_public
+            is_public=req.is_public,
+            splitter_type=req.splitter_type
         )
 
         logger.success(f"知识库创建成功: {req.name}, ID: {db_knowledge_base.id}")
@@ -122,7 +135,9 @@ def list_knowledge_bases(user_id: int, db: Session = Depends(get_session)):
                 "tags": kb.tags,
                 "chunk_size": kb.chunk_size,
                 "chunk_overlap": kb.chunk_overlap,
+                "splitter_type": kb.splitter_type.value,
                 "vector_db_type": kb.vector_db_type.value,
+                "migration_target": kb.migration_target.value if kb.migration_target else None,
                 "status": kb.status.value,
                 "query_count":kb.query_count,
                 "document_count": doc_stats["document_count"],
@@ -155,20 +170,26 @@ def list_knowledge_bases(user_id: int, db: Session = Depends(get_session)):
 @router.put("/update_knowledge", status_code=status.HTTP_200_OK)
 def update_knowledge_base(
         req: KnowledgeBaseUpdate,
+        background_tasks: BackgroundTasks,
         db: Session = Depends(get_session)
 ):
     """
     更新知识库信息
 
+    切片参数或切分器类型发生变化时，在后台按新配置重新切分知识库中的全部文档，正在重新切分时
+    合并为当前任务结束后的一次重跑；向量数据库类型发生变化时，在后台把已有向量迁移到新的向量数据库，
+    迁移完成后才切换类型。同一知识库有降维、构建分片等后台任务或正在迁移时，不能修改切片参数或发起迁移。
+
     Args:
         req (KnowledgeBaseUpdate): 包含更新信息的请求体
+        background_tasks (BackgroundTasks): 后台任务
         db (Session): 数据库会话
 
     Returns:
         JSONResponse: 返回更新结果
 
     Raises:
-        HTTPException: 当知识库不存在或更新过程中出现错误时抛出异常
+        HTTPException: 当知识库不存在、与正在运行的后台任务冲突或更新过程中出现错误时抛出异常
     """
     logger.info(f"开始更新知识库: id={req.id}, name={req.name}")
     logger.debug(f"更新参数: {req.dict()}")
@@ -200,29 +221,81 @@ def update_knowledge_base(
                 detail=warning_msg
             )
 
-        # 执行更新操作
-        logger.info(f"正在更新知识库: id={req.id}")
-        kb_db.update_knowledge_base(
-            knowledge_id=req.id,
-            name=req.name,
-            description=req.description,
-            vector_db_type=req.vector_db_type,
-            chunk_size=req.chunk_size,
-            tags=req.tags,
-            chunk_overlap=req.chunk_overlap,
-            is_public=req.is_public
-        )
+        # 重新切分和迁移都会整库改写向量：检查同一知识库的后台任务、修改配置和登记任务在同一把锁内完成
+        with knowledge_task_registry.lock:
+            db.refresh(existing_kb)
+            # 记录更新前的切片参数，用于判断是否需要重新切分
+            chunking_changed = ((req.chunk_size is not None and req.chunk_overlap is not None
+                                 and (existing_kb.chunk_size, existing_kb.chunk_overlap) != (req.chunk_size, req.chunk_overlap))
+                                or (req.splitter_type is not None and req.splitter_type != existing_kb.splitter_type))
+            # 向量数据库类型不在这里直接修改，由迁移任务复制完向量后切换
+            vector_db_changed = req.vector_db_type is not None and req.vector_db_type != existing_kb.vector_db_type
+            if vector_db_changed and existing_kb.migration_target is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"知识库正在迁移到 {existing_kb.migration_target.value}，请等待迁移完成"
+                )
+            if chunking_changed and vector_db_changed:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="切片参数和向量数据库类型不能同时修改，请等待重新切分完成后再迁移"
+                )
+            running_task = knowledge_task_registry.get_running(req.id)
+            if vector_db_changed and running_task is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"知识库正在{running_task}，请等待完成后再迁移"
+                )
+            # 正在重新切分时合并为结束后的一次重跑；其他后台任务或迁移进行中时拒绝修改切片参数
+            if chunking_changed and running_task != REINDEX_TASK:
+                try:
+                    knowledge_task_registry.check_idle(existing_kb)
+                except ValueError as error:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail=f"{str(error)}，请等待完成后再修改切片参数"
+                    )
+
+            # 执行更新操作
+            logger.info(f"正在更新知识库: id={req.id}")
+            kb_db.update_knowledge_base(
+                knowledge_id=req.id,
+                name=req.name,
+                description=req.description,
+                vector_db_type=existing_kb.vector_db_type,
+                chunk_size=req.chunk_size,
+                tags=req.tags,
+                chunk_overlap=req.chunk_overlap,
+                is_public=req.is_public,
+                splitter_type=req.splitter_type
+            )
 
-        logger.success(f"知识库更新成功: id={req.id}")
+            logger.success(f"知识库更新成功: id={req.id}")
+
+            msg = "知识库更新成功"
+            if chunking_changed:
+                if knowledge_task_registry.claim(existing_kb, REINDEX_TASK):
+                    logger.info(f"知识库 {req.id} 切片参数已变化，提交后台重新切分任务")
+                    background_tasks.add_task(run_knowledge_base_reindex, req.id)
+                    msg = "知识库更新成功，正在后台按新的切片参数重新切分文档"
+                else:
+                    logger.info(f"知识库 {req.id} 正在重新切分，切片参数的变化合并为当前任务结束后的一次重跑")
+                    msg = "知识库更新成功，当前的重新切分完成后将按新的切片参数再重新切分一次"
+            if vector_db_changed and kb_db.start_vector_store_migration(req.id, req.vector_db_type):
+                logger.info(f"知识库 {req.id} 向量数据库类型变更为 {req.vector_db_type.value}，提交后台迁移任务")
+                background_tasks.add_task(run_vector_store_migration, req.id)
+                msg = f"知识库更新成功，正在后台迁移到 {req.vector_db_type.value}"
 
         return JSONResponse(
             content={
                 "code": status.HTTP_200_OK,
-                "msg": "知识库更新成功",
+                "msg": msg,
                 "data": None
             },
             status_code=status.HTTP_200_OK
         )
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         error_msg = f"更新知识库失败: {str(e)}"
@@ -294,3 +367,363 @@ def update_knowledge_base_status(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
         )
+
+
+@router.delete("/delete_knowledge/{knowledge_id}", status_code=status.HTTP_200_OK)
+def delete_knowledge_base(
+        knowledge_id: int,
+        db: Session = Depends(get_session)
+):
+    """
+    删除知识库
+
+    知识库及其文档被标记删除后立即从所有查询中隐藏，向量集合、本地文件和数据库记录由后台回收器清理。
+
+    Args:
+        knowledge_id (int): 知识库ID
+        db (Session): 数据库会话
+
+    Returns:
+        JSONResponse: 返回删除结果
+
+    Raises:
+        HTTPException: 当知识库不存在或删除过程中出现错误时抛出异常
+    """
+    logger.info(f"开始删除知识库: id={knowledge_id}")
+
+    if not KnowledgeBaseDB(db).get_knowledge_base_by_id(knowledge_id):
+        error_msg = f"知识库 ID {knowledge_id} 不存在"
+        logger.error(error_msg)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=error_msg
+        )
+
+    try:
+        DocumentProcessingService(db_session=db).delete_knowledge_base(knowledge_id=knowledge_id)
+    except Exception as e:
+        db.rollback()
+        error_msg = f"删除知识库失败: {str(e)}"
+        logger.error("{}", error_msg, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=error_msg
+        )
+
+    logger.success(f"知识库删除成功: id={knowledge_id}")
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "知识库删除成功",
+            "data": None
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.post("/migrate_vector_store/{knowledge_id}", status_code=status.HTTP_200_OK)
+def migrate_vector_store(
+        knowledge_id: int,
+        target: VectorDatabaseType,
+        background_tasks: BackgroundTasks,
+        db: Session = Depends(get_session)
+):
+    """
+    将知识库的向量迁移到另一个向量数据库
+
+    迁移期间写入同时落到新旧两个向量数据库，检索仍使用原向量数据库，复制和校验完成后切换。
+    知识库已在迁移到同一目标时重新提交迁移任务，用于服务重启后继续未完成的迁移。
+    知识库正在重新切分、降维或构建分片时不能发起迁移。
+
+    Args:
+        knowledge_id (int): 知识库ID
+        target (VectorDatabaseType): 目标向量数据库类型
+        background_tasks (BackgroundTasks): 后台任务
+        db (Session): 数据库会话
+
+    Returns:
+        JSONResponse: 返回迁移任务提交结果
+
+    Raises:
+        HTTPException: 当知识库不存在、已使用目标类型、正在迁移到其他目标或有其他后台任务时抛出异常
+    """
+    logger.info(f"迁移知识库向量数据库: id={knowledge_id}, target={target.value}")
+
+    kb_db = KnowledgeBaseDB(db)
+    knowledge_base = kb_db.get_knowledge_base_by_id(knowledge_id)
+    if not knowledge_base:
+        error_msg = f"知识库 ID {knowledge_id} 不存在"
+        logger.error(error_msg)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=error_msg
+        )
+
+    if target == VectorDatabaseType.MILVUS and settings.milvus_layout == "shared" \
+            and load_projection(knowledge_id) is not None:
+        error_msg = f"知识库 ID {knowledge_id} 已启用向量降维，不能迁移到 Milvus 共享集合"
+        logger.warning(error_msg)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=error_msg
+        )
+
+    # 检查后台任务和标记迁移在同一把锁内完成，标记后重新切分等任务不会再启动
+    with knowledge_task_registry.lock:
+        running_task = knowledge_task_registry.get_running(knowledge_id)
+        if running_task is not None:
+            error_msg = f"知识库 ID {knowledge_id} 正在{running_task}，请等待完成后再迁移"
+            logger.warning(error_msg)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=error_msg
+            )
+        if knowledge_base.migration_target != target and not kb_db.start_vector_store_migration(knowledge_id, target):
+            db.refresh(knowledge_base)
+            error_msg = (f"知识库 ID {knowledge_id} 已使用 {target.value}" if knowledge_base.vector_db_type == target
+                         else f"知识库 ID {knowledge_id} 正在迁移到 {knowledge_base.migration_target.value}")
+            logger.warning(error_msg)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=error_msg
+            )
+
+    background_tasks.add_task(run_vector_store_migration, knowledge_id)
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": f"已提交迁移任务，正在后台迁移到 {target.value}",
+            "data": None
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.post("/project_embeddings/{knowledge_id}", status_code=status.HTTP_200_OK)
+def project_embeddings(
+        knowledge_id: int,
+        dimension: int,
+        background_tasks: BackgroundTasks,
+        method: str = "pca",
+        db: Session = Depends(get_session)
+):
+    """
+    为知识库启用向量降维
+
+    从知识库已有向量中取样拟合 PCA（或对支持 Matryoshka 的嵌入模型直接截断），在后台把全部向量投影到目标维度，
+    此后写入和检索都使用同一投影。降维不可逆。
+
+    Args:
+        knowledge_id (int): 知识库ID
+        dimension (int): 目标维度
+        background_tasks (BackgroundTasks): 后台任务
+        method (str): 降维方式，pca 或 truncate
+        db (Session): 数据库会话
+
+    Returns:
+        JSONResponse: 返回降维任务提交结果
+
+    Raises:
+        HTTPException: 当知识库不存在或不支持降维时抛出异常
+    """
+    logger.info(f"知识库向量降维: id={knowledge_id}, method={method}, dimension={dimension}")
+
+    knowledge_base = KnowledgeBaseDB(db).get_knowledge_base_by_id(knowledge_id)
+    if not knowledge_base:
+        error_msg = f"知识库 ID {knowledge_id} 不存在"
+        logger.error(error_msg)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=error_msg
+        )
+
+    if dimension <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="目标维度必须为正整数"
+        )
+    try:
+        EmbeddingProjectionService.check_supported(knowledge_base, method)
+    except ValueError as error:
+        logger.warning(str(error))
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(error)
+        )
+
+    background_tasks.add_task(run_embedding_projection, knowledge_id, method, dimension)
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": f"已提交降维任务，正在后台将向量降至 {dimension} 维",
+            "data": None
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.post("/build_search_shards/{knowledge_id}", status_code=status.HTTP_200_OK)
+def build_search_shards(
+        knowledge_id: int,
+        background_tasks: BackgroundTasks,
+        shard_count: Optional[int] = None,
+        db: Session = Depends(get_session)
+):
+    """
+    为知识库构建本地分片，用于多进程分片检索
+
+    把本地集合（Chroma 或 Milvus Lite）的向量导出为内存映射的分片段，检索时由进程池并行扫描。
+    分片是构建时的快照，知识库有写入或删除后自动失效，需要重新构建。
+
+    Args:
+        knowledge_id (int): 知识库ID
+        background_tasks (BackgroundTasks): 后台任务
+        shard_count (Optional[int]): 分片数量，默认取配置
+        db (Session): 数据库会话
+
+    Returns:
+        JSONResponse: 返回构建任务提交结果
+
+    Raises:
+        HTTPException: 当知识库不存在或不支持分片检索时抛出异常
+    """
+    logger.info(f"构建知识库分片: id={knowledge_id}, shard_count={shard_count}")
+
+    knowledge_base = KnowledgeBaseDB(db).get_knowledge_base_by_id(knowledge_id)
+    if not knowledge_base:
+        error_msg = f"知识库 ID {knowledge_id} 不存在"
+        logger.error(error_msg)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=error_msg
+        )
+
+    if shard_count is not None and shard_count <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="分片数量必须为正整数"
+        )
+    try:
+        check_shards_supported(knowledge_base)
+    except ValueError as error:
+        logger.warning(str(error))
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(error)
+        )
+
+    background_tasks.add_task(run_search_shard_build, knowledge_id, shard_count)
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "已提交分片构建任务，正在后台构建",
+            "data": None
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.post("/batch_search/{knowledge_id}", status_code=status.HTTP_200_OK)
+def batch_search(
+        knowledge_id: int,
+        request: BatchSearchRequest,
+        db: Session = Depends(get_session)
+):
+    """
+    在知识库中批量检索
+
+    全部查询一次批量嵌入，每种向量数据库只发起一次多向量检索，适合评测任务和智能体流程一次提交大量查询。
+    已标记删除、等待回收的文档不会出现在结果中。
+
+    Args:
+        knowledge_id (int): 知识库ID
+        request (BatchSearchRequest): 查询列表、每个查询的返回数量和过滤条件
+        db (Session): 数据库会话
+
+    Returns:
+        JSONResponse: 返回与查询顺序一致的检索结果
+
+    Raises:
+        HTTPException: 当知识库不存在或检索过程中出现错误时抛出异常
+    """
+    logger.info(f"知识库批量检索: id={knowledge_id}, 查询数={len(request.queries)}, k={request.k}")
+
+    if not KnowledgeBaseDB(db).get_knowledge_base_by_id(knowledge_id):
+        error_msg = f"知识库 ID {knowledge_id} 不存在"
+        logger.error(error_msg)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=error_msg
+        )
+
+    try:
+        results = KnowledgeSearchService(db_session=db).batch_search(
+            knowledge_id, request.queries, k=request.k, filters=request.filters)
+    except Exception as e:
+        error_msg = f"批量检索失败: {str(e)}"
+        logger.error("{}", error_msg, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=error_msg
+        )
+
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "检索成功",
+            "data": [{"query": query, "results": query_results}
+                     for query, query_results in zip(request.queries, results)]
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.post("/federated_search", status_code=status.HTTP_200_OK)
+def federated_search(
+        request: FederatedSearchRequest,
+        db: Session = Depends(get_session)
+):
+    """
+    在多个知识库中联合检索
+
+    查询只嵌入一次，各知识库（可混合 Chroma 和 Milvus）并发检索，单个知识库超时或失败时跳过并在结果中标明，
+    各知识库的分数归一化后合并。
+
+    Args:
+        request (FederatedSearchRequest): 用户ID、查询文本、知识库范围、返回数量、过滤条件和归一化方式
+        db (Session): 数据库会话
+
+    Returns:
+        JSONResponse: 返回合并后的检索结果和每个知识库的检索状态
+
+    Raises:
+        HTTPException: 当参数不合法或检索过程中出现错误时抛出异常
+    """
+    logger.info(f"多知识库联合检索: user_id={request.user_id}, knowledge_ids={request.knowledge_ids}, k={request.k}")
+
+    try:
+        data = FederatedSearchService(db_session=db).search(
+            request.user_id, request.query, knowledge_ids=request.knowledge_ids, k=request.k,
+            filters=request.filters, normalization=request.normalization)
+    except ValueError as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        error_msg = f"联合检索失败: {str(e)}"
+        logger.error("{}", error_msg, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=error_msg
+        )
+
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "检索成功",
+            "data": data
+        },
+        status_code=status.HTTP_200_OK
+    )
@@ -0,0 +1,195 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, status, HTTPException, BackgroundTasks, Query
+from fastapi.responses import JSONResponse
+from loguru import logger
+
+from app.core.loop_monitor import loop_lag_monitor
+from app.core.security import verify_admin_token
+from app.services.rag.chroma_maintenance_service import chroma_maintenance, run_chroma_maintenance
+from app.services.rag.document_parsers import document_parser_registry
+from app.services.rag.rag_chat_service import chat_stream_stats
+from app.services.rag.tombstone_collector import tombstone_collector
+from app.vector_store.collection_manager import milvus_collection_manager
+from app.vector_store.sharded_search import sharded_search_pool
+
+# 运维监控接口，需携带 X-Admin-Token 请求头
+router = APIRouter(prefix="/monitor", tags=["monitor"], dependencies=[Depends(verify_admin_token)])
+
+
+@router.get("/loop_lag", status_code=status.HTTP_200_OK)
+def get_loop_lag_stats():
+    """
+    获取事件循环延迟统计
+
+    Returns:
+        JSONResponse: 包含延迟分位数、阻塞次数和最近阻塞调用栈的响应
+    """
+    logger.info("获取事件循环延迟统计")
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "查询成功",
+            "data": loop_lag_monitor.get_stats()
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.post("/gc", status_code=status.HTTP_200_OK)
+def run_tombstone_collector():
+    """
+    立即执行一轮已删除数据回收
+
+    Returns:
+        JSONResponse: 包含本轮回收的知识库数量、文档数量、失败数量、正在退避的数量和耗时的响应
+    """
+    logger.info("手动触发已删除数据回收")
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "回收完成",
+            "data": tombstone_collector.collect_once()
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.get("/milvus_collections", status_code=status.HTTP_200_OK)
+def get_milvus_collection_stats():
+    """
+    获取 Milvus 集合加载统计
+
+    未设置加载预算（MILVUS_MAX_LOADED_COLLECTIONS、MILVUS_MAX_LOADED_MEMORY_MB）时不记录，统计均为0。
+
+    Returns:
+        JSONResponse: 包含加载预算、命中/冷加载/释放次数和已加载集合列表的响应
+    """
+    logger.info("获取Milvus集合加载统计")
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "查询成功",
+            "data": milvus_collection_manager.get_stats()
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.get("/sharded_search", status_code=status.HTTP_200_OK)
+def get_sharded_search_stats():
+    """
+    获取多进程分片检索统计
+
+    Returns:
+        JSONResponse: 包含工作进程数、进程池是否已启动、查询次数和平均耗时的响应
+    """
+    logger.info("获取分片检索统计")
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "查询成功",
+            "data": sharded_search_pool.get_stats()
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.get("/chat_stream", status_code=status.HTTP_200_OK)
+def get_chat_stream_stats():
+    """
+    获取知识库问答流式输出统计
+
+    Returns:
+        JSONResponse: 包含完成/取消/失败请求数、输出 token 总数和首字耗时分位数的响应
+    """
+    logger.info("获取问答流式输出统计")
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "查询成功",
+            "data": chat_stream_stats.get_stats()
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.get("/parsers", status_code=status.HTTP_200_OK)
+def get_parser_stats():
+    """
+    获取文档解析器统计
+
+    Returns:
+        JSONResponse: 包含支持的文件类型和各文件类型的解析文件数、页数、耗时和页/秒的响应
+    """
+    logger.info("获取文档解析器统计")
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "查询成功",
+            "data": {
+                "supported_types": document_parser_registry.supported_types,
+                "stats": document_parser_registry.get_stats(),
+            }
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.get("/chroma", status_code=status.HTTP_200_OK)
+def get_chroma_stats():
+    """
+    获取 Chroma 持久化目录的维护统计
+
+    Returns:
+        JSONResponse: 包含各集合大小、有效/已删除记录比例、索引健康状态、SQLite 空闲页和上次维护结果的响应
+    """
+    logger.info("获取Chroma维护统计")
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "查询成功",
+            "data": chroma_maintenance.collect_stats()
+        },
+        status_code=status.HTTP_200_OK
+    )
+
+
+@router.post("/chroma/maintenance", status_code=status.HTTP_200_OK)
+def start_chroma_maintenance(
+        background_tasks: BackgroundTasks,
+        collections: Optional[List[str]] = Query(None),
+        force: bool = False,
+        vacuum: bool = True
+):
+    """
+    在后台执行一轮 Chroma 维护：压缩碎片化的集合、删除孤立段目录、VACUUM 元数据库
+
+    Args:
+        background_tasks (BackgroundTasks): 后台任务
+        collections (Optional[List[str]]): 只处理这些集合，默认处理全部碎片化的集合
+        force (bool): 指定集合时忽略碎片化判断，直接压缩
+        vacuum (bool): 是否对 SQLite 元数据库执行 VACUUM
+
+    Returns:
+        JSONResponse: 返回维护任务提交结果，执行结果通过 GET /monitor/chroma 的 last_run 查看
+
+    Raises:
+        HTTPException: 已有维护任务在运行时抛出异常
+    """
+    logger.info(f"手动触发Chroma维护: collections={collections}, force={force}, vacuum={vacuum}")
+    if chroma_maintenance.running:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Chroma维护任务正在运行"
+        )
+
+    background_tasks.add_task(run_chroma_maintenance, collection_names=collections, force=force, vacuum=vacuum)
+    return JSONResponse(
+        content={
+            "code": status.HTTP_200_OK,
+            "msg": "已提交维护任务，正在后台执行",
+            "data": None
+        },
+        status_code=status.HTTP_200_OK
+    )
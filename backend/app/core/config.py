@@ -1,5 +1,6 @@
 import os
 from functools import lru_cache
+from typing import Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -18,6 +19,8 @@ class Settings(BaseSettings):
     mysql_host: str = os.getenv("MYSQL_HOST")
     mysql_port: int = os.getenv("MYSQL_PORT")
     mysql_db: str = os.getenv("MYSQL_DB")
+    # 完整数据库连接串，设置后优先于MYSQL配置（如本地基准测试使用 sqlite:///bench.db）
+    sqlalchemy_database_url: Optional[str] = os.getenv("DATABASE_URL")
 
     # JWT 配置
     jwt_secret_key: str = os.getenv("JWT_SECRET_KEY")
@@ -31,25 +34,119 @@ class Settings(BaseSettings):
 
     # llama_index 元数据配置
     metadata_exclude_fields: str = os.getenv("METADATA_EXCLUDE_FIELDS")
+    # 文档解析：流式解析器每页（块）的最大字符数；除内置解析器外交给 SimpleDirectoryReader 解析的文件类型
+    document_parser_block_chars: int = int(os.getenv("DOCUMENT_PARSER_BLOCK_CHARS", 20000))
+    document_parser_fallback_types: str = os.getenv("DOCUMENT_PARSER_FALLBACK_TYPES", "pptx,epub,html,htm,json,ipynb")
+    # 近重复知识块检测：SimHash 海明距离不超过阈值视为近重复，短于最小字符数的块不参与；
+    # 范围 document 只在文档内去重，knowledge_base 同时与知识库已有的块比较；
+    # 文档内的近重复块 collapse 保留记录但不嵌入，skip 直接丢弃（跨文档的近重复块总是 collapse）。
+    # knowledge_base 范围下近重复块的内容只能通过其他文档的代表块检索到：按 document_id 过滤、
+    # 或代表块所在文档已删除等待回收时，这部分内容检索不到，只适合不按文档过滤检索的知识库
+    chunk_dedup_enabled: bool = os.getenv("CHUNK_DEDUP_ENABLED", "true").lower() == "true"
+    chunk_dedup_max_distance: int = int(os.getenv("CHUNK_DEDUP_MAX_DISTANCE", 3))
+    chunk_dedup_min_chars: int = int(os.getenv("CHUNK_DEDUP_MIN_CHARS", 50))
+    chunk_dedup_scope: str = os.getenv("CHUNK_DEDUP_SCOPE", "document")
+    chunk_dedup_mode: str = os.getenv("CHUNK_DEDUP_MODE", "collapse")
 
     # LLM 配置
     dashscope_api_key: str = os.getenv("DASHSCOPE_API_KEY")
     llm_base_url: str = os.getenv("LLM_BASE_URL")
     chat_model: str = os.getenv("CHAT_MODEL", "qwen-plus")
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-v2")
+    # 聊天模型提供方：dashscope 或 fake（逐字输出固定回答的假模型，用于本地测试），fake 模型每个字的输出间隔（秒）
+    llm_provider: str = os.getenv("LLM_PROVIDER", "dashscope")
+    fake_llm_token_delay: float = float(os.getenv("FAKE_LLM_TOKEN_DELAY", 0.02))
+    # 嵌入模型提供方：dashscope 或 fake（确定性假嵌入，用于本地基准测试）
+    embedding_provider: str = os.getenv("EMBEDDING_PROVIDER", "dashscope")
+    fake_embedding_dim: int = int(os.getenv("FAKE_EMBEDDING_DIM", 1536))
     rerank_model: str = os.getenv("RERANK_MODEL", "get-rerank-v2")
+    # 知识库向量降维：拟合 PCA 的样本量；支持 Matryoshka 截断（前若干维自成一体）的嵌入模型
+    embedding_projection_sample_size: int = int(os.getenv("EMBEDDING_PROJECTION_SAMPLE_SIZE", 5000))
+    embedding_matryoshka_models: str = os.getenv("EMBEDDING_MATRYOSHKA_MODELS", "text-embedding-v3,text-embedding-v4")
 
     # 向量数据库配置
     vector_file_path: str = os.getenv("VECTOR_FILE_PATH")
     # chroma
     chroma_file_path: str = os.getenv("CHROMA_FILE_PATH")
+    # Chroma 维护：压缩时每批复制的记录数、批间暂停（秒）、估算删除比例达到多少时压缩、切换后的宽限期（秒）
+    chroma_maintenance_batch_size: int = int(os.getenv("CHROMA_MAINTENANCE_BATCH_SIZE", 500))
+    chroma_maintenance_batch_pause: float = float(os.getenv("CHROMA_MAINTENANCE_BATCH_PAUSE", 0.2))
+    chroma_compact_deleted_ratio: float = float(os.getenv("CHROMA_COMPACT_DELETED_RATIO", 0.2))
+    chroma_maintenance_grace_seconds: float = float(os.getenv("CHROMA_MAINTENANCE_GRACE_SECONDS", 5))
     # milvus
     milvus_client: str = os.getenv("MILVUS_CLIENT")
     milvus_user: str = os.getenv("MILVUS_USER")
     milvus_password: str = os.getenv("MILVUS_PASSWORD")
+    # 集合布局：per_kb 每个知识库一个集合；shared 所有知识库共用一个以 kb_id 为分区键的集合
+    milvus_layout: str = os.getenv("MILVUS_LAYOUT", "per_kb")
+    milvus_shared_collection: str = os.getenv("MILVUS_SHARED_COLLECTION", "kb_shared")
+    milvus_num_partitions: int = int(os.getenv("MILVUS_NUM_PARTITIONS", 64))
+    # 集合加载预算：超出时释放最久未访问的集合，0 表示不限制
+    milvus_max_loaded_collections: int = int(os.getenv("MILVUS_MAX_LOADED_COLLECTIONS", 0))
+    milvus_max_loaded_memory_mb: float = float(os.getenv("MILVUS_MAX_LOADED_MEMORY_MB", 0))
+    # 批量删除向量时每批的ID/过滤值数量
+    vector_delete_batch_size: int = int(os.getenv("VECTOR_DELETE_BATCH_SIZE", 1000))
+    # 写入向量时每批文档数量、并发批次数和失败重试
+    vector_insert_batch_size: int = int(os.getenv("VECTOR_INSERT_BATCH_SIZE", 256))
+    vector_insert_concurrency: int = int(os.getenv("VECTOR_INSERT_CONCURRENCY", 4))
+    vector_insert_max_retries: int = int(os.getenv("VECTOR_INSERT_MAX_RETRIES", 3))
+    vector_insert_retry_backoff: float = float(os.getenv("VECTOR_INSERT_RETRY_BACKOFF", 1.0))
+    # Milvus 批量导入：单次写入文档数不少于阈值时改用 bulk insert，0 表示不启用
+    milvus_bulk_import_threshold: int = int(os.getenv("MILVUS_BULK_IMPORT_THRESHOLD", 0))
+    milvus_bulk_endpoint: Optional[str] = os.getenv("MILVUS_BULK_ENDPOINT")
+    milvus_bulk_bucket: str = os.getenv("MILVUS_BULK_BUCKET", "a-bucket")
+    milvus_bulk_access_key: Optional[str] = os.getenv("MILVUS_BULK_ACCESS_KEY")
+    milvus_bulk_secret_key: Optional[str] = os.getenv("MILVUS_BULK_SECRET_KEY")
+    milvus_bulk_secure: bool = os.getenv("MILVUS_BULK_SECURE", "false").lower() == "true"
+    milvus_bulk_timeout: float = float(os.getenv("MILVUS_BULK_TIMEOUT", 3600))
+    # 向量数据库迁移：每批复制的记录数；切换后等待进行中的写入完成再补齐并删除源集合的时间（秒）
+    vector_migration_batch_size: int = int(os.getenv("VECTOR_MIGRATION_BATCH_SIZE", 1000))
+    vector_migration_grace_seconds: float = float(os.getenv("VECTOR_MIGRATION_GRACE_SECONDS", 30))
+    # 本地集合多进程分片检索：是否启用、工作进程数（0 表示 CPU 核数）、默认分片数（0 表示等于工作进程数）
+    sharded_search_enabled: bool = os.getenv("SHARDED_SEARCH_ENABLED", "false").lower() == "true"
+    sharded_search_workers: int = int(os.getenv("SHARDED_SEARCH_WORKERS", 0))
+    sharded_search_shards: int = int(os.getenv("SHARDED_SEARCH_SHARDS", 0))
+    # 检索接口：单次批量检索的最大查询数、每个查询的最大返回数量
+    search_batch_max_queries: int = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", 500))
+    search_max_k: int = int(os.getenv("SEARCH_MAX_K", 100))
+    # 多知识库联合检索：单个知识库的检索超时（秒）、检索线程数、单次最多检索的知识库数量
+    federated_search_timeout: float = float(os.getenv("FEDERATED_SEARCH_TIMEOUT", 3.0))
+    federated_search_max_workers: int = int(os.getenv("FEDERATED_SEARCH_MAX_WORKERS", 16))
+    federated_search_max_knowledge_bases: int = int(os.getenv("FEDERATED_SEARCH_MAX_KNOWLEDGE_BASES", 50))
+    # 知识库问答：拼入提示词的知识块总字符数上限、统计首字耗时等指标的最近请求窗口
+    chat_max_context_chars: int = int(os.getenv("CHAT_MAX_CONTEXT_CHARS", 6000))
+    chat_stats_window_size: int = int(os.getenv("CHAT_STATS_WINDOW_SIZE", 1000))
+
+    # 运维配置
+    admin_token: Optional[str] = os.getenv("ADMIN_TOKEN")
+
+    # 性能分析配置
+    profiler_enabled: bool = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+    profiler_sample_rate: float = float(os.getenv("PROFILER_SAMPLE_RATE", 0))
+    profiler_interval: float = float(os.getenv("PROFILER_INTERVAL", 0.005))
+
+    # SQL监控配置
+    sql_slow_threshold_ms: float = float(os.getenv("SQL_SLOW_THRESHOLD_MS", 200))
+    sql_n_plus_one_threshold: int = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5))
+
+    # 事件循环监控配置
+    loop_monitor_enabled: bool = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+    loop_monitor_interval: float = float(os.getenv("LOOP_MONITOR_INTERVAL", 0.05))
+    loop_monitor_threshold_ms: float = float(os.getenv("LOOP_MONITOR_THRESHOLD_MS", 100))
+    loop_monitor_window_size: int = int(os.getenv("LOOP_MONITOR_WINDOW_SIZE", 6000))
+
+    # 删除数据回收配置
+    gc_enabled: bool = os.getenv("GC_ENABLED", "true").lower() == "true"
+    gc_interval: float = float(os.getenv("GC_INTERVAL", 30))
+    gc_batch_size: int = int(os.getenv("GC_BATCH_SIZE", 20))
+    gc_batch_pause: float = float(os.getenv("GC_BATCH_PAUSE", 1.0))
+    # 回收失败的知识库按失败次数指数退避（从 GC_INTERVAL 开始翻倍），最长间隔（秒）
+    gc_max_backoff: float = float(os.getenv("GC_MAX_BACKOFF", 3600))
 
     @property
     def database_url(self) -> str:
+        if self.sqlalchemy_database_url:
+            return self.sqlalchemy_database_url
         return (
             f"mysql+pymysql://{self.mysql_user}:{self.mysql_password}"
             f"@{self.mysql_host}:{self.mysql_port}/{self.mysql_db}"
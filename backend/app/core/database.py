@@ -2,13 +2,21 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.core.sql_monitor import install_sql_monitor
+
+# SQLite 连接需要允许跨线程使用（FastAPI 同步接口在线程池中执行）
+connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
 
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
     echo=False,
+    connect_args=connect_args,
 )
 
+# 注册SQL计时与N+1检测
+install_sql_monitor(engine)
+
 SessionLocal = sessionmaker(
     bind=engine,
     autoflush=False,
@@ -0,0 +1,135 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional, Dict, Any
+
+from loguru import logger
+
+from app.core.config import settings
+
+
+class EventLoopLagMonitor:
+    """
+    事件循环延迟监控器
+
+    - 探测协程每隔 interval 秒休眠一次，实际唤醒时间与预期的差值即为事件循环延迟
+    - 看门狗线程检查探测协程的心跳，阻塞超过阈值时抓取事件循环线程当前的调用栈，
+      从而定位在 async 函数中执行的阻塞调用（文件解析、同步HTTP、同步SQL等）
+    """
+
+    def __init__(self, interval: float, threshold_ms: float, window_size: int, max_stall_records: int = 20):
+        """
+        初始化事件循环延迟监控器
+
+        Args:
+            interval: 探测间隔（秒）
+            threshold_ms: 阻塞告警阈值（毫秒）
+            window_size: 用于计算分位数的延迟样本窗口大小
+            max_stall_records: 保留的最近阻塞记录数量
+        """
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self.lag_samples: deque = deque(maxlen=window_size)
+        self.recent_stalls: deque = deque(maxlen=max_stall_records)
+        self.stall_count = 0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        self._watchdog_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self) -> None:
+        """在当前事件循环中启动探测协程和看门狗线程"""
+        if self._probe_task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self._probe_task = asyncio.get_running_loop().create_task(self._probe())
+        self._watchdog_thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog_thread.start()
+        logger.info(f"事件循环延迟监控已启动，探测间隔: {self.interval}s, 阻塞阈值: {self.threshold_ms}ms")
+
+    async def stop(self) -> None:
+        """停止探测协程和看门狗线程"""
+        self._stop_event.set()
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        if self._watchdog_thread is not None:
+            self._watchdog_thread.join()
+            self._watchdog_thread = None
+        logger.info("事件循环延迟监控已停止")
+
+    async def _probe(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected_wakeup = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(loop.time() - expected_wakeup, 0) * 1000
+            self.lag_samples.append(lag_ms)
+            self._last_beat = time.monotonic()
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stop_event.wait(self.interval):
+            last_beat = self._last_beat
+            blocked_ms = (time.monotonic() - last_beat - self.interval) * 1000
+            if blocked_ms < self.threshold_ms or reported_beat == last_beat:
+                continue
+
+            # 同一次阻塞只记录一次调用栈
+            reported_beat = last_beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            self.stall_count += 1
+            self.recent_stalls.append({
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "blocked_ms": round(blocked_ms, 2),
+                "stack": stack,
+            })
+            logger.warning(f"事件循环阻塞已超过 {blocked_ms:.0f}ms，阻塞调用栈:\n{stack}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取事件循环延迟统计
+
+        Returns:
+            包含延迟分位数、阻塞次数和最近阻塞记录的字典
+        """
+        samples = sorted(self.lag_samples)
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            index = min(int(len(samples) * p), len(samples) - 1)
+            return round(samples[index], 2)
+
+        return {
+            "running": self._probe_task is not None,
+            "sample_count": len(samples),
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(samples[-1], 2) if samples else 0.0,
+            "threshold_ms": self.threshold_ms,
+            "stall_count": self.stall_count,
+            "recent_stalls": list(self.recent_stalls),
+        }
+
+
+# 创建全局监控实例
+loop_lag_monitor = EventLoopLagMonitor(
+    interval=settings.loop_monitor_interval,
+    threshold_ms=settings.loop_monitor_threshold_ms,
+    window_size=settings.loop_monitor_window_size,
+)
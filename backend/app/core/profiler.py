@@ -0,0 +1,157 @@
+import html
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional, Callable
+
+from loguru import logger
+
+
+class RequestSampler:
+    """
+    单请求采样分析器
+
+    后台线程按固定间隔抓取所有线程的调用栈（sys._current_frames），
+    只保留栈中包含目标端点函数的样本，因此同步端点（在线程池中执行）
+    和异步端点（在事件循环线程中执行）都能被采集到。
+    """
+
+    def __init__(self, interval: float, target_code_getter: Callable[[], Optional[object]]):
+        """
+        初始化采样分析器
+
+        Args:
+            interval: 采样间隔（秒）
+            target_code_getter: 返回目标端点代码对象的函数，路由完成前可返回None
+        """
+        self.interval = interval
+        self.target_code_getter = target_code_getter
+        self.stacks: Counter = Counter()
+        self.sample_count = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """启动采样线程"""
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止采样线程并记录总耗时"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self) -> None:
+        own_thread_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            target_code = self.target_code_getter()
+            if target_code is None:
+                continue
+
+            self.sample_count += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id:
+                    continue
+                stack = self._collect_stack(frame, target_code)
+                if stack:
+                    self.stacks[";".join(stack)] += 1
+
+    @staticmethod
+    def _collect_stack(frame, target_code) -> Optional[list]:
+        """从叶子帧回溯到根，返回根到叶子的帧描述；不包含目标端点时返回None"""
+        stack = []
+        matched = False
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            if code is target_code:
+                matched = True
+                break
+            frame = frame.f_back
+        if not matched:
+            return None
+        stack.reverse()
+        return stack
+
+    def to_collapsed(self) -> str:
+        """
+        导出为折叠栈格式，可直接用于 flamegraph.pl 或 speedscope
+
+        Returns:
+            折叠栈文本，每行为 "frame1;frame2;... 样本数"
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def to_html(self, title: str, top_n: int = 50) -> str:
+        """
+        导出为HTML报告，按自身耗时和累计耗时列出热点函数
+
+        Args:
+            title: 报告标题
+            top_n: 展示的热点函数数量
+
+        Returns:
+            HTML文本
+        """
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for frame_name in set(frames):
+                total_counts[frame_name] += count
+
+        total_samples = sum(self.stacks.values()) or 1
+
+        def render_rows(counter: Counter) -> str:
+            return "".join(
+                f"<tr><td>{count}</td><td>{count * 100 / total_samples:.1f}%</td>"
+                f"<td>{html.escape(name)}</td></tr>"
+                for name, count in counter.most_common(top_n)
+            )
+
+        table_head = "<tr><th>样本数</th><th>占比</th><th>函数</th></tr>"
+        return (
+            f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+            "<style>body{font-family:monospace}td,th{padding:2px 8px;text-align:left}</style></head><body>"
+            f"<h2>{html.escape(title)}</h2>"
+            f"<p>耗时: {self.duration * 1000:.1f}ms | 采样间隔: {self.interval * 1000:.1f}ms | "
+            f"有效样本: {sum(self.stacks.values())}</p>"
+            f"<h3>自身耗时</h3><table>{table_head}{render_rows(self_counts)}</table>"
+            f"<h3>累计耗时</h3><table>{table_head}{render_rows(total_counts)}</table>"
+            "</body></html>"
+        )
+
+
+def save_profile_report(sampler: RequestSampler, report_dir: Path, request_id: str, title: str) -> Path:
+    """
+    将采样结果写入折叠栈和HTML两种报告
+
+    Args:
+        sampler: 已停止的采样分析器
+        report_dir: 报告目录
+        request_id: 请求ID，用于报告文件命名
+        title: 报告标题
+
+    Returns:
+        HTML报告路径
+    """
+    report_dir.mkdir(parents=True, exist_ok=True)
+    file_stem = f"{time.strftime('%Y%m%d-%H%M%S')}_{request_id}"
+
+    collapsed_path = report_dir / f"{file_stem}.folded"
+    collapsed_path.write_text(sampler.to_collapsed(), encoding="utf-8")
+
+    html_path = report_dir / f"{file_stem}.html"
+    html_path.write_text(sampler.to_html(title=title), encoding="utf-8")
+
+    logger.info(f"性能分析报告已生成: {html_path}")
+    return html_path
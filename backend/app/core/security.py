@@ -1,7 +1,8 @@
+import hmac
 from datetime import datetime, timedelta
 
 import jwt
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
 
@@ -63,3 +64,20 @@ def verify_jwt(credentials: HTTPAuthorizationCredentials = Depends(security)) ->
             detail="无效或过期的令牌",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+# ---------- 运维 ----------
+def is_admin_token(token: str | None) -> bool:
+    """校验管理员令牌，未配置令牌时一律拒绝"""
+    if not settings.admin_token or not token:
+        return False
+    return hmac.compare_digest(token, settings.admin_token)
+
+
+def verify_admin_token(x_admin_token: str | None = Header(None)) -> None:
+    """依赖注入：校验运维接口的管理员令牌"""
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问运维接口",
+        )
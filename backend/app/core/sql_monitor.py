@@ -0,0 +1,111 @@
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional, List, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+# IN 列表展开后的占位符，如 (%(id_1)s, %(id_2)s) 或 (?, ?, ?)
+_IN_LIST_PATTERN = re.compile(r"\((?:\s*(?:%\(\w+\)s|\?|:\w+)\s*,)+\s*(?:%\(\w+\)s|\?|:\w+)\s*\)")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class SqlStats:
+    """
+    单个请求内的SQL执行统计
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0  # 毫秒
+        self.templates: Counter = Counter()
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        """
+        记录一次语句执行
+
+        Args:
+            statement: 原始SQL语句
+            elapsed_ms: 执行耗时（毫秒）
+        """
+        self.count += 1
+        self.total_time += elapsed_ms
+        self.templates[normalize_statement(statement)] += 1
+
+    def get_repeated_templates(self, threshold: int) -> List[Tuple[str, int]]:
+        """
+        获取重复执行次数达到阈值的语句模板，即疑似N+1查询
+
+        Args:
+            threshold: 重复次数阈值
+
+        Returns:
+            (语句模板, 执行次数) 列表，按次数降序
+        """
+        return [(template, count) for template, count in self.templates.most_common() if count >= threshold]
+
+
+# 当前请求的SQL统计，由日志中间件在请求开始时设置
+current_sql_stats: ContextVar[Optional[SqlStats]] = ContextVar('current_sql_stats', default=None)
+
+
+def normalize_statement(statement: str) -> str:
+    """将SQL语句归一化为模板：合并空白并折叠IN列表"""
+    statement = _WHITESPACE_PATTERN.sub(" ", statement).strip()
+    return _IN_LIST_PATTERN.sub("(...)", statement)
+
+
+def describe_parameters(parameters, executemany: bool) -> str:
+    """
+    描述参数的结构（类型和数量），不输出具体参数值
+
+    Args:
+        parameters: DBAPI参数
+        executemany: 是否为批量执行
+
+    Returns:
+        参数结构描述
+    """
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = describe_parameters(parameters[0], False) if parameters else "{}"
+        return f"{len(parameters)} x {first}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "[" + ", ".join(type(value).__name__ for value in parameters) + "]"
+    return type(parameters).__name__
+
+
+def install_sql_monitor(engine: Engine) -> None:
+    """
+    在引擎上注册SQL计时监听器
+
+    每条语句的耗时会累计到当前请求的 SqlStats 中，
+    超过 SQL_SLOW_THRESHOLD_MS 的语句会以警告级别记录语句和参数结构。
+
+    Args:
+        engine: SQLAlchemy引擎
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+
+        stats = current_sql_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed_ms)
+
+        if elapsed_ms >= settings.sql_slow_threshold_ms:
+            logger.warning(
+                f"慢SQL: {elapsed_ms:.2f}ms | {normalize_statement(statement)} | "
+                f"参数结构: {describe_parameters(parameters, executemany)}"
+            )
@@ -1,5 +1,7 @@
-from typing import List, Tuple, Optional
+from datetime import datetime, timezone
+from typing import List, Tuple, Optional, Iterator, Dict, Set
 
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 
 from app.models.knowledge import KnowledgeBase, KnowledgeDocument, KnowledgeChunk
@@ -35,7 +37,8 @@ class DocsCRUD:
 
         # 获取知识库下的所有文档
         documents = self.db.query(KnowledgeDocument).filter(
-            KnowledgeDocument.knowledge_base_id == knowledge_id
+            KnowledgeDocument.knowledge_base_id == knowledge_id,
+            KnowledgeDocument.is_deleted == False
         ).all()
 
         return knowledge_base, documents
@@ -108,7 +111,8 @@ class DocsCRUD:
 
         # 获取知识库下的所有文档
         documents = self.db.query(KnowledgeDocument).filter(
-            KnowledgeDocument.knowledge_base_id == knowledge_id
+            KnowledgeDocument.knowledge_base_id == knowledge_id,
+            KnowledgeDocument.is_deleted == False
         ).all()
 
         # 为每个文档更新分块数量
@@ -130,9 +134,12 @@ class DocsCRUD:
             document_id: 文档ID
 
         Returns:
-            文档对象，如果不存在返回None
+            文档对象，如果不存在或已标记删除返回None
         """
-        return self.db.query(KnowledgeDocument).filter(KnowledgeDocument.id == document_id).first()
+        return self.db.query(KnowledgeDocument).filter(
+            KnowledgeDocument.id == document_id,
+            KnowledgeDocument.is_deleted == False
+        ).first()
 
     def get_chunks_by_document_id(self, document_id: int) -> List[KnowledgeChunk]:
         """
@@ -146,6 +153,271 @@ class DocsCRUD:
         """
         return self.db.query(KnowledgeChunk).filter(KnowledgeChunk.document_id == document_id).all()
 
+    def iter_chunks_by_document_id(self, document_id: int, batch_size: int) -> Iterator[List[KnowledgeChunk]]:
+        """
+        按块索引顺序分批遍历文档的知识块
+
+        Args:
+            document_id: 文档ID
+            batch_size: 每批数量
+
+        Yields:
+            知识块列表
+        """
+        last_index, last_id = -1, 0
+        while True:
+            chunks = self.db.query(KnowledgeChunk).filter(
+                KnowledgeChunk.document_id == document_id,
+                (KnowledgeChunk.chunk_index > last_index) |
+                ((KnowledgeChunk.chunk_index == last_index) & (KnowledgeChunk.id > last_id))
+            ).order_by(KnowledgeChunk.chunk_index, KnowledgeChunk.id).limit(batch_size).all()
+            if not chunks:
+                return
+            yield chunks
+            last_index, last_id = chunks[-1].chunk_index, chunks[-1].id
+
+    def filter_existing_chunk_ids(self, chunk_ids: List[str], batch_size: int = 1000) -> List[str]:
+        """
+        筛选出仍存在于未删除文档中的知识块ID
+
+        Args:
+            chunk_ids: 知识块ID列表
+            batch_size: 每批查询的ID数量
+
+        Returns:
+            存在的知识块ID列表
+        """
+        existing_ids = []
+        for start in range(0, len(chunk_ids), batch_size):
+            existing_ids.extend(row[0] for row in self.db.query(KnowledgeChunk.chunk_id).join(
+                KnowledgeDocument, KnowledgeChunk.document_id == KnowledgeDocument.id
+            ).filter(
+                KnowledgeChunk.chunk_id.in_(chunk_ids[start:start + batch_size]),
+                KnowledgeDocument.is_deleted == False
+            ).all())
+        return existing_ids
+
+    def list_chunk_simhashes(self, knowledge_id: int, exclude_document_id: Optional[int] = None,
+                             batch_size: int = 5000) -> List[Tuple[str, int]]:
+        """
+        获取知识库中有向量的知识块的SimHash签名，用于构建近重复检测索引
+
+        只包含未删除文档中未被判为近重复（duplicate_of 为空）且已计算签名的块。
+
+        Args:
+            knowledge_id: 知识库ID
+            exclude_document_id: 排除的文档ID（重新切分或替换中的文档）
+            batch_size: 每批查询的数量
+
+        Returns:
+            (块ID, SimHash) 列表
+        """
+        query = self.db.query(KnowledgeChunk.id, KnowledgeChunk.chunk_id, KnowledgeChunk.simhash).join(
+            KnowledgeDocument, KnowledgeChunk.document_id == KnowledgeDocument.id
+        ).filter(
+            KnowledgeDocument.knowledge_base_id == knowledge_id,
+            KnowledgeDocument.is_deleted == False,
+            KnowledgeChunk.simhash.isnot(None),
+            KnowledgeChunk.duplicate_of.is_(None)
+        )
+        if exclude_document_id is not None:
+            query = query.filter(KnowledgeChunk.document_id != exclude_document_id)
+
+        signatures, last_id = [], 0
+        while True:
+            rows = query.filter(KnowledgeChunk.id > last_id).order_by(KnowledgeChunk.id).limit(batch_size).all()
+            if not rows:
+                return signatures
+            signatures.extend((row.chunk_id, row.simhash) for row in rows)
+            last_id = rows[-1].id
+
+    def list_vector_chunk_ids(self, document_ids: List[int]) -> List[str]:
+        """
+        获取文档中有向量（未被判为近重复）的知识块ID
+
+        Args:
+            document_ids: 文档ID列表
+
+        Returns:
+            知识块ID列表
+        """
+        rows = self.db.query(KnowledgeChunk.chunk_id).filter(
+            KnowledgeChunk.document_id.in_(document_ids),
+            KnowledgeChunk.duplicate_of.is_(None)
+        ).all()
+        return [row[0] for row in rows]
+
+    def get_chunks_by_chunk_ids(self, chunk_ids: List[str]) -> List[KnowledgeChunk]:
+        """
+        根据知识块ID获取未删除文档中的知识块
+
+        Args:
+            chunk_ids: 知识块ID列表
+
+        Returns:
+            知识块列表
+        """
+        return self.db.query(KnowledgeChunk).join(
+            KnowledgeDocument, KnowledgeChunk.document_id == KnowledgeDocument.id
+        ).filter(
+            KnowledgeChunk.chunk_id.in_(chunk_ids),
+            KnowledgeDocument.is_deleted == False
+        ).all()
+
+    def get_duplicate_chunks(self, canonical_chunk_ids: List[str], exclude_document_id: Optional[int] = None,
+                             batch_size: int = 1000) -> List[KnowledgeChunk]:
+        """
+        获取未删除文档中以指定块为代表块的近重复知识块
+
+        Args:
+            canonical_chunk_ids: 代表块ID列表
+            exclude_document_id: 排除的文档ID
+            batch_size: 每批查询的ID数量
+
+        Returns:
+            近重复知识块列表，按文档ID和块索引排序
+        """
+        chunks = []
+        for start in range(0, len(canonical_chunk_ids), batch_size):
+            query = self.db.query(KnowledgeChunk).join(
+                KnowledgeDocument, KnowledgeChunk.document_id == KnowledgeDocument.id
+            ).filter(
+                KnowledgeChunk.duplicate_of.in_(canonical_chunk_ids[start:start + batch_size]),
+                KnowledgeDocument.is_deleted == False
+            )
+            if exclude_document_id is not None:
+                query = query.filter(KnowledgeChunk.document_id != exclude_document_id)
+            chunks.extend(query.all())
+        return sorted(chunks, key=lambda chunk: (chunk.document_id, chunk.chunk_index, chunk.id))
+
+    def update_chunk_duplicates(self, duplicate_of_by_id: Dict[int, Optional[str]]) -> int:
+        """
+        批量更新知识块的代表块ID（单事务）
+
+        Args:
+            duplicate_of_by_id: 知识块记录ID -> 新的代表块ID，为None表示该块成为代表块
+
+        Returns:
+            更新的记录数量
+        """
+        if not duplicate_of_by_id:
+            return 0
+        try:
+            self.db.execute(update(KnowledgeChunk), [
+                {"id": chunk_id, "duplicate_of": duplicate_of} for chunk_id, duplicate_of in duplicate_of_by_id.items()
+            ])
+            self.db.commit()
+            return len(duplicate_of_by_id)
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def create_chunks(self, chunks: List[dict]) -> int:
+        """
+        批量创建知识块记录（单条多行INSERT，不逐条刷新对象）
+
+        Args:
+            chunks: 知识块数据列表，字段同 create_chunk
+
+        Returns:
+            创建的记录数量
+        """
+        if not chunks:
+            return 0
+        now = datetime.now(timezone.utc)
+        try:
+            self.db.execute(insert(KnowledgeChunk), [{
+                "chunk_id": data.get('chunk_id'),
+                "content": data.get('content'),
+                "page_label": data.get('page_label'),
+                "chunk_index": data.get('chunk_index'),
+                "document_metadata": data.get('document_metadata'),
+                "simhash": data.get('simhash'),
+                "duplicate_of": data.get('duplicate_of'),
+                "document_id": data.get('document_id'),
+                "created_time": now,
+                "updated_time": now,
+            } for data in chunks])
+            self.db.commit()
+            return len(chunks)
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def mark_document_deleted(self, document_id: int) -> bool:
+        """
+        将文档标记为已删除，实际数据由后台回收器清理
+
+        Args:
+            document_id: 文档ID
+
+        Returns:
+            bool: 标记成功返回True，文档不存在或已标记返回False
+        """
+        updated_count = self.db.query(KnowledgeDocument).filter(
+            KnowledgeDocument.id == document_id,
+            KnowledgeDocument.is_deleted == False
+        ).update({KnowledgeDocument.is_deleted: True}, synchronize_session="fetch")
+        self.db.commit()
+        return updated_count > 0
+
+    def list_deleted_documents(self, limit: int,
+                               exclude_knowledge_ids: Optional[Set[int]] = None) -> List[KnowledgeDocument]:
+        """
+        获取已标记删除、等待回收的文档（所属知识库未被标记删除）
+
+        整个知识库被标记删除时，其文档随知识库一起回收，不在此列出。
+
+        Args:
+            limit: 最大返回数量
+            exclude_knowledge_ids: 不返回这些知识库的文档（如回收失败、正在退避的知识库）
+
+        Returns:
+            文档列表
+        """
+        query = self.db.query(KnowledgeDocument).join(
+            KnowledgeBase, KnowledgeBase.id == KnowledgeDocument.knowledge_base_id
+        ).filter(
+            KnowledgeDocument.is_deleted == True,
+            KnowledgeBase.is_deleted == False
+        )
+        if exclude_knowledge_ids:
+            query = query.filter(KnowledgeDocument.knowledge_base_id.notin_(exclude_knowledge_ids))
+        return query.order_by(KnowledgeDocument.knowledge_base_id, KnowledgeDocument.id).limit(limit).all()
+
+    def list_document_ids_by_knowledge_id(self, knowledge_id: int, limit: int) -> List[int]:
+        """
+        获取知识库下的文档ID（包括已标记删除的文档），用于分批回收
+
+        Args:
+            knowledge_id: 知识库ID
+            limit: 最大返回数量
+
+        Returns:
+            文档ID列表
+        """
+        rows = self.db.query(KnowledgeDocument.id).filter(
+            KnowledgeDocument.knowledge_base_id == knowledge_id
+        ).order_by(KnowledgeDocument.id).limit(limit).all()
+        return [row[0] for row in rows]
+
+    def list_document_ids_by_state(self, knowledge_id: int) -> Tuple[List[int], List[int]]:
+        """
+        获取知识库下的文档ID，按是否已标记删除分为两组，用于检索时排除等待回收的文档
+
+        Args:
+            knowledge_id: 知识库ID
+
+        Returns:
+            (未删除的文档ID列表, 已标记删除的文档ID列表)
+        """
+        rows = self.db.query(KnowledgeDocument.id, KnowledgeDocument.is_deleted).filter(
+            KnowledgeDocument.knowledge_base_id == knowledge_id
+        ).all()
+        live_ids = [document_id for document_id, is_deleted in rows if not is_deleted]
+        deleted_ids = [document_id for document_id, is_deleted in rows if is_deleted]
+        return live_ids, deleted_ids
+
     def delete_document(self, document_id: int) -> None:
         """
         删除指定文档
@@ -165,11 +437,131 @@ class DocsCRUD:
         Args:
             document_id: 文档ID
         """
-        chunks = self.get_chunks_by_document_id(document_id)
-        for chunk in chunks:
-            self.db.delete(chunk)
+        self.db.query(KnowledgeChunk).filter(
+            KnowledgeChunk.document_id == document_id
+        ).delete(synchronize_session=False)
         self.db.commit()
 
+    def delete_documents_by_ids(self, document_ids: List[int]) -> int:
+        """
+        在同一事务中批量删除文档及其全部知识块，每张表只执行一条DELETE语句
+
+        Args:
+            document_ids: 文档ID列表
+
+        Returns:
+            int: 删除的文档数量
+        """
+        if not document_ids:
+            return 0
+        try:
+            self.db.query(KnowledgeChunk).filter(
+                KnowledgeChunk.document_id.in_(document_ids)
+            ).delete(synchronize_session=False)
+            deleted_count = self.db.query(KnowledgeDocument).filter(
+                KnowledgeDocument.id.in_(document_ids)
+            ).delete(synchronize_session=False)
+            self.db.commit()
+            return deleted_count
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def delete_documents_by_knowledge_id(self, knowledge_id: int) -> int:
+        """
+        在同一事务中删除知识库下的全部文档及知识块
+
+        Args:
+            knowledge_id: 知识库ID
+
+        Returns:
+            int: 删除的文档数量
+        """
+        try:
+            document_ids = self.db.query(KnowledgeDocument.id).filter(
+                KnowledgeDocument.knowledge_base_id == knowledge_id
+            )
+            self.db.query(KnowledgeChunk).filter(
+                KnowledgeChunk.document_id.in_(document_ids.scalar_subquery())
+            ).delete(synchronize_session=False)
+            deleted_count = self.db.query(KnowledgeDocument).filter(
+                KnowledgeDocument.knowledge_base_id == knowledge_id
+            ).delete(synchronize_session=False)
+            self.db.commit()
+            return deleted_count
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def apply_document_chunk_delta(self, document_id: int, chunks: List[dict],
+                                   document_data: Optional[dict] = None) -> dict:
+        """
+        在同一事务中将文档的知识块同步为新的知识块集合
+
+        以 chunk_id 比较新旧集合：删除不再存在的块、插入新增的块，保留的块只更新位置、近重复标记等元数据；
+        同时更新文档的分块数量以及 document_data 中给出的文档字段。
+
+        Args:
+            document_id: 文档ID
+            chunks: 新的知识块数据列表（完整集合）
+            document_data: 需要同时更新的文档字段，如 name、file_path
+
+        Returns:
+            dict: 包含added、removed、updated数量的字典
+        """
+        try:
+            existing_chunks = {
+                chunk.chunk_id: chunk
+                for chunk in self.db.query(KnowledgeChunk).filter(KnowledgeChunk.document_id == document_id).all()
+            }
+            new_chunk_ids = {data.get('chunk_id') for data in chunks}
+
+            removed_ids = [chunk_id for chunk_id in existing_chunks if chunk_id not in new_chunk_ids]
+            if removed_ids:
+                self.db.query(KnowledgeChunk).filter(
+                    KnowledgeChunk.document_id == document_id,
+                    KnowledgeChunk.chunk_id.in_(removed_ids)
+                ).delete(synchronize_session="fetch")
+
+            added_count = 0
+            updated_count = 0
+            for data in chunks:
+                chunk = existing_chunks.get(data.get('chunk_id'))
+                if chunk is None:
+                    self.db.add(KnowledgeChunk(
+                        chunk_id=data.get('chunk_id'),
+                        content=data.get('content'),
+                        page_label=data.get('page_label'),
+                        chunk_index=data.get('chunk_index'),
+                        document_metadata=data.get('document_metadata'),
+                        simhash=data.get('simhash'),
+                        duplicate_of=data.get('duplicate_of'),
+                        document_id=document_id,
+                    ))
+                    added_count += 1
+                elif (chunk.chunk_index, chunk.page_label, chunk.document_metadata, chunk.simhash,
+                      chunk.duplicate_of) != (data.get('chunk_index'), data.get('page_label'),
+                                              data.get('document_metadata'), data.get('simhash'),
+                                              data.get('duplicate_of')):
+                    chunk.chunk_index = data.get('chunk_index')
+                    chunk.page_label = data.get('page_label')
+                    chunk.document_metadata = data.get('document_metadata')
+                    chunk.simhash = data.get('simhash')
+                    chunk.duplicate_of = data.get('duplicate_of')
+                    updated_count += 1
+
+            self.db.query(KnowledgeDocument).filter(
+                KnowledgeDocument.id == document_id
+            ).update({KnowledgeDocument.chunk_count: len(chunks), **{
+                getattr(KnowledgeDocument, key): value for key, value in (document_data or {}).items()
+            }}, synchronize_session="fetch")
+
+            self.db.commit()
+            return {"added": added_count, "removed": len(removed_ids), "updated": updated_count}
+        except Exception:
+            self.db.rollback()
+            raise
+
     def get_documents_by_knowledge_id(self, knowledge_id: int) -> List[KnowledgeDocument]:
         """
         获取知识库中的所有文档
@@ -180,7 +572,10 @@ class DocsCRUD:
         Returns:
             文档列表
         """
-        return self.db.query(KnowledgeDocument).filter(KnowledgeDocument.knowledge_base_id == knowledge_id).all()
+        return self.db.query(KnowledgeDocument).filter(
+            KnowledgeDocument.knowledge_base_id == knowledge_id,
+            KnowledgeDocument.is_deleted == False
+        ).all()
 
     def get_knowledge_base_document_stats(self, knowledge_base_id: int) -> dict:
         """
@@ -197,12 +592,14 @@ class DocsCRUD:
 
         # 计算文档数量
         document_count = self.db.query(func.count(KnowledgeDocument.id)).filter(
-            KnowledgeDocument.knowledge_base_id == knowledge_base_id
+            KnowledgeDocument.knowledge_base_id == knowledge_base_id,
+            KnowledgeDocument.is_deleted == False
         ).scalar()
 
         # 计算分块总数
         chunk_total = self.db.query(func.sum(KnowledgeDocument.chunk_count)).filter(
-            KnowledgeDocument.knowledge_base_id == knowledge_base_id
+            KnowledgeDocument.knowledge_base_id == knowledge_base_id,
+            KnowledgeDocument.is_deleted == False
         ).scalar() or 0
 
         return {
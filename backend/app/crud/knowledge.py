@@ -1,8 +1,8 @@
-from typing import Optional, List
+from typing import Optional, List, Set
 
 from sqlalchemy.orm import Session
 
-from app.models.knowledge import KnowledgeBase
+from app.models.knowledge import KnowledgeBase, KnowledgeDocument, VectorDatabaseType, TextSplitterType
 
 
 class KnowledgeBaseDB:
@@ -32,7 +32,10 @@ class KnowledgeBaseDB:
         Returns:
             Optional[KnowledgeBase]: 知识库对象，如果不存在则返回None
         """
-        return self.db.query(KnowledgeBase).filter(KnowledgeBase.name == name).first()
+        return self.db.query(KnowledgeBase).filter(
+            KnowledgeBase.name == name,
+            KnowledgeBase.is_deleted == False
+        ).first()
 
     def list_knowledge_bases_by_user(self, user_id: int):
         """
@@ -45,7 +48,8 @@ class KnowledgeBaseDB:
             List[KnowledgeBase]: 用户拥有的知识库列表
         """
         return self.db.query(KnowledgeBase).filter(
-            KnowledgeBase.owner_id == user_id
+            KnowledgeBase.owner_id == user_id,
+            KnowledgeBase.is_deleted == False
         ).all()
 
     def get_knowledge_base_by_id(self, kb_id: int) -> Optional[KnowledgeBase]:
@@ -56,13 +60,17 @@ class KnowledgeBaseDB:
             kb_id (int): 知识库ID
 
         Returns:
-            Optional[KnowledgeBase]: 知识库对象，如果不存在则返回None
+            Optional[KnowledgeBase]: 知识库对象，如果不存在或已标记删除则返回None
         """
-        return self.db.query(KnowledgeBase).filter(KnowledgeBase.id == kb_id).first()
+        return self.db.query(KnowledgeBase).filter(
+            KnowledgeBase.id == kb_id,
+            KnowledgeBase.is_deleted == False
+        ).first()
 
     def create_knowledge_base(self, name: str, uuid: str, description: str, tags: List[str],
                               vector_db_type, user_id: int, chunk_size: int, chunk_overlap: int,
-                              is_public: bool) -> KnowledgeBase:
+                              is_public: bool, splitter_type: TextSplitterType = TextSplitterType.SENTENCE
+                              ) -> KnowledgeBase:
         """
         创建知识库
 
@@ -76,6 +84,7 @@ class KnowledgeBaseDB:
             chunk_size (int): 分块大小
             chunk_overlap (int): 分块重叠大小
             is_public (bool): 是否公开
+            splitter_type (TextSplitterType): 文档切分器类型
 
         Returns:
             KnowledgeBase: 创建的知识库对象
@@ -89,6 +98,7 @@ class KnowledgeBaseDB:
             vector_db_type=vector_db_type,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
+            splitter_type=splitter_type,
             query_count=0,
             is_public=is_public
         )
@@ -99,7 +109,7 @@ class KnowledgeBaseDB:
 
     def update_knowledge_base(self, knowledge_id: int, name: str, description: str, tags: List[str],
                               vector_db_type, chunk_size: int, chunk_overlap: int,
-                              is_public: bool) -> KnowledgeBase:
+                              is_public: bool, splitter_type: Optional[TextSplitterType] = None) -> KnowledgeBase:
         """
         更新知识库
 
@@ -112,6 +122,7 @@ class KnowledgeBaseDB:
             chunk_size (int): 新的分块大小
             chunk_overlap (int): 新的分块重叠大小
             is_public (bool): 新的公开状态
+            splitter_type (Optional[TextSplitterType]): 新的文档切分器类型，为None时保持不变
 
         Returns:
             KnowledgeBase: 更新后的知识库对象，如果不存在则返回None
@@ -125,6 +136,8 @@ class KnowledgeBaseDB:
             kb.chunk_size = chunk_size
             kb.chunk_overlap = chunk_overlap
             kb.is_public = is_public
+            if splitter_type is not None:
+                kb.splitter_type = splitter_type
 
             self.db.commit()
             self.db.refresh(kb)
@@ -141,9 +154,151 @@ class KnowledgeBaseDB:
         Returns:
             KnowledgeBase: 更新后的知识库对象，如果不存在则返回None
         """
-        knowledge_base = self.db.query(KnowledgeBase).filter(KnowledgeBase.id == knowledge_id).first()
+        knowledge_base = self.get_knowledge_base_by_id(knowledge_id)
         if knowledge_base:
             knowledge_base.status = status
             self.db.commit()
             self.db.refresh(knowledge_base)
         return knowledge_base
+
+    def get_migration_target(self, knowledge_id: int) -> Optional[VectorDatabaseType]:
+        """
+        获取知识库迁移中的目标向量数据库类型（直接查询列，不使用会话中缓存的对象）
+
+        Args:
+            knowledge_id (int): 知识库ID
+
+        Returns:
+            Optional[VectorDatabaseType]: 未在迁移时返回None
+        """
+        return self.db.query(KnowledgeBase.migration_target).filter(
+            KnowledgeBase.id == knowledge_id
+        ).scalar()
+
+    def start_vector_store_migration(self, knowledge_id: int, target: VectorDatabaseType) -> bool:
+        """
+        标记知识库开始迁移到目标向量数据库，此后写入会同时落到新旧两个向量数据库
+
+        Args:
+            knowledge_id (int): 知识库ID
+            target (VectorDatabaseType): 目标向量数据库类型
+
+        Returns:
+            bool: 标记成功返回True；知识库不存在、已在迁移或已使用目标类型时返回False
+        """
+        try:
+            updated_count = self.db.query(KnowledgeBase).filter(
+                KnowledgeBase.id == knowledge_id,
+                KnowledgeBase.is_deleted == False,
+                KnowledgeBase.migration_target.is_(None),
+                KnowledgeBase.vector_db_type != target
+            ).update({KnowledgeBase.migration_target: target}, synchronize_session="fetch")
+            self.db.commit()
+            return updated_count > 0
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def finish_vector_store_migration(self, knowledge_id: int, target: VectorDatabaseType,
+                                      vector_path: str) -> bool:
+        """
+        在同一事务中将知识库切换到目标向量数据库并更新文档的向量集合名称
+
+        Args:
+            knowledge_id (int): 知识库ID
+            target (VectorDatabaseType): 目标向量数据库类型
+            vector_path (str): 目标集合名称
+
+        Returns:
+            bool: 切换成功返回True；迁移已被取消或知识库已删除时返回False
+        """
+        try:
+            updated_count = self.db.query(KnowledgeBase).filter(
+                KnowledgeBase.id == knowledge_id,
+                KnowledgeBase.is_deleted == False,
+                KnowledgeBase.migration_target == target
+            ).update({KnowledgeBase.vector_db_type: target, KnowledgeBase.migration_target: None},
+                     synchronize_session="fetch")
+            if updated_count:
+                self.db.query(KnowledgeDocument).filter(
+                    KnowledgeDocument.knowledge_base_id == knowledge_id
+                ).update({KnowledgeDocument.vector_path: vector_path}, synchronize_session="fetch")
+            self.db.commit()
+            return updated_count > 0
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def abort_vector_store_migration(self, knowledge_id: int) -> None:
+        """
+        取消知识库的向量数据库迁移，停止双写
+
+        Args:
+            knowledge_id (int): 知识库ID
+        """
+        self.db.query(KnowledgeBase).filter(KnowledgeBase.id == knowledge_id).update(
+            {KnowledgeBase.migration_target: None}, synchronize_session="fetch")
+        self.db.commit()
+
+    def list_migrating_knowledge_bases(self) -> List[KnowledgeBase]:
+        """
+        获取正在迁移向量数据库的知识库
+
+        Returns:
+            List[KnowledgeBase]: 知识库列表
+        """
+        return self.db.query(KnowledgeBase).filter(
+            KnowledgeBase.is_deleted == False,
+            KnowledgeBase.migration_target.isnot(None)
+        ).all()
+
+    def mark_knowledge_base_deleted(self, knowledge_id: int) -> bool:
+        """
+        将知识库及其全部文档标记为已删除，实际数据由后台回收器清理
+
+        Args:
+            knowledge_id (int): 知识库ID
+
+        Returns:
+            bool: 标记成功返回True，知识库不存在或已标记返回False
+        """
+        try:
+            updated_count = self.db.query(KnowledgeBase).filter(
+                KnowledgeBase.id == knowledge_id,
+                KnowledgeBase.is_deleted == False
+            ).update({KnowledgeBase.is_deleted: True}, synchronize_session="fetch")
+            if updated_count:
+                self.db.query(KnowledgeDocument).filter(
+                    KnowledgeDocument.knowledge_base_id == knowledge_id
+                ).update({KnowledgeDocument.is_deleted: True}, synchronize_session="fetch")
+            self.db.commit()
+            return updated_count > 0
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def list_deleted_knowledge_bases(self, limit: int, exclude_ids: Optional[Set[int]] = None) -> List[KnowledgeBase]:
+        """
+        获取已标记删除、等待回收的知识库
+
+        Args:
+            limit (int): 最大返回数量
+            exclude_ids (Optional[Set[int]]): 不返回的知识库ID（如回收失败、正在退避的知识库）
+
+        Returns:
+            List[KnowledgeBase]: 知识库列表
+        """
+        query = self.db.query(KnowledgeBase).filter(KnowledgeBase.is_deleted == True)
+        if exclude_ids:
+            query = query.filter(KnowledgeBase.id.notin_(exclude_ids))
+        return query.order_by(KnowledgeBase.id).limit(limit).all()
+
+    def delete_knowledge_base_record(self, knowledge_id: int) -> None:
+        """
+        物理删除知识库记录，调用前需先删除其全部文档
+
+        Args:
+            knowledge_id (int): 知识库ID
+        """
+        self.db.query(KnowledgeBase).filter(KnowledgeBase.id == knowledge_id).delete(synchronize_session="fetch")
+        self.db.commit()
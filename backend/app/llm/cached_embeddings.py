@@ -0,0 +1,37 @@
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    带向量缓存的嵌入模型包装
+
+    以文本为键预置已有向量，embed_documents 只对缓存未命中的文本调用底层模型，
+    用于重新切分等场景下复用未变化文本块的向量。
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: Dict[str, List[float]] = None):
+        """
+        初始化缓存嵌入模型
+
+        Args:
+            embeddings: 底层嵌入模型
+            cache: 预置的 文本 -> 向量 缓存
+        """
+        self.embeddings = embeddings
+        self.cache = dict(cache or {})
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        missing_texts = [text for text in dict.fromkeys(texts) if text not in self.cache]
+        if missing_texts:
+            vectors = self.embeddings.embed_documents(missing_texts)
+            self.cache.update(zip(missing_texts, vectors))
+        self.miss_count += len(missing_texts)
+        self.hit_count += len(texts) - len(missing_texts)
+        return [list(self.cache[text]) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
@@ -1,15 +1,62 @@
+from typing import List
+
 from langchain_community.embeddings import DashScopeEmbeddings
+from langchain_community.embeddings.dashscope import embed_with_retry
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
 from langchain_openai import ChatOpenAI
 
 from app.core.config import settings
 
+# 假聊天模型的固定回答，逐字流式输出
+FAKE_CHAT_RESPONSE = "根据知识库中检索到的内容，这是一个用于本地测试的模拟回答，不代表真实模型的输出。"
+
 
 def get_model_client(api_key=settings.dashscope_api_key, base_url=settings.llm_base_url
                      , model=settings.chat_model, temperature=0.7, max_tokens=8000):
-    """通过LangChain获得一个阿里通义千问聊天模型的实例"""
-    return ChatOpenAI(api_key=api_key, base_url=base_url, model=model, temperature=temperature, max_tokens=max_tokens)
+    """
+    通过LangChain获得一个阿里通义千问聊天模型的实例
+
+    流式输出时在最后一个分块中返回 token 用量（stream_usage）；LLM_PROVIDER=fake 时返回逐字输出固定回答的假模型，
+    不产生任何外部调用。
+    """
+    if settings.llm_provider == "fake":
+        return FakeListChatModel(responses=[FAKE_CHAT_RESPONSE], sleep=settings.fake_llm_token_delay)
+    return ChatOpenAI(api_key=api_key, base_url=base_url, model=model, temperature=temperature, max_tokens=max_tokens,
+                      stream_usage=True)
 
 
 def get_embeddings():
     """通过LangChain获得一个阿里通义千问嵌入模型的实例"""
-    return DashScopeEmbeddings(model=settings.embedding_model, dashscope_api_key=settings.dashscope_api_key)
+    if settings.embedding_provider == "fake":
+        # 确定性假嵌入：相同文本得到相同向量，不产生任何外部调用
+        return DeterministicFakeEmbedding(size=settings.fake_embedding_dim)
+    return DashScopeEmbeddings(model=settings.embedding_model, dashscope_api_key=settings.dashscope_api_key)
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    批量计算查询向量
+
+    LangChain 的 Embeddings 只有单条的 embed_query；DashScope 的查询向量（text_type=query）与文档向量不同，
+    不能用 embed_documents 代替，这里直接以 text_type=query 批量调用（每次请求最多25条）。
+    包装类（如降维投影）提供 embed_queries 时交给包装类处理，其他模型逐条调用 embed_query。
+
+    Args:
+        embeddings: 嵌入模型
+        texts: 查询文本列表
+
+    Returns:
+        与 texts 顺序一致的查询向量
+    """
+    if not texts:
+        return []
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if isinstance(embeddings, DashScopeEmbeddings):
+        return [item["embedding"] for item in
+                embed_with_retry(embeddings, input=texts, text_type="query", model=embeddings.model)]
+    if isinstance(embeddings, DeterministicFakeEmbedding):
+        # 假嵌入的查询向量与文档向量相同
+        return embeddings.embed_documents(texts)
+    return [embeddings.embed_query(text) for text in texts]
@@ -0,0 +1,167 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.llm.model_client import get_embeddings, embed_queries
+
+PROJECTION_METHODS = ("pca", "truncate")
+
+# 知识库ID -> (投影文件修改时间, 投影)，文件被替换后自动重新加载
+_projection_cache: Dict[int, Tuple[float, "EmbeddingProjection"]] = {}
+_projection_cache_lock = threading.Lock()
+
+
+class EmbeddingProjection:
+    """
+    嵌入向量的线性降维投影
+
+    投影为 (x - mean) @ components，结果再做 L2 归一化，保证写入时和检索时使用完全相同的变换，
+    余弦和欧氏距离的排序保持一致。pca 由知识库向量的样本拟合；truncate 取前 dimension 维
+    （只适用于按 Matryoshka 方式训练、前若干维自成一体的嵌入模型）。
+    """
+
+    def __init__(self, method: str, mean: np.ndarray, components: np.ndarray):
+        """
+        初始化投影
+
+        Args:
+            method: 投影方式，pca 或 truncate
+            mean: 原始向量的均值，长度为原始维度
+            components: 投影矩阵，形状为 (原始维度, 目标维度)
+        """
+        self.method = method
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+
+    @property
+    def source_dimension(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        return self.components.shape[1]
+
+    @classmethod
+    def fit_pca(cls, vectors: np.ndarray, dimension: int) -> "EmbeddingProjection":
+        """
+        用向量样本拟合 PCA 投影
+
+        Args:
+            vectors: 样本向量，形状为 (样本数, 原始维度)
+            dimension: 目标维度，不能超过样本数和原始维度
+
+        Returns:
+            投影
+        """
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if dimension > min(vectors.shape):
+            raise ValueError(f"目标维度 {dimension} 超过样本数 {vectors.shape[0]} 或原始维度 {vectors.shape[1]}")
+        mean = vectors.mean(axis=0)
+        # 右奇异向量即主成分方向，按奇异值从大到小排列
+        _, _, right_vectors = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls("pca", mean, right_vectors[:dimension].T)
+
+    @classmethod
+    def truncate(cls, source_dimension: int, dimension: int) -> "EmbeddingProjection":
+        """构造保留前 dimension 维的截断投影"""
+        if dimension > source_dimension:
+            raise ValueError(f"目标维度 {dimension} 超过原始维度 {source_dimension}")
+        return cls("truncate", np.zeros(source_dimension), np.eye(source_dimension, dimension))
+
+    def transform(self, vectors) -> np.ndarray:
+        """
+        投影一批向量
+
+        Args:
+            vectors: 原始向量，形状为 (数量, 原始维度)
+
+        Returns:
+            归一化后的投影向量，形状为 (数量, 目标维度)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "truncate":
+            projected = vectors[:, :self.dimension]
+        else:
+            projected = (vectors - self.mean) @ self.components
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.where(norms > 0, norms, 1)
+
+    def save(self, path: Path) -> None:
+        """先写临时文件再替换，读取方不会看到写了一半的文件"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.stem}.tmp.npz")
+        np.savez(temp_path, method=np.array(self.method), mean=self.mean, components=self.components)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "EmbeddingProjection":
+        with np.load(path) as data:
+            return cls(str(data["method"]), data["mean"], data["components"])
+
+
+class ProjectedEmbeddings(Embeddings):
+    """对底层嵌入模型的输出做降维投影，文档和查询使用同一投影"""
+
+    def __init__(self, embeddings: Embeddings, projection: EmbeddingProjection):
+        self.embeddings = embeddings
+        self.projection = projection
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.projection.transform(self.embeddings.embed_documents(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.projection.transform([self.embeddings.embed_query(text)])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.projection.transform(embed_queries(self.embeddings, texts)).tolist()
+
+
+def get_projection_path(knowledge_id: int) -> Path:
+    """知识库投影文件的路径，与向量数据放在一起"""
+    return Path(settings.vector_file_path) / "projections" / f"kb_{knowledge_id}.npz"
+
+
+def load_projection(knowledge_id: int) -> Optional[EmbeddingProjection]:
+    """
+    读取知识库的投影，按文件修改时间缓存
+
+    Args:
+        knowledge_id: 知识库ID
+
+    Returns:
+        投影，知识库未启用降维时返回None
+    """
+    path = get_projection_path(knowledge_id)
+    try:
+        modified_time = path.stat().st_mtime
+    except FileNotFoundError:
+        _projection_cache.pop(knowledge_id, None)
+        return None
+    with _projection_cache_lock:
+        cached = _projection_cache.get(knowledge_id)
+        if cached is None or cached[0] != modified_time:
+            cached = (modified_time, EmbeddingProjection.load(path))
+            _projection_cache[knowledge_id] = cached
+        return cached[1]
+
+
+def get_knowledge_base_embeddings(knowledge_id: int) -> Embeddings:
+    """
+    获取知识库使用的嵌入模型：启用降维的知识库在底层模型外包装投影
+
+    Args:
+        knowledge_id: 知识库ID
+
+    Returns:
+        嵌入模型
+    """
+    embeddings = get_embeddings()
+    projection = load_projection(knowledge_id)
+    return embeddings if projection is None else ProjectedEmbeddings(embeddings, projection)
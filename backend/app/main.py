@@ -1,11 +1,36 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api import auth, knowledge, docs
+from app.api import auth, knowledge, docs, monitor, chat
+from app.core.config import settings
+from app.core.loop_monitor import loop_lag_monitor
 from app.middleware.exception_middleware import ExceptionMiddleware
 from app.middleware.logger_middleware import LoggingMiddleware
+from app.middleware.profiler_middleware import ProfilerMiddleware
+from app.services.rag.tombstone_collector import tombstone_collector
+from app.vector_store.sharded_search import sharded_search_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动和停止后台监控及回收任务，退出时停止分片检索进程池"""
+    if settings.loop_monitor_enabled:
+        loop_lag_monitor.start()
+    if settings.gc_enabled:
+        tombstone_collector.start()
+    yield
+    tombstone_collector.stop()
+    sharded_search_pool.shutdown()
+    await loop_lag_monitor.stop()
+
+
+app = FastAPI(title="智能数据洞察平台", lifespan=lifespan)
 
-app = FastAPI(title="智能数据洞察平台")
+# 0. 性能分析中间件 - 位于日志中间件内侧以复用其request_id，未开启时不注册
+if settings.profiler_enabled:
+    app.add_middleware(ProfilerMiddleware)
 
 # 1. 日志中间件 - 最外层，记录所有请求和响应
 app.add_middleware(LoggingMiddleware)
@@ -26,3 +51,5 @@ app.add_middleware(ExceptionMiddleware)
 app.include_router(auth.router)
 app.include_router(knowledge.router)
 app.include_router(docs.router)
+app.include_router(monitor.router)
+app.include_router(chat.router)
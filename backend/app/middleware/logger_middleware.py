@@ -10,6 +10,7 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.base import RequestResponseEndpoint
 
 from app.core.config import settings
+from app.core.sql_monitor import SqlStats, current_sql_stats
 
 # 创建上下文变量来存储当前请求的额外信息
 current_request_info: ContextVar[dict] = ContextVar('current_request_info', default={})
@@ -36,6 +37,7 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level}</level> | "
                    "<cyan>{extra[request_id]}</cyan> | <yellow>{extra[method]} {extra[path]}</yellow> | "
                    "Status: <magenta>{extra[status_code]}</magenta> | Duration: <blue>{extra[duration]}ms</blue> | "
+                   "SQL: <blue>{extra[sql_count]} queries/{extra[sql_time]}ms</blue> | "
                    "IP: <cyan>{extra[client_ip]}</cyan> | {message}",
             level="INFO",
             filter=lambda record: 'request_id' in record['extra'] and 'method' in record['extra']
@@ -59,6 +61,7 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             encoding="utf-8",
             format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level} | {extra[request_id]:<36} | {extra[method]:<6} {extra[path]} | "
                    "Status: {extra[status_code]} | Duration: {extra[duration]}ms | "
+                   "SQL: {extra[sql_count]} queries/{extra[sql_time]}ms | "
                    "User-Agent: {extra[user_agent]} | IP: {extra[client_ip]} | "
                    "Response Size: {extra[response_size]} bytes | {message}",
             level="INFO",
@@ -86,6 +89,7 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             encoding="utf-8",
             format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level} | {extra[request_id]:<36} | {extra[method]:<6} {extra[path]} | "
                    "Status: {extra[status_code]} | Duration: {extra[duration]}ms | "
+                   "SQL: {extra[sql_count]} queries/{extra[sql_time]}ms | "
                    "User-Agent: {extra[user_agent]} | IP: {extra[client_ip]} | "
                    "Error: {message}",
             level="ERROR",
@@ -164,6 +168,10 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         # 设置上下文变量
         token = current_request_info.set(request_info.copy())
 
+        # 初始化本次请求的SQL统计
+        sql_stats = SqlStats()
+        sql_token = current_sql_stats.set(sql_stats)
+
         # 添加请求ID到请求状态，便于在其他地方使用
         request.state.request_id = request_id
 
@@ -182,9 +190,14 @@ class LoggingMiddleware(BaseHTTPMiddleware):
                 "status_code": response.status_code,
                 "duration": round(duration, 2),
                 "response_size": response_size,
+                "sql_count": sql_stats.count,
+                "sql_time": round(sql_stats.total_time, 2),
             })
             current_request_info.set(request_info)
 
+            # 记录疑似N+1查询
+            self._log_repeated_statements(request_info, sql_stats)
+
             # 记录访问日志
             access_logger = loguru.logger.bind(**request_info)
             if response.status_code >= 400:
@@ -203,6 +216,8 @@ class LoggingMiddleware(BaseHTTPMiddleware):
                 "status_code": 500,
                 "duration": round(duration, 2),
                 "response_size": 0,
+                "sql_count": sql_stats.count,
+                "sql_time": round(sql_stats.total_time, 2),
             })
             current_request_info.set(request_info)
 
@@ -215,6 +230,16 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         finally:
             # 清理上下文变量
             current_request_info.reset(token)
+            current_sql_stats.reset(sql_token)
+
+    def _log_repeated_statements(self, request_info: dict, sql_stats: SqlStats) -> None:
+        """同一请求内相同语句模板重复执行达到阈值时，记录疑似N+1查询"""
+        repeated = sql_stats.get_repeated_templates(settings.sql_n_plus_one_threshold)
+        if not repeated:
+            return
+        access_logger = loguru.logger.bind(**request_info)
+        for template, count in repeated:
+            access_logger.warning(f"疑似N+1查询: 同一语句执行 {count} 次 | {template}")
 
     def _get_client_ip(self, request: Request) -> str:
         """获取客户端IP地址"""
@@ -0,0 +1,74 @@
+import random
+import uuid
+from pathlib import Path
+
+from fastapi import Request, Response
+from loguru import logger
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.base import RequestResponseEndpoint
+
+from app.core.config import settings
+from app.core.profiler import RequestSampler, save_profile_report
+from app.core.security import is_admin_token
+
+# 携带管理员令牌即可对单个请求开启性能分析
+PROFILE_HEADER = "x-profile-token"
+
+
+class ProfilerMiddleware(BaseHTTPMiddleware):
+    """
+    按请求开启的采样性能分析中间件
+
+    满足以下任一条件时对当前请求采样：
+    - 请求头 X-Profile-Token 携带有效的管理员令牌
+    - 命中 PROFILER_SAMPLE_RATE 配置的随机采样率
+
+    报告写入 {LOG_FILE_PATH}/profiles，文件名包含日志中间件生成的 request_id。
+    该中间件仅在 PROFILER_ENABLED=true 时注册，关闭时没有任何额外开销。
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.sample_rate = settings.profiler_sample_rate
+        self.interval = settings.profiler_interval
+        self.report_dir = Path(settings.log_file_path) / "profiles"
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        if not self._should_profile(request):
+            return await call_next(request)
+
+        sampler = RequestSampler(
+            interval=self.interval,
+            target_code_getter=lambda: self._get_endpoint_code(request)
+        )
+        sampler.start()
+        try:
+            response = await call_next(request)
+        finally:
+            sampler.stop()
+
+        request_id = getattr(request.state, "request_id", None) or str(uuid.uuid4())
+        try:
+            save_profile_report(
+                sampler=sampler,
+                report_dir=self.report_dir,
+                request_id=request_id,
+                title=f"{request.method} {request.url.path} ({request_id})"
+            )
+            response.headers["X-Profile-Id"] = request_id
+        except Exception as e:
+            logger.error(f"写入性能分析报告失败: {str(e)}")
+
+        return response
+
+    def _should_profile(self, request: Request) -> bool:
+        """判断当前请求是否需要采样"""
+        if is_admin_token(request.headers.get(PROFILE_HEADER)):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @staticmethod
+    def _get_endpoint_code(request: Request):
+        """获取路由匹配后的端点函数代码对象"""
+        endpoint = request.scope.get("endpoint")
+        return getattr(endpoint, "__code__", None)
@@ -1,7 +1,7 @@
 from enum import Enum
 from typing import Optional, List
 
-from sqlalchemy import Column, String, Boolean, Text, Integer, ForeignKey, JSON, Enum as SQLEnum
+from sqlalchemy import Column, String, Boolean, Text, Integer, BigInteger, ForeignKey, JSON, Enum as SQLEnum
 from sqlmodel import Field, Relationship
 
 from app.models.base import BaseSQLModel
@@ -12,6 +12,11 @@ class VectorDatabaseType(Enum):
     MILVUS = "milvus"
 
 
+class TextSplitterType(Enum):
+    SENTENCE = "sentence"
+    CJK = "cjk"
+
+
 class KnowledgeBaseStatus(Enum):
     ACTIVE = "active"
     INACTIVE = "inactive"
@@ -58,6 +63,17 @@ class KnowledgeBase(BaseSQLModel, table=True):
         description="切片重叠"
     )
 
+    # 文档切分器：sentence 为 LlamaIndex SentenceSplitter，cjk 为按中日文标点切句的切分器
+    splitter_type: TextSplitterType = Field(
+        default=TextSplitterType.SENTENCE,
+        sa_column=Column(
+            SQLEnum(TextSplitterType, name="textsplittertype"),
+            nullable=False,
+            server_default=TextSplitterType.SENTENCE.name,
+        ),
+        description="文档切分器类型"
+    )
+
     # 使用的向量数据库类型
     vector_db_type: Optional[VectorDatabaseType] = Field(
         sa_column=Column(
@@ -66,6 +82,16 @@ class KnowledgeBase(BaseSQLModel, table=True):
         description="使用的向量数据库类型，如FAISS或Chroma"
     )
 
+    # 迁移中的目标向量数据库类型，非空时写入同时落到两个向量数据库，切换完成后清空
+    migration_target: Optional[VectorDatabaseType] = Field(
+        default=None,
+        sa_column=Column(
+            SQLEnum(VectorDatabaseType, name="vectordatabasetype"),
+            nullable=True,
+        ),
+        description="迁移中的目标向量数据库类型"
+    )
+
     status: KnowledgeBaseStatus = Field(
         default=KnowledgeBaseStatus.ACTIVE,
         sa_column=Column(
@@ -144,6 +170,13 @@ class KnowledgeDocument(BaseSQLModel, table=True):
         description="所属知识库ID，外键关联"
     )
 
+    # 软删除标记，标记后由后台回收器清理向量、文件和数据库记录
+    is_deleted: bool = Field(
+        default=False,
+        sa_column=Column(Boolean, nullable=False, default=False, index=True),
+        description="软删除标记，布尔类型，默认值为False"
+    )
+
     # 关联的知识库
     knowledge_base: "KnowledgeBase" = Relationship(back_populates="documents")
 
@@ -181,6 +214,22 @@ class KnowledgeChunk(BaseSQLModel, table=True):
         description="元数据，可以存储为JSON字符串或二进制数据"
     )
 
+    # 近重复检测（CHUNK_DEDUP_*）写入的两列，均可为空，已有数据库需要新增这两列及 duplicate_of 的索引：
+    # simhash 为内容的64位SimHash（按有符号 BIGINT 存储），未启用检测或块短于 CHUNK_DEDUP_MIN_CHARS 时为空；
+    # duplicate_of 为近重复块对应的代表块的 chunk_id，非空的块只保存记录、不写入向量数据库，检索时由代表块命中。
+    # 检测范围为 document（默认）时代表块与近重复块属于同一文档；为 knowledge_base 时代表块可能属于其他文档，
+    # 代表块所在文档被删除时由回收流程把近重复块改为指向新的代表块并补写向量
+    simhash: Optional[int] = Field(
+        default=None,
+        sa_column=Column(BigInteger, nullable=True),
+        description="内容的SimHash签名"
+    )
+    duplicate_of: Optional[str] = Field(
+        default=None,
+        sa_column=Column(String(64), nullable=True, index=True),
+        description="近重复块对应的代表块ID，为空表示该块有自己的向量"
+    )
+
     # 文档ID（外键）
     document_id: int = Field(
         sa_column=Column(Integer, ForeignKey("knowledge_documents.id"), nullable=False),
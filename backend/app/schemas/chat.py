@@ -0,0 +1,43 @@
+from typing import List, Optional, Dict, Any
+
+from pydantic import BaseModel, Field, field_validator
+
+from app.core.config import settings
+
+
+# 知识库问答请求参数
+class ChatStreamRequest(BaseModel):
+    user_id: int = Field(
+        ...,
+        title="用户ID",
+        description="提问的用户ID，只检索该用户自己的或公开的知识库"
+    )
+    query: str = Field(
+        ...,
+        title="问题",
+        min_length=1,
+        max_length=2000,
+        description="用户的问题"
+    )
+    knowledge_ids: Optional[List[int]] = Field(
+        None,
+        title="知识库ID列表",
+        description="参与检索的知识库，为空时检索该用户的全部知识库"
+    )
+    k: int = Field(
+        default=4,
+        title="参考数量",
+        ge=1,
+        description="检索后拼入提示词的知识块数量"
+    )
+    filters: Optional[Dict[str, Any]] = Field(
+        None,
+        title="过滤条件",
+        description="元数据过滤条件，作用于每个知识库"
+    )
+
+    @field_validator('k')
+    def validate_k(cls, v):
+        if v > settings.search_max_k:
+            raise ValueError(f'参考数量不能超过{settings.search_max_k}')
+        return v
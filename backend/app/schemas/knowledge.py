@@ -1,8 +1,9 @@
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 
 from pydantic import BaseModel, Field, field_validator
 
-from app.models.knowledge import VectorDatabaseType
+from app.core.config import settings
+from app.models.knowledge import VectorDatabaseType, TextSplitterType
 
 
 class KnowledgeBaseCreate(BaseModel):
@@ -38,6 +39,11 @@ class KnowledgeBaseCreate(BaseModel):
         title="切片重叠",
         description="文档切片之间的重叠大小"
     )
+    splitter_type: TextSplitterType = Field(
+        default=TextSplitterType.SENTENCE,
+        title="切分器类型",
+        description="文档切分器，sentence 为通用句子切分，cjk 为中日文标点切句"
+    )
     vector_db_type: Optional[str] = Field(
         default=VectorDatabaseType.MILVUS,
         title="向量数据库类型",
@@ -89,6 +95,11 @@ class KnowledgeBaseUpdate(BaseModel):
         title="切片重叠",
         description="文档切片的重叠大小"
     )
+    splitter_type: Optional[TextSplitterType] = Field(
+        None,
+        title="切分器类型",
+        description="文档切分器，sentence 为通用句子切分，cjk 为中日文标点切句"
+    )
     vector_db_type: Optional[VectorDatabaseType] = Field(
         None,
         title="向量数据库类型",
@@ -117,4 +128,79 @@ class KnowledgeStatusUpdate(BaseModel):
         ...,
         title="知识库ID",
         description="知识库ID"
+    )
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(
+        ...,
+        title="查询列表",
+        min_length=1,
+        description="查询文本列表，结果按相同顺序返回"
+    )
+    k: int = Field(
+        default=4,
+        title="返回数量",
+        ge=1,
+        description="每个查询返回的知识块数量"
+    )
+    filters: Optional[Dict[str, Any]] = Field(
+        None,
+        title="过滤条件",
+        description="元数据过滤条件，作用于全部查询，如 {\"document_id\": [1, 2]}、{\"tags\": [\"FAQ\"]}"
     )
+
+    @field_validator('queries')
+    def validate_queries(cls, v):
+        if len(v) > settings.search_batch_max_queries:
+            raise ValueError(f'查询数量不能超过{settings.search_batch_max_queries}个')
+        if any(not query.strip() for query in v):
+            raise ValueError('查询文本不能为空')
+        return v
+
+    @field_validator('k')
+    def validate_k(cls, v):
+        if v > settings.search_max_k:
+            raise ValueError(f'返回数量不能超过{settings.search_max_k}')
+        return v
+
+
+class FederatedSearchRequest(BaseModel):
+    user_id: int = Field(
+        ...,
+        title="用户ID",
+        description="发起检索的用户ID，只检索该用户自己的或公开的知识库"
+    )
+    query: str = Field(
+        ...,
+        title="查询文本",
+        min_length=1,
+        description="查询文本"
+    )
+    knowledge_ids: Optional[List[int]] = Field(
+        None,
+        title="知识库ID列表",
+        description="参与检索的知识库，为空时检索该用户的全部知识库"
+    )
+    k: int = Field(
+        default=4,
+        title="返回数量",
+        ge=1,
+        description="合并后返回的知识块数量"
+    )
+    filters: Optional[Dict[str, Any]] = Field(
+        None,
+        title="过滤条件",
+        description="元数据过滤条件，作用于每个知识库"
+    )
+    normalization: str = Field(
+        default="minmax",
+        title="分数归一化方式",
+        description="minmax 按知识库内的距离范围线性归一化，rrf 按排名倒数融合"
+    )
+
+    @field_validator('k')
+    def validate_k(cls, v):
+        if v > settings.search_max_k:
+            raise ValueError(f'返回数量不能超过{settings.search_max_k}')
+        return v
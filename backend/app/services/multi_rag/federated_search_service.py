@@ -0,0 +1,236 @@
+import heapq
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+from loguru import logger
+
+from app.core.config import settings
+from app.crud.knowledge import KnowledgeBaseDB
+from app.llm.model_client import get_embeddings, embed_queries
+from app.llm.projected_embeddings import load_projection
+from app.models.knowledge import KnowledgeBaseStatus
+from app.services.rag.knowledge_search_service import KnowledgeSearchService
+from app.vector_store.text_vector_store import TextVectorStore
+
+NORMALIZATIONS = ("minmax", "rrf")
+# 倒数排名融合的平滑常数
+RRF_K = 60
+
+# 所有联合检索请求共用的线程池：超时的知识库检索在后台执行完毕，不阻塞请求返回，也不占用请求线程。
+# 并发请求多时任务会在池中排队，单个知识库的超时从任务开始执行时算起，排队时间不计入
+_search_executor = ThreadPoolExecutor(max_workers=max(settings.federated_search_max_workers, 1),
+                                      thread_name_prefix="federated-search")
+
+
+def _search_knowledge_base(knowledge_id: int, store_type: str, query_vector: List[float], k: int,
+                           filters: Optional[Dict[str, Any]],
+                           start_times: Dict[int, float]) -> Tuple[List[Tuple[Document, float]], float]:
+    """在线程池中检索单个知识库，把开始执行的时间记入 start_times，返回结果和耗时（毫秒）"""
+    started = time.perf_counter()
+    start_times[knowledge_id] = started
+    store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_id, store_type=store_type)
+    results = store.similarity_search_by_vectors([query_vector], k=k, filters=filters)[0]
+    return results, (time.perf_counter() - started) * 1000
+
+
+def normalize_scores(distances: List[float], method: str) -> List[float]:
+    """
+    将单个知识库内按距离升序排列的结果转换为 0~1 的相似度，使不同知识库的分数可以比较
+
+    不同知识库的距离尺度不同（Chroma 与 Milvus、是否降维、嵌入模型的向量模长），不能直接比较：
+    minmax 按知识库内的最小/最大距离线性映射，最近的结果为1；rrf 只看排名，分数为 1 / (60 + 排名)。
+
+    Args:
+        distances: 按距离升序排列的距离列表
+        method: 归一化方式，minmax 或 rrf
+
+    Returns:
+        与 distances 一一对应的相似度
+    """
+    if method == "rrf":
+        return [1 / (RRF_K + rank) for rank in range(1, len(distances) + 1)]
+    if not distances:
+        return []
+    nearest, farthest = min(distances), max(distances)
+    if farthest == nearest:
+        return [1.0] * len(distances)
+    return [(farthest - distance) / (farthest - nearest) for distance in distances]
+
+
+class FederatedSearchService:
+    """
+    多知识库联合检索服务
+
+    流程：
+    1. 确定可检索的知识库（用户自己的或公开的、状态为启用）
+    2. 查询只嵌入一次；启用降维的知识库使用各自的投影变换同一个查询向量
+    3. 在主线程计算各知识库的过滤条件（排除等待回收的文档），再把各知识库的向量检索并发提交到共享线程池，
+       Chroma 和 Milvus 知识库可以混合
+    4. 每个知识库的检索从在线程池中开始执行时计时，超时或失败的知识库标记状态后跳过，不影响其他知识库的结果；
+       线程池被占满时排队超过超时时间仍未开始的知识库同样标记为超时
+    5. 各知识库结果分别归一化为 0~1 的相似度后合并，取前 k 个
+
+    总耗时接近最慢的单个知识库，而不是各知识库耗时之和。
+    """
+
+    def __init__(self, db_session):
+        """
+        初始化联合检索服务
+
+        Args:
+            db_session: 数据库会话对象
+        """
+        self.db_session = db_session
+        self.knowledge_base_db = KnowledgeBaseDB(db_session)
+        self.knowledge_search_service = KnowledgeSearchService(db_session)
+
+    def resolve_knowledge_bases(self, user_id: int, knowledge_ids: Optional[List[int]] = None) -> List[Any]:
+        """
+        确定参与检索的知识库
+
+        Args:
+            user_id: 用户ID
+            knowledge_ids: 指定的知识库ID，为None时检索用户自己的全部知识库
+
+        Returns:
+            启用状态、且属于该用户或公开的知识库列表，不可访问的ID被忽略
+        """
+        if knowledge_ids is None:
+            knowledge_bases = self.knowledge_base_db.list_knowledge_bases_by_user(user_id)
+        else:
+            knowledge_bases = [self.knowledge_base_db.get_knowledge_base_by_id(knowledge_id)
+                               for knowledge_id in dict.fromkeys(knowledge_ids)]
+        return [knowledge_base for knowledge_base in knowledge_bases
+                if knowledge_base is not None
+                and knowledge_base.status == KnowledgeBaseStatus.ACTIVE
+                and (knowledge_base.owner_id == user_id or knowledge_base.is_public)]
+
+    def search(self, user_id: int, query: str, knowledge_ids: Optional[List[int]] = None, k: int = 4,
+               filters: Optional[Dict[str, Any]] = None, normalization: str = "minmax",
+               timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        在多个知识库中联合检索
+
+        Args:
+            user_id: 用户ID
+            query: 查询文本
+            knowledge_ids: 知识库ID列表，为None时检索用户自己的全部知识库
+            k: 合并后返回的结果数量，每个知识库也最多取 k 个
+            filters: 元数据过滤条件，作用于每个知识库
+            normalization: 分数归一化方式，minmax 或 rrf
+            timeout: 单个知识库的检索超时（秒），从该知识库的检索开始执行时算起，默认取配置
+
+        Returns:
+            results 为合并后的结果（含所属知识库、归一化分数 score 和原始距离 distance），
+            knowledge_bases 为每个知识库的状态（ok、timeout、error）、命中数和耗时
+
+        Raises:
+            ValueError: 不支持的归一化方式或知识库数量超过上限
+        """
+        if normalization not in NORMALIZATIONS:
+            raise ValueError(f"不支持的分数归一化方式: {normalization}，可选: {', '.join(NORMALIZATIONS)}")
+        started = time.perf_counter()
+        timeout = settings.federated_search_timeout if timeout is None else timeout
+        knowledge_bases = self.resolve_knowledge_bases(user_id, knowledge_ids)
+        if len(knowledge_bases) > settings.federated_search_max_knowledge_bases:
+            raise ValueError(f"单次最多检索 {settings.federated_search_max_knowledge_bases} 个知识库")
+        if not knowledge_bases:
+            return {"results": [], "knowledge_bases": [], "took_ms": 0.0}
+
+        base_vector = embed_queries(get_embeddings(), [query])[0]
+        statuses: Dict[int, Dict[str, Any]] = {}
+        futures = {}
+        start_times: Dict[int, float] = {}
+        for knowledge_base in knowledge_bases:
+            status = {"knowledge_id": knowledge_base.id, "name": knowledge_base.name, "status": "ok",
+                      "hits": 0, "took_ms": None, "error": None}
+            statuses[knowledge_base.id] = status
+            # 过滤条件需要查询数据库，在当前线程完成，线程池中只做向量检索
+            scoped_filters = self.knowledge_search_service.scope_filters(knowledge_base.id, filters)
+            if scoped_filters is None:
+                continue
+            projection = load_projection(knowledge_base.id)
+            query_vector = base_vector if projection is None else projection.transform([base_vector])[0].tolist()
+            futures[_search_executor.submit(
+                _search_knowledge_base, knowledge_base.id, knowledge_base.vector_db_type.value, query_vector, k,
+                scoped_filters or None, start_times
+            )] = knowledge_base
+
+        done, timed_out = self._wait_for_searches(futures, start_times, timeout)
+        candidates = []
+        for future in timed_out:
+            knowledge_base = futures[future]
+            if future.cancelled():
+                statuses[knowledge_base.id].update(status="timeout", error=f"排队等待检索线程超过 {timeout}s")
+                logger.warning(f"联合检索知识库 {knowledge_base.id} 排队超时（{timeout}s），检索线程已占满，跳过")
+            else:
+                statuses[knowledge_base.id].update(status="timeout", took_ms=round(timeout * 1000, 1))
+                logger.warning(f"联合检索知识库 {knowledge_base.id} 超时（{timeout}s），跳过")
+        for future in done:
+            knowledge_base = futures[future]
+            status = statuses[knowledge_base.id]
+            try:
+                results, took_ms = future.result()
+            except Exception as error:
+                status.update(status="error", error=str(error))
+                logger.warning(f"联合检索知识库 {knowledge_base.id} 失败，跳过: {str(error)}")
+                continue
+            status.update(hits=len(results), took_ms=round(took_ms, 1))
+            scores = normalize_scores([distance for _, distance in results], normalization)
+            for (document, distance), score in zip(results, scores):
+                candidates.append((score, -distance, knowledge_base, document, distance))
+
+        merged = heapq.nlargest(k, candidates, key=lambda candidate: (candidate[0], candidate[1]))
+        took_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"联合检索完成，知识库数: {len(knowledge_bases)}，超时: {len(timed_out)}，"
+                    f"返回: {len(merged)}，耗时: {took_ms}ms")
+        return {
+            "results": [{
+                **self.knowledge_search_service.format_result(document, distance),
+                "knowledge_id": knowledge_base.id,
+                "knowledge_name": knowledge_base.name,
+                "distance": float(distance),
+                "score": round(score, 6),
+            } for score, _, knowledge_base, document, distance in merged],
+            "knowledge_bases": list(statuses.values()),
+            "took_ms": took_ms,
+        }
+
+    @staticmethod
+    def _wait_for_searches(futures: Dict[Future, Any], start_times: Dict[int, float],
+                           timeout: float) -> Tuple[Set[Future], Set[Future]]:
+        """
+        等待各知识库的检索完成，每个知识库的超时从它在线程池中开始执行时算起
+
+        尚未开始的检索最多排队 timeout 秒，到期后立即从线程池队列中取消；在排队截止前开始的检索，
+        其截止时间必然晚于排队截止，所以只需在有检索完成或到达最早的截止时间时醒来重新检查。
+
+        Args:
+            futures: 检索任务到知识库的映射
+            start_times: 知识库ID到检索开始时间的映射，由线程池中的检索任务写入
+            timeout: 单个知识库的检索超时（秒）
+
+        Returns:
+            已完成的任务集合和超时的任务集合，超时的任务中已取消的是排队超时
+        """
+        queue_deadline = time.perf_counter() + timeout
+        pending, done, timed_out = set(futures), set(), set()
+        while pending:
+            now = time.perf_counter()
+            deadlines = {}
+            for future in pending:
+                started = start_times.get(futures[future].id)
+                deadlines[future] = queue_deadline if started is None else started + timeout
+            expired = {future for future, deadline in deadlines.items() if deadline <= now and not future.done()}
+            for future in expired:
+                future.cancel()
+            timed_out |= expired
+            pending -= expired
+            if not pending:
+                break
+            finished, pending = wait(pending, timeout=max(min(deadlines[future] for future in pending) - now, 0),
+                                     return_when=FIRST_COMPLETED)
+            done |= finished
+        return done, timed_out
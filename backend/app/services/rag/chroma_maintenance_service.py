@@ -0,0 +1,412 @@
+import os
+import re
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set
+
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+from loguru import logger
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud.docs import DocsCRUD
+from app.vector_store.metadata_schema import normalize_metadata
+
+# HNSW 段目录 header.bin 的布局（hnswlib saveIndex）：version, offsetLevel0, max_elements, cur_element_count,
+# size_data_per_element, label_offset, offsetData, maxlevel, enterpoint_node, maxM, maxM0, M, mult, ef_construction
+HNSW_HEADER_FORMAT = "<IQQQQQQiIQQQdQ"
+SEGMENT_DIR_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+COMPACT_SUFFIX = "__compact"
+OLD_SUFFIX = "__old"
+SQLITE_TIMEOUT = 30
+
+
+class ChromaMaintenance:
+    """
+    Chroma 本地持久化目录的维护工具
+
+    Chroma 删除记录时只在 HNSW 索引中打删除标记，SQLite 中被删除的行留下空闲页，频繁删除和重新切分的集合
+    会越来越大、检索越来越慢。本工具提供：
+    1. 统计：每个集合的磁盘占用、有效记录数、索引元素数、估算的已删除比例、待写入索引的队列长度
+    2. 压缩：把碎片化的集合分批复制到新集合（不重新嵌入），切换名称后删除旧集合
+    3. 清理：删除不属于任何集合的 HNSW 段目录，对 SQLite 元数据库执行 VACUUM
+
+    压缩按批复制、批间暂停，切换后等待宽限期再补齐切换期间写入旧集合的记录，可以在服务运行时执行。
+    已删除数量由 HNSW 头部的元素数与有效记录数之差估算，未同步到索引的新写入不计入。
+    """
+
+    def __init__(self, batch_size: int, batch_pause: float, deleted_ratio_threshold: float, grace_seconds: float):
+        """
+        初始化维护工具
+
+        Args:
+            batch_size: 压缩时每批复制的记录数
+            batch_pause: 批与批之间的暂停时间（秒）
+            deleted_ratio_threshold: 估算删除比例达到该值的集合视为碎片化，需要压缩
+            grace_seconds: 切换集合名称后等待进行中写入完成的时间（秒），也是孤立段目录的最短保留时间
+        """
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.deleted_ratio_threshold = deleted_ratio_threshold
+        self.grace_seconds = grace_seconds
+        self._lock = threading.Lock()
+        self.last_run: Dict[str, Any] = {}
+
+    @property
+    def persist_path(self) -> Path:
+        return Path(settings.chroma_file_path)
+
+    @property
+    def sqlite_path(self) -> Path:
+        return self.persist_path / "chroma.sqlite3"
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _get_client(self):
+        """与 langchain_chroma 使用相同的参数创建客户端，同一进程内共享底层实例"""
+        return chromadb.PersistentClient(path=str(self.persist_path), settings=ChromaSettings())
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """以只读方式查询 Chroma 的 SQLite 元数据库"""
+        connection = sqlite3.connect(f"file:{self.sqlite_path}?mode=ro", uri=True, timeout=SQLITE_TIMEOUT)
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    def collect_stats(self) -> Dict[str, Any]:
+        """
+        统计持久化目录中各集合和 SQLite 元数据库的状态
+
+        Returns:
+            包含 SQLite 统计、集合列表、孤立段目录和上次维护结果的字典
+        """
+        if not self.sqlite_path.exists():
+            return {"path": str(self.persist_path), "sqlite": None, "collections": [], "orphan_segments": [],
+                    "running": self.running, "last_run": self.last_run}
+
+        client = self._get_client()
+        vector_segments = {collection_id: segment_id for segment_id, collection_id in self._query(
+            "SELECT id, collection FROM segments WHERE scope = 'VECTOR'")}
+        collections = [self._collection_stats(collection, vector_segments.get(str(collection.id)))
+                       for collection in client.list_collections()]
+        return {
+            "path": str(self.persist_path),
+            "sqlite": self._sqlite_stats(),
+            "collections": sorted(collections, key=lambda item: item["size_bytes"], reverse=True),
+            "orphan_segments": [{"segment_id": path.name, "size_bytes": self._dir_size(path)}
+                                for path in self._find_orphan_segments()],
+            "running": self.running,
+            "last_run": self.last_run,
+        }
+
+    def _collection_stats(self, collection, segment_id: Optional[str]) -> Dict[str, Any]:
+        """统计单个集合：有效记录数来自元数据段，索引元素数来自 HNSW 段头部"""
+        live_count = collection.count()
+        segment_path = self.persist_path / segment_id if segment_id else None
+        header = self._read_hnsw_header(segment_path) if segment_path else None
+        index_elements = header["cur_element_count"] if header else 0
+        estimated_deleted = max(index_elements - live_count, 0)
+        deleted_ratio = round(estimated_deleted / index_elements, 4) if index_elements else 0.0
+        queue_pending = self._queue_pending(str(collection.id), segment_id) if segment_id else 0
+
+        if deleted_ratio >= self.deleted_ratio_threshold and estimated_deleted > 0:
+            health = "fragmented"
+        elif header is None and live_count >= self._sync_threshold(collection):
+            health = "missing_index"
+        else:
+            health = "ok"
+        return {
+            "id": str(collection.id),
+            "name": collection.name,
+            "live_count": live_count,
+            "index_elements": index_elements,
+            "index_capacity": header["max_elements"] if header else 0,
+            "estimated_deleted": estimated_deleted,
+            "deleted_ratio": deleted_ratio,
+            "queue_pending": queue_pending,
+            "size_bytes": self._dir_size(segment_path) if segment_path and segment_path.exists() else 0,
+            "health": health,
+        }
+
+    @staticmethod
+    def _sync_threshold(collection) -> int:
+        """未达到同步阈值的小集合还没有写出 HNSW 段文件，不算缺失索引"""
+        hnsw_config = (collection.configuration or {}).get("hnsw") or {}
+        return hnsw_config.get("sync_threshold") or 1000
+
+    @staticmethod
+    def _read_hnsw_header(segment_path: Path) -> Optional[Dict[str, Any]]:
+        header_path = segment_path / "header.bin"
+        if not header_path.exists():
+            return None
+        data = header_path.read_bytes()
+        if len(data) < struct.calcsize(HNSW_HEADER_FORMAT):
+            logger.warning(f"HNSW头部文件不完整: {header_path}")
+            return None
+        fields = struct.unpack_from(HNSW_HEADER_FORMAT, data)
+        return {"max_elements": fields[2], "cur_element_count": fields[3]}
+
+    def _queue_pending(self, collection_id: str, segment_id: str) -> int:
+        """写入队列中尚未同步到 HNSW 索引的记录数"""
+        rows = self._query(
+            "SELECT COUNT(*) FROM embeddings_queue WHERE topic LIKE ? AND seq_id > "
+            "COALESCE((SELECT seq_id FROM max_seq_id WHERE segment_id = ?), 0)",
+            (f"%/{collection_id}", segment_id))
+        return rows[0][0]
+
+    def _sqlite_stats(self) -> Dict[str, Any]:
+        page_size = self._query("PRAGMA page_size")[0][0]
+        page_count = self._query("PRAGMA page_count")[0][0]
+        freelist_count = self._query("PRAGMA freelist_count")[0][0]
+        return {
+            "size_bytes": self.sqlite_path.stat().st_size,
+            "page_size": page_size,
+            "page_count": page_count,
+            "freelist_count": freelist_count,
+            "free_ratio": round(freelist_count / page_count, 4) if page_count else 0.0,
+        }
+
+    @staticmethod
+    def _dir_size(path: Path) -> int:
+        return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+    def _find_orphan_segments(self) -> List[Path]:
+        """查找不属于任何段、且超过宽限期未修改的段目录，避免误删刚创建的集合"""
+        segment_ids = {row[0] for row in self._query("SELECT id FROM segments")}
+        deadline = time.time() - self.grace_seconds
+        return [path for path in self.persist_path.iterdir()
+                if path.is_dir() and SEGMENT_DIR_PATTERN.match(path.name)
+                and path.name not in segment_ids and path.stat().st_mtime < deadline]
+
+    def run(self, collection_names: Optional[List[str]] = None, force: bool = False,
+            vacuum: bool = True) -> Dict[str, Any]:
+        """
+        执行一轮维护：压缩碎片化（或指定）的集合，删除孤立段目录，对 SQLite 执行 VACUUM
+
+        Args:
+            collection_names: 只处理这些集合，默认处理全部碎片化的集合
+            force: 指定集合时忽略碎片化判断，直接压缩
+            vacuum: 是否对 SQLite 元数据库执行 VACUUM
+
+        Returns:
+            维护结果，包含每个集合的压缩结果、删除的孤立段目录、VACUUM 前后大小和耗时
+
+        Raises:
+            RuntimeError: 已有维护任务在运行
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Chroma维护任务正在运行")
+        try:
+            started = time.perf_counter()
+            stats = self.collect_stats()
+            candidates = [item for item in stats["collections"]
+                          if not item["name"].endswith((COMPACT_SUFFIX, OLD_SUFFIX))
+                          and (collection_names is None or item["name"] in collection_names)
+                          and ((force and collection_names is not None) or item["health"] == "fragmented")]
+            result: Dict[str, Any] = {"compacted": [], "failed": [], "orphan_segments_removed": []}
+            for item in candidates:
+                try:
+                    result["compacted"].append(self.compact_collection(item["name"]))
+                except Exception as error:
+                    logger.error(f"压缩Chroma集合 {item['name']} 失败: {str(error)}")
+                    result["failed"].append({"name": item["name"], "error": str(error)})
+
+            result["orphan_segments_removed"] = self.remove_orphan_segments()
+            if vacuum:
+                result["vacuum"] = self.vacuum()
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            logger.info(f"Chroma维护完成: {result}")
+            self.last_run = result
+            return result
+        finally:
+            self._lock.release()
+
+    def compact_collection(self, name: str) -> Dict[str, Any]:
+        """
+        压缩单个集合：复制有效记录到新集合并按ID对齐，交换名称，宽限期后补齐旧集合的迟到写入并删除旧集合
+
+        交换名称的两次改名之间，对该集合的读请求会短暂看到空结果；
+        如果期间有请求以原名称新建了集合，其中的记录会并入压缩后的集合。
+
+        Args:
+            name: 集合名称
+
+        Returns:
+            压缩结果，包含复制、补齐的记录数量和压缩前后的段目录大小
+        """
+        started = time.perf_counter()
+        client = self._get_client()
+        source = client.get_collection(name, embedding_function=None)
+        size_before = self._collection_size(source)
+        compact_name, old_name = f"{name}{COMPACT_SUFFIX}", f"{name}{OLD_SUFFIX}"
+        for leftover in (compact_name, old_name):
+            if leftover in {collection.name for collection in client.list_collections()}:
+                raise RuntimeError(f"集合 {leftover} 已存在，可能是上次压缩中断的残留，请人工确认后删除")
+
+        logger.info(f"开始压缩Chroma集合 {name}，有效记录数: {source.count()}")
+        target = client.create_collection(compact_name, embedding_function=None, metadata=source.metadata,
+                                          configuration=source.configuration)
+        try:
+            copied_count = self._copy_all(source, target)
+            source_ids, target_ids = self._collect_ids(source), self._collect_ids(target)
+            stale_ids = list(target_ids - source_ids)
+            for start in range(0, len(stale_ids), self.batch_size):
+                target.delete(ids=stale_ids[start:start + self.batch_size])
+            missing_count = self._copy_by_ids(source, target, list(source_ids - target_ids))
+
+            source.modify(name=old_name)
+        except Exception:
+            client.delete_collection(compact_name)
+            raise
+        self._swap_in(client, target, name)
+
+        # 交换前已获取旧集合的请求可能仍在写入，宽限期后把仍有效的记录补到新集合
+        time.sleep(self.grace_seconds)
+        late_ids = list(self._collect_ids(source) - self._collect_ids(target))
+        db_session = SessionLocal()
+        try:
+            late_ids = DocsCRUD(db=db_session).filter_existing_chunk_ids(late_ids) if late_ids else []
+        finally:
+            db_session.close()
+        late_count = self._copy_by_ids(source, target, late_ids)
+        client.delete_collection(old_name)
+
+        result = {
+            "name": name,
+            "copied": copied_count,
+            "missing_copied": missing_count,
+            "late_copied": late_count,
+            "size_before": size_before,
+            "size_after": self._collection_size(target),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        logger.info(f"Chroma集合 {name} 压缩完成: {result}")
+        return result
+
+    def _swap_in(self, client, target, name: str) -> None:
+        """把压缩后的集合改为原名称；改名间隙中被新建的同名集合会先并入再删除"""
+        try:
+            target.modify(name=name)
+            return
+        except Exception as error:
+            logger.warning(f"集合 {name} 在压缩切换期间被重新创建，合并其中的记录: {str(error)}")
+        intruder = client.get_collection(name, embedding_function=None)
+        self._copy_all(intruder, target)
+        client.delete_collection(name)
+        target.modify(name=name)
+
+    def _collection_size(self, collection) -> int:
+        rows = self._query("SELECT id FROM segments WHERE scope = 'VECTOR' AND collection = ?", (str(collection.id),))
+        segment_path = self.persist_path / rows[0][0] if rows else None
+        return self._dir_size(segment_path) if segment_path and segment_path.exists() else 0
+
+    def _copy_all(self, source, target) -> int:
+        """分批复制集合中的全部记录，批间暂停以降低对在线请求的影响"""
+        copied_count, offset = 0, 0
+        while True:
+            result = source.get(limit=self.batch_size, offset=offset,
+                                include=["embeddings", "metadatas", "documents"])
+            if not result["ids"]:
+                return copied_count
+            self._upsert(target, result)
+            copied_count += len(result["ids"])
+            offset += len(result["ids"])
+            time.sleep(self.batch_pause)
+
+    def _copy_by_ids(self, source, target, ids: List[str]) -> int:
+        copied_count = 0
+        for start in range(0, len(ids), self.batch_size):
+            result = source.get(ids=ids[start:start + self.batch_size],
+                                include=["embeddings", "metadatas", "documents"])
+            if result["ids"]:
+                self._upsert(target, result)
+                copied_count += len(result["ids"])
+            time.sleep(self.batch_pause)
+        return copied_count
+
+    @staticmethod
+    def _upsert(target, result: Dict[str, Any]) -> None:
+        # 复制时顺带把旧格式的元数据（JSON 编码的 tags 等）转换为类型化字段；Chroma 不接受空字典元数据
+        metadatas = [normalize_metadata(metadata, drop_empty_arrays=True) if metadata else None
+                     for metadata in result["metadatas"]]
+        target.upsert(ids=result["ids"], embeddings=result["embeddings"], documents=result["documents"],
+                      metadatas=[metadata or None for metadata in metadatas])
+
+    def _collect_ids(self, collection) -> Set[str]:
+        ids, offset = set(), 0
+        while True:
+            result = collection.get(limit=self.batch_size, offset=offset, include=[])
+            if not result["ids"]:
+                return ids
+            ids.update(result["ids"])
+            offset += len(result["ids"])
+
+    def remove_orphan_segments(self) -> List[str]:
+        """
+        删除不属于任何集合的 HNSW 段目录
+
+        Returns:
+            被删除的段目录名称列表
+        """
+        removed = []
+        for path in self._find_orphan_segments():
+            logger.info(f"删除孤立的Chroma段目录: {path}")
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path.name)
+        return removed
+
+    def vacuum(self) -> Dict[str, Any]:
+        """
+        对 Chroma 的 SQLite 元数据库执行 VACUUM，回收删除记录留下的空闲页
+
+        使用独立连接并设置忙等待超时，服务正在写入时等待而不是失败。
+
+        Returns:
+            VACUUM 前后的文件大小和耗时
+        """
+        started = time.perf_counter()
+        size_before = os.path.getsize(self.sqlite_path)
+        connection = sqlite3.connect(str(self.sqlite_path), timeout=SQLITE_TIMEOUT, isolation_level=None)
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+        result = {
+            "size_before": size_before,
+            "size_after": os.path.getsize(self.sqlite_path),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        logger.info(f"Chroma元数据库VACUUM完成: {result}")
+        return result
+
+
+chroma_maintenance = ChromaMaintenance(
+    batch_size=settings.chroma_maintenance_batch_size,
+    batch_pause=settings.chroma_maintenance_batch_pause,
+    deleted_ratio_threshold=settings.chroma_compact_deleted_ratio,
+    grace_seconds=settings.chroma_maintenance_grace_seconds,
+)
+
+
+def run_chroma_maintenance(collection_names: Optional[List[str]] = None, force: bool = False,
+                           vacuum: bool = True) -> None:
+    """
+    后台任务：执行一轮 Chroma 维护，失败只记录日志
+
+    Args:
+        collection_names: 只处理这些集合，默认处理全部碎片化的集合
+        force: 指定集合时忽略碎片化判断，直接压缩
+        vacuum: 是否对 SQLite 元数据库执行 VACUUM
+    """
+    try:
+        chroma_maintenance.run(collection_names=collection_names, force=force, vacuum=vacuum)
+    except Exception as error:
+        logger.error(f"后台Chroma维护失败: {str(error)}")
@@ -0,0 +1,190 @@
+from hashlib import blake2b
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+from app.crud.docs import DocsCRUD
+from app.utils.chunk_record import ChunkRecord
+
+SIMHASH_BITS = 64
+# 字符级 shingle 长度：对中文和英文都适用，不依赖分词
+SHINGLE_SIZE = 4
+DEDUP_SCOPES = ("document", "knowledge_base")
+DEDUP_MODES = ("collapse", "skip")
+
+
+def compute_simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """
+    计算文本的64位SimHash签名
+
+    文本统一小写并合并空白后取字符 shingle 集合，每个 shingle 用 blake2b 取64位哈希，
+    逐位投票得到签名。内容相近的文本签名的海明距离小。
+
+    Args:
+        text: 文本
+        shingle_size: shingle 长度（字符数）
+
+    Returns:
+        有符号64位整数（与数据库 BIGINT 一致）
+    """
+    normalized = " ".join(text.lower().split())
+    if len(normalized) <= shingle_size:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[start:start + shingle_size] for start in range(len(normalized) - shingle_size + 1)}
+    digests = b"".join(blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big", signed=True)
+
+
+def hamming_distance(left: int, right: int) -> int:
+    """两个SimHash签名之间不同的位数"""
+    return ((left ^ right) & ((1 << SIMHASH_BITS) - 1)).bit_count()
+
+
+class SimHashIndex:
+    """
+    SimHash 近邻索引
+
+    将64位签名分为 max_distance + 1 段，海明距离不超过 max_distance 的两个签名至少有一段完全相同（抽屉原理），
+    只需比较至少一段相同的候选签名，不必与全部签名逐一比较。
+    """
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        band_count = max_distance + 1
+        band_bits = SIMHASH_BITS // band_count
+        # 每段的 (起始位, 位数)，最后一段包含余下的位
+        self._bands: List[Tuple[int, int]] = [
+            (index * band_bits, band_bits if index < band_count - 1 else SIMHASH_BITS - index * band_bits)
+            for index in range(band_count)
+        ]
+        self._buckets: List[Dict[int, List[Tuple[int, str]]]] = [{} for _ in self._bands]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _band_keys(self, simhash: int) -> List[int]:
+        unsigned = simhash & ((1 << SIMHASH_BITS) - 1)
+        return [(unsigned >> start) & ((1 << bits) - 1) for start, bits in self._bands]
+
+    def add(self, simhash: int, chunk_id: str) -> None:
+        """加入一个签名"""
+        for buckets, key in zip(self._buckets, self._band_keys(simhash)):
+            buckets.setdefault(key, []).append((simhash, chunk_id))
+        self._size += 1
+
+    def find(self, simhash: int) -> Optional[str]:
+        """
+        查找海明距离不超过 max_distance 的最近签名
+
+        Returns:
+            最近签名对应的块ID，没有时返回None
+        """
+        best_id, best_distance = None, self.max_distance + 1
+        for buckets, key in zip(self._buckets, self._band_keys(simhash)):
+            for candidate, chunk_id in buckets.get(key, ()):
+                distance = hamming_distance(simhash, candidate)
+                if distance < best_distance:
+                    best_id, best_distance = chunk_id, distance
+                    if distance == 0:
+                        return best_id
+        return best_id
+
+
+class ChunkDeduplicator:
+    """
+    入库前的近重复知识块检测
+
+    切分后对每个知识块计算 SimHash，与文档内已出现的块以及知识库已有的块比较：
+    近重复块记录代表块的块ID（duplicate_of），不嵌入、不写入向量数据库，检索时由代表块的向量召回；
+    文档内的近重复块在 skip 模式下直接丢弃。代表块被删除时，由调用方将其近重复块提升为代表块。
+    """
+
+    def __init__(self, docs_crud: DocsCRUD, max_distance: int = None, min_chars: int = None,
+                 scope: str = None, mode: str = None):
+        """
+        初始化近重复检测
+
+        Args:
+            docs_crud: 文档CRUD，用于读取知识库已有的签名
+            max_distance: 海明距离阈值，默认取配置
+            min_chars: 参与检测的最小字符数，默认取配置
+            scope: 检测范围，document 或 knowledge_base，默认取配置
+            mode: 文档内近重复块的处理方式，collapse 或 skip，默认取配置
+        """
+        self.docs_crud = docs_crud
+        self.max_distance = settings.chunk_dedup_max_distance if max_distance is None else max_distance
+        self.min_chars = settings.chunk_dedup_min_chars if min_chars is None else min_chars
+        self.scope = scope or settings.chunk_dedup_scope
+        self.mode = mode or settings.chunk_dedup_mode
+        if self.scope not in DEDUP_SCOPES:
+            raise ValueError(f"不支持的近重复检测范围: {self.scope}，可选: {', '.join(DEDUP_SCOPES)}")
+        if self.mode not in DEDUP_MODES:
+            raise ValueError(f"不支持的近重复处理方式: {self.mode}，可选: {', '.join(DEDUP_MODES)}")
+
+    def build_index(self, knowledge_id: int, exclude_document_id: Optional[int] = None) -> Optional[SimHashIndex]:
+        """
+        用知识库已有的代表块签名构建索引，检测范围为 document 时返回None
+
+        Args:
+            knowledge_id: 知识库ID
+            exclude_document_id: 排除的文档ID（重新切分或替换中的文档）
+
+        Returns:
+            SimHash 索引
+        """
+        if self.scope != "knowledge_base":
+            return None
+        index = SimHashIndex(self.max_distance)
+        for chunk_id, simhash in self.docs_crud.list_chunk_simhashes(knowledge_id, exclude_document_id):
+            index.add(simhash, chunk_id)
+        logger.debug(f"知识库 {knowledge_id} 近重复检测索引构建完成，共 {len(index)} 个签名")
+        return index
+
+    def deduplicate(self, chunks: List[ChunkRecord],
+                    knowledge_base_index: Optional[SimHashIndex] = None) -> List[ChunkRecord]:
+        """
+        标记一个文档的近重复知识块
+
+        文档内先出现的块作为代表块；与知识库索引中的块近重复时以已有的块为代表块。
+        处理完成后文档的代表块加入知识库索引，同一批上传的后续文件可以与之比较。
+
+        Args:
+            chunks: 文档的知识块列表，原地设置 simhash 和 duplicate_of
+            knowledge_base_index: 知识库索引，为None时只在文档内检测
+
+        Returns:
+            保留的知识块列表（skip 模式下不含文档内的近重复块）
+        """
+        document_index = SimHashIndex(self.max_distance)
+        kept, within_count, cross_count = [], 0, 0
+        for chunk in chunks:
+            if len(chunk.text) < self.min_chars:
+                kept.append(chunk)
+                continue
+            chunk.simhash = compute_simhash(chunk.text)
+            chunk.duplicate_of = document_index.find(chunk.simhash)
+            if chunk.duplicate_of is not None:
+                within_count += 1
+                if self.mode == "skip":
+                    continue
+            elif knowledge_base_index is not None:
+                chunk.duplicate_of = knowledge_base_index.find(chunk.simhash)
+                cross_count += chunk.duplicate_of is not None
+            if chunk.duplicate_of is None:
+                document_index.add(chunk.simhash, chunk.chunk_id)
+            kept.append(chunk)
+
+        if knowledge_base_index is not None:
+            for chunk in kept:
+                if chunk.simhash is not None and chunk.duplicate_of is None:
+                    knowledge_base_index.add(chunk.simhash, chunk.chunk_id)
+        if within_count or cross_count:
+            logger.info(f"近重复检测完成，共 {len(chunks)} 个知识块，文档内近重复 {within_count} 个"
+                        f"（{'丢弃' if self.mode == 'skip' else '不嵌入'}），与知识库已有块近重复 {cross_count} 个")
+        return kept
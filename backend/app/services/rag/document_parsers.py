@@ -0,0 +1,333 @@
+import csv
+import json
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+from xml.etree import ElementTree
+
+from llama_index.core import Document
+from llama_index.core.readers.file.base import default_file_metadata_func
+from loguru import logger
+
+from app.core.config import settings
+
+# 与 SimpleDirectoryReader 一致：文件级元数据不参与嵌入和 LLM 上下文，也不计入切分时的元数据长度
+EXCLUDED_METADATA_KEYS = ["file_name", "file_type", "file_size", "creation_date",
+                          "last_modified_date", "last_accessed_date"]
+TEXT_ENCODING = "utf-8-sig"
+CSV_COLUMN_JOINER = ", "
+DOCX_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _new_document(text: str, metadata: Dict[str, Any]) -> Document:
+    """创建原始文档，元数据排除规则与 SimpleDirectoryReader 相同"""
+    return Document(
+        text=text,
+        metadata=metadata,
+        excluded_embed_metadata_keys=list(EXCLUDED_METADATA_KEYS),
+        excluded_llm_metadata_keys=list(EXCLUDED_METADATA_KEYS),
+    )
+
+
+def _iter_blocks(lines: Iterable[str], block_chars: int, header: str = "") -> Iterator[str]:
+    """
+    将逐行读取的文本按行边界拼接为不超过 block_chars 个字符的块，单行超长时独占一块
+
+    Args:
+        lines: 行迭代器，行尾不含换行符
+        block_chars: 每块的最大字符数
+        header: 每块开头重复的表头行（CSV）
+
+    Yields:
+        文本块
+    """
+    block, block_size = [header] if header else [], len(header)
+    base_size = block_size
+    for line in lines:
+        if block_size > base_size and block_size + len(line) + 1 > block_chars:
+            yield "\n".join(block)
+            block, block_size = [header] if header else [], base_size
+        block.append(line)
+        block_size += len(line) + 1
+    if block_size > base_size:
+        yield "\n".join(block)
+
+
+class DocumentParser:
+    """
+    文档解析器基类
+
+    解析器逐页（块）产出原始文档，调用方可以边解析边处理，不需要一次性把整个文件读入内存。
+    """
+
+    # 解析器名称，用于统计
+    name = "base"
+
+    def iter_pages(self, file_path: Path, metadata: Dict[str, Any]) -> Iterator[Document]:
+        """
+        逐页解析文件
+
+        Args:
+            file_path: 文件路径
+            metadata: 文件级元数据，每页的元数据在此基础上追加
+
+        Yields:
+            每页（块）一个原始文档
+        """
+        raise NotImplementedError
+
+
+class TextParser(DocumentParser):
+    """纯文本和 Markdown：按固定字符数分块读取，在块内最后一个换行处断开，不足一行的部分并入下一块"""
+
+    name = "text"
+
+    def __init__(self, block_chars: int):
+        self.block_chars = block_chars
+
+    def iter_pages(self, file_path: Path, metadata: Dict[str, Any]) -> Iterator[Document]:
+        with open(file_path, "r", encoding=TEXT_ENCODING, errors="ignore") as file:
+            remainder = ""
+            while content := file.read(self.block_chars):
+                block = remainder + content
+                # 读到文件末尾时整块输出；整块没有换行时按字符数断开
+                cut = block.rfind("\n") if len(content) == self.block_chars else len(block) - 1
+                if cut <= 0:
+                    cut = len(block) - 1
+                block, remainder = block[:cut + 1], block[cut + 1:]
+                if block.strip():
+                    yield _new_document(block, dict(metadata))
+            if remainder.strip():
+                yield _new_document(remainder, dict(metadata))
+
+
+class JsonLinesParser(DocumentParser):
+    """JSON Lines：逐行解码后以非 ASCII 转义的形式输出，避免 \\uXXXX 转义的中文切分和嵌入效果变差"""
+
+    name = "jsonl"
+
+    def __init__(self, block_chars: int):
+        self.block_chars = block_chars
+
+    @staticmethod
+    def _iter_lines(file) -> Iterator[str]:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.dumps(json.loads(line), ensure_ascii=False)
+            except json.JSONDecodeError:
+                yield line
+
+    def iter_pages(self, file_path: Path, metadata: Dict[str, Any]) -> Iterator[Document]:
+        with open(file_path, "r", encoding=TEXT_ENCODING, errors="ignore") as file:
+            for block in _iter_blocks(self._iter_lines(file), self.block_chars):
+                yield _new_document(block, dict(metadata))
+
+
+class CsvParser(DocumentParser):
+    """CSV：逐行读取，每块开头重复表头，切块脱离上下文后仍能看到列名"""
+
+    name = "csv"
+
+    def __init__(self, block_chars: int):
+        self.block_chars = block_chars
+
+    def iter_pages(self, file_path: Path, metadata: Dict[str, Any]) -> Iterator[Document]:
+        with open(file_path, "r", encoding=TEXT_ENCODING, errors="ignore", newline="") as file:
+            rows = (CSV_COLUMN_JOINER.join(row) for row in csv.reader(file) if any(cell.strip() for cell in row))
+            header = next(rows, "")
+            blocks = _iter_blocks(rows, self.block_chars, header=header)
+            block = next(blocks, None)
+            # 只有表头的文件仍输出表头
+            if block is not None or header:
+                yield _new_document(block if block is not None else header, dict(metadata))
+            for block in blocks:
+                yield _new_document(block, dict(metadata))
+
+
+class PdfParser(DocumentParser):
+    """PDF：按页迭代提取文本，元数据与 llama_index 的 PDFReader 一致（page_label）"""
+
+    name = "pdf"
+
+    def iter_pages(self, file_path: Path, metadata: Dict[str, Any]) -> Iterator[Document]:
+        import pypdf
+
+        with open(file_path, "rb") as file:
+            pdf = pypdf.PdfReader(file)
+            page_labels = pdf.page_labels
+            for index, page in enumerate(pdf.pages):
+                yield _new_document(page.extract_text(), {"page_label": page_labels[index], **metadata})
+
+
+class DocxParser(DocumentParser):
+    """
+    Word 文档：增量解析 word/document.xml，按段落拼接为固定大小的块
+
+    只依赖标准库，不需要 docx2txt；页眉、页脚和批注不解析。
+    """
+
+    name = "docx"
+
+    def __init__(self, block_chars: int):
+        self.block_chars = block_chars
+
+    @staticmethod
+    def _iter_paragraphs(file) -> Iterator[str]:
+        for _, element in ElementTree.iterparse(file, events=("end",)):
+            if element.tag != f"{DOCX_NAMESPACE}p":
+                continue
+            pieces = []
+            for node in element.iter():
+                if node.tag == f"{DOCX_NAMESPACE}t":
+                    pieces.append(node.text or "")
+                elif node.tag == f"{DOCX_NAMESPACE}tab":
+                    pieces.append("\t")
+                elif node.tag in (f"{DOCX_NAMESPACE}br", f"{DOCX_NAMESPACE}cr"):
+                    pieces.append("\n")
+            element.clear()
+            paragraph = "".join(pieces)
+            if paragraph.strip():
+                yield paragraph
+
+    def iter_pages(self, file_path: Path, metadata: Dict[str, Any]) -> Iterator[Document]:
+        with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as file:
+            for block in _iter_blocks(self._iter_paragraphs(file), self.block_chars):
+                yield _new_document(block, dict(metadata))
+
+
+class SimpleDirectoryParser(DocumentParser):
+    """其他格式交给 SimpleDirectoryReader 整体加载，依赖对应的 llama_index 读取器"""
+
+    name = "simple_directory"
+
+    def iter_pages(self, file_path: Path, metadata: Dict[str, Any]) -> Iterator[Document]:
+        from llama_index.core import SimpleDirectoryReader
+
+        reader = SimpleDirectoryReader(input_files=[str(file_path)], raise_on_error=True)
+        yield from reader.load_data()
+
+
+class DocumentParserRegistry:
+    """
+    按文件类型（小写扩展名，与 get_file_info 的 file_type 一致）注册的文档解析器
+
+    每次解析记录页数和解析耗时（只计解析器本身，不含调用方处理每页的时间），按文件类型累计页/秒。
+    """
+
+    def __init__(self):
+        self._parsers: Dict[str, DocumentParser] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, parser: DocumentParser, file_types: Iterable[str]) -> None:
+        """
+        注册解析器，已注册的文件类型会被覆盖
+
+        Args:
+            parser: 解析器实例
+            file_types: 文件类型列表，不含点号
+        """
+        for file_type in file_types:
+            self._parsers[file_type.lower().lstrip(".")] = parser
+
+    @property
+    def supported_types(self) -> List[str]:
+        return sorted(self._parsers)
+
+    def get_parser(self, file_type: str) -> Optional[DocumentParser]:
+        return self._parsers.get((file_type or "").lower().lstrip("."))
+
+    def is_supported(self, file_name: str) -> bool:
+        """根据文件名的扩展名判断是否有可用的解析器"""
+        return self.get_parser(Path(file_name or "").suffix) is not None
+
+    def iter_pages(self, file_path: str) -> Iterator[Document]:
+        """
+        逐页解析文件，解析结束后记录页数和页/秒
+
+        Args:
+            file_path: 文件路径
+
+        Yields:
+            每页（块）一个原始文档
+
+        Raises:
+            ValueError: 不支持的文件类型
+        """
+        path = Path(file_path)
+        file_type = path.suffix.lower().lstrip(".")
+        parser = self.get_parser(file_type)
+        if parser is None:
+            raise ValueError(f"不支持的文件类型: {file_type or '无扩展名'}，支持的类型: {', '.join(self.supported_types)}")
+
+        pages = parser.iter_pages(path, default_file_metadata_func(str(path)))
+        page_count, char_count, parse_seconds = 0, 0, 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    page = next(pages)
+                except StopIteration:
+                    break
+                finally:
+                    parse_seconds += time.perf_counter() - started
+                page_count += 1
+                char_count += len(page.text)
+                yield page
+        except Exception:
+            self._record(file_type, parser, 0, 0, parse_seconds, failed=True)
+            raise
+        finally:
+            pages.close()
+
+        self._record(file_type, parser, page_count, char_count, parse_seconds)
+        logger.info(f"文件解析完成: {path.name}，解析器 {parser.name}，{page_count} 页，{char_count} 字符，"
+                    f"耗时 {parse_seconds:.3f}s，{page_count / parse_seconds if parse_seconds else 0:.1f} 页/秒")
+
+    def load(self, file_path: str) -> List[Document]:
+        """解析整个文件，返回全部页面"""
+        return list(self.iter_pages(file_path))
+
+    def _record(self, file_type: str, parser: DocumentParser, pages: int, chars: int, seconds: float,
+                failed: bool = False) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(file_type, {"parser": parser.name, "files": 0, "failed": 0,
+                                                       "pages": 0, "chars": 0, "seconds": 0.0})
+            stats["failed" if failed else "files"] += 1
+            stats["pages"] += pages
+            stats["chars"] += chars
+            stats["seconds"] += seconds
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取各文件类型的累计解析统计
+
+        Returns:
+            文件类型 -> 解析器名称、文件数、失败数、页数、字符数、耗时和页/秒
+        """
+        with self._lock:
+            return {file_type: {**stats, "seconds": round(stats["seconds"], 3),
+                                "pages_per_s": round(stats["pages"] / stats["seconds"], 1) if stats["seconds"] else 0}
+                    for file_type, stats in self._stats.items()}
+
+
+def create_default_registry() -> DocumentParserRegistry:
+    """创建注册了内置解析器和 SimpleDirectoryReader 兜底类型的解析器注册表"""
+    registry = DocumentParserRegistry()
+    fallback_types = [file_type.strip() for file_type in settings.document_parser_fallback_types.split(",")
+                      if file_type.strip()]
+    registry.register(SimpleDirectoryParser(), fallback_types)
+    registry.register(TextParser(settings.document_parser_block_chars), ["txt", "md", "markdown"])
+    registry.register(JsonLinesParser(settings.document_parser_block_chars), ["jsonl"])
+    registry.register(CsvParser(settings.document_parser_block_chars), ["csv"])
+    registry.register(PdfParser(), ["pdf"])
+    registry.register(DocxParser(settings.document_parser_block_chars), ["docx"])
+    return registry
+
+
+document_parser_registry = create_default_registry()
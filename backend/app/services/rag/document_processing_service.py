@@ -1,20 +1,28 @@
+import gzip
 import json
 import os
 import shutil
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from fastapi import UploadFile
-from langchain_core.documents import Document as LangchainDocument
 from llama_index.core import Document
-from llama_index.core import SimpleDirectoryReader
-from llama_index.core.node_parser import SentenceSplitter
 from loguru import logger
 
 from app.core.config import settings
+from app.core.database import SessionLocal
 from app.crud.docs import DocsCRUD
+from app.crud.knowledge import KnowledgeBaseDB
+from app.models.knowledge import TextSplitterType
+from app.services.rag.chunk_dedup_service import ChunkDeduplicator, SimHashIndex
+from app.services.rag.document_parsers import document_parser_registry
+from app.services.rag.knowledge_task_registry import knowledge_task_registry
+from app.llm.cached_embeddings import CachedEmbeddings
+from app.llm.projected_embeddings import get_knowledge_base_embeddings, get_projection_path
+from app.utils.chunk_record import ChunkRecord
 from app.utils.file_utils import sanitize_filename, get_file_info
-from app.utils.metadata_enricher import process_pdf_documents
+from app.utils.metadata_enricher import build_chunk_records
+from app.utils.text_splitter import get_text_splitter
 from app.vector_store.text_vector_store import TextVectorStore
 
 
@@ -53,7 +61,10 @@ class DocumentProcessingService:
         """
         try:
             logger.info(f"开始处理文档，知识库ID: {processing_params.get('knowledge_id')}")
-            collection_name = f'kb_{processing_params.get("knowledge_id")}'
+            collection_name = TextVectorStore.for_knowledge_base(
+                knowledge_id=processing_params.get("knowledge_id"),
+                store_type=processing_params.get("vector_store_type")
+            ).collection_name
 
             logger.debug("开始保存上传的文件")
             saved_file_paths = await self._save_uploaded_files(
@@ -62,6 +73,9 @@ class DocumentProcessingService:
             )
             logger.info(f"成功保存 {len(saved_file_paths)} 个文件")
 
+            # 近重复检测索引在整批文件间共享，后处理的文件也与先处理的文件比较
+            dedup_index = self._build_dedup_index(knowledge_id=processing_params.get("knowledge_id"))
+
             # 逐个处理每个文件
             for idx, file_path in enumerate(saved_file_paths):
                 logger.info(f"开始处理第 {idx+1}/{len(saved_file_paths)} 个文件: {file_path}")
@@ -71,9 +85,11 @@ class DocumentProcessingService:
                     kb_uuid=processing_params.get("kb_uuid"),
                     chunk_size=processing_params.get("chunk_size"),
                     chunk_overlap=processing_params.get("chunk_overlap"),
+                    splitter_type=processing_params.get("splitter_type", TextSplitterType.SENTENCE.value),
                     tags=processing_params.get("tags"),
                     collection_name=collection_name,
-                    vector_store_type=processing_params.get("vector_store_type")
+                    vector_store_type=processing_params.get("vector_store_type"),
+                    dedup_index=dedup_index
                 )
                 logger.info(f"完成处理文件: {file_path}")
 
@@ -100,7 +116,9 @@ class DocumentProcessingService:
             chunk_overlap: int,
             tags: List[str],
             collection_name: str,
-            vector_store_type: str
+            vector_store_type: str,
+            splitter_type: str = TextSplitterType.SENTENCE.value,
+            dedup_index: Optional[SimHashIndex] = None
     ) -> None:
         """
         处理单个文件的完整流程
@@ -114,6 +132,8 @@ class DocumentProcessingService:
             tags: 标签列表
             collection_name: 集合名称
             vector_store_type: 向量存储类型
+            splitter_type: 文档切分器类型
+            dedup_index: 知识库的近重复检测索引，为None时只在文档内检测
         """
         logger.info(f"开始处理单个文件: {file_path}")
 
@@ -128,21 +148,24 @@ class DocumentProcessingService:
 
         # 加载并分割文档
         logger.debug("加载并分割文档")
-        processed_documents = await self._load_and_split_document(
+        chunks = await self._load_and_split_document(
             file_path=file_path,
+            document_id=document_id,
             kb_uuid=kb_uuid,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            tags=tags
+            tags=tags,
+            splitter_type=splitter_type
         )
-        logger.info(f"文档分割完成，共生成 {len(processed_documents)} 个文档块")
+        logger.info(f"文档分割完成，共生成 {len(chunks)} 个文档块")
+        chunks = self._deduplicate_chunks(chunks=chunks, knowledge_base_index=dedup_index)
 
-        # 存储到向量数据库
+        # 存储到向量数据库，块ID由文档ID和块内容确定，便于替换文档时按ID比较；近重复块不嵌入
         logger.debug("存储文档到向量数据库")
         inserted_document_ids = await self._store_documents_to_vector_db(
-            collection_name=collection_name,
+            knowledge_id=knowledge_id,
             store_type=vector_store_type,
-            document_list=processed_documents
+            chunks=[chunk for chunk in chunks if chunk.duplicate_of is None]
         )
         logger.info(f"文档存储完成，插入 {len(inserted_document_ids)} 个文档")
 
@@ -150,8 +173,7 @@ class DocumentProcessingService:
         logger.debug("创建知识块记录")
         await self._create_chunk_records(
             document_id=document_id,
-            documents=processed_documents,
-            document_ids=inserted_document_ids
+            chunks=chunks
         )
         logger.info("知识块记录创建完成")
 
@@ -167,9 +189,17 @@ class DocumentProcessingService:
             保存成功的文件路径列表
 
         Raises:
+            ValueError: 存在不支持的文件类型，此时不写入任何文件
             Exception: 文件保存过程中发生的任何异常
         """
         logger.info(f"开始保存上传的文件到知识库 {kb_uuid}")
+        unsupported_files = [file.filename for file in files
+                             if file.filename and not document_parser_registry.is_supported(file.filename.rstrip(". "))]
+        if unsupported_files:
+            logger.error(f"存在不支持的文件类型: {unsupported_files}")
+            raise ValueError(f"不支持的文件类型: {', '.join(unsupported_files)}，"
+                             f"支持的类型: {', '.join(document_parser_registry.supported_types)}")
+
         knowledge_base_directory = self.upload_directory / str(kb_uuid)
         knowledge_base_directory.mkdir(exist_ok=True)
         logger.debug(f"知识库目录: {knowledge_base_directory}")
@@ -225,23 +255,27 @@ class DocumentProcessingService:
     async def _load_and_split_document(
             self,
             file_path: str,
+            document_id: int,
             kb_uuid: str,
             chunk_size: int,
             chunk_overlap: int,
-            tags: List[str]
-    ) -> List[LangchainDocument]:
+            tags: List[str],
+            splitter_type: str = TextSplitterType.SENTENCE.value
+    ) -> List[ChunkRecord]:
         """
-        使用LlamaIndex加载并分割文档
+        加载并分割文档
 
         Args:
             file_path: 文件路径
+            document_id: 文档ID，用于保存解析产物
             kb_uuid: 知识库UUID
             chunk_size: 分块大小
             chunk_overlap: 分块重叠大小
             tags: 标签列表
+            splitter_type: 文档切分器类型
 
         Returns:
-            分割后的文档列表
+            完成元数据增强的知识块列表
 
         Raises:
             FileNotFoundError: 文件未找到
@@ -249,48 +283,20 @@ class DocumentProcessingService:
         """
         logger.info(f"开始加载并分割文档: {file_path}")
         try:
-            logger.debug(f"创建SimpleDirectoryReader，文件路径: {file_path}")
-            reader = SimpleDirectoryReader(
-                input_files=[file_path],
-                raise_on_error=True
-            )
+            raw_documents = self._load_document(file_path=file_path)
 
-            # 加载原始文档
-            logger.debug("开始加载原始文档")
-            raw_documents = reader.load_data()
-            logger.info(f"文档加载完成，共加载 {len(raw_documents)} 个文档")
-
-            # 分割文档
-            logger.debug("开始分割文档")
-            split_documents = []
-            splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            logger.debug(f"使用分割器，chunk_size={chunk_size}, chunk_overlap={chunk_overlap}")
-
-            # 将单个文档分割成多个块
-            logger.debug("从文档中获取节点")
-            split_nodes = splitter.get_nodes_from_documents(raw_documents)
-            logger.info(f"文档分割完成，共生成 {len(split_nodes)} 个节点")
-
-            # 将分割后的节点转换回文档对象
-            logger.debug("将节点转换为文档对象")
-            for idx, node in enumerate(split_nodes):
-                split_doc = Document(
-                    text=node.text,
-                    metadata=node.metadata
-                )
-                split_documents.append(split_doc)
-            logger.info(f"节点转换完成，共转换 {len(split_documents)} 个文档")
+            # 保存解析产物，修改切片配置后重新切分时无需再次解析原文件
+            self._save_parse_artifact(kb_uuid=kb_uuid, document_id=document_id, raw_documents=raw_documents)
 
-            # 对分割后的文档进行元数据增强
-            logger.debug("对文档进行元数据增强")
-            enhanced_documents = process_pdf_documents(
-                documents=split_documents,
+            return self._split_documents(
+                raw_documents=raw_documents,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                splitter_type=splitter_type,
                 kb_uuid=kb_uuid,
-                tags=tags
+                tags=tags,
+                document_id=document_id
             )
-            logger.info("文档元数据增强完成")
-
-            return enhanced_documents
 
         except FileNotFoundError:
             logger.error(f"文件未找到: {file_path}")
@@ -299,6 +305,113 @@ class DocumentProcessingService:
             logger.error(f"使用 LlamaIndex 加载并分割文档时出错: {str(error)}")
             raise Exception(f"加载并分割文档失败: {str(error)}") from error
 
+    @staticmethod
+    def _load_document(file_path: str) -> List[Document]:
+        """
+        按文件类型选择解析器加载原始文档，见 document_parsers
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            原始文档列表（PDF按页、文本类文件按块返回多个文档）
+        """
+        logger.debug(f"开始加载原始文档: {file_path}")
+        raw_documents = document_parser_registry.load(file_path)
+        logger.info(f"文档加载完成，共加载 {len(raw_documents)} 个文档")
+        return raw_documents
+
+    @staticmethod
+    def _split_documents(raw_documents: List[Document], chunk_size: int, chunk_overlap: int,
+                         splitter_type: str, kb_uuid: str, tags: List[str], document_id: int) -> List[ChunkRecord]:
+        """
+        将原始文档分割为知识块并增强元数据
+
+        Args:
+            raw_documents: 原始文档列表
+            chunk_size: 分块大小
+            chunk_overlap: 分块重叠大小
+            splitter_type: 切分器类型，见 TextSplitterType
+            kb_uuid: 知识库UUID
+            tags: 标签列表
+            document_id: 文档ID
+
+        Returns:
+            知识块列表，块ID由文档ID和块内容确定
+        """
+        splitter = get_text_splitter(splitter_type, chunk_size, chunk_overlap)
+        logger.debug(f"使用分割器 {splitter_type}，chunk_size={chunk_size}, chunk_overlap={chunk_overlap}")
+        chunks = build_chunk_records(raw_documents=raw_documents, splitter=splitter, kb_uuid=kb_uuid,
+                                     document_id=document_id, tags=tags)
+        logger.info(f"文档分割完成，共生成 {len(chunks)} 个知识块")
+        return chunks
+
+    def _build_dedup_index(self, knowledge_id: int, exclude_document_id: Optional[int] = None
+                           ) -> Optional[SimHashIndex]:
+        """构建知识库的近重复检测索引，未启用或只在文档内检测时返回None"""
+        if not self.settings.chunk_dedup_enabled:
+            return None
+        return ChunkDeduplicator(self.docs_crud).build_index(knowledge_id, exclude_document_id=exclude_document_id)
+
+    def _deduplicate_chunks(self, chunks: List[ChunkRecord],
+                            knowledge_base_index: Optional[SimHashIndex] = None) -> List[ChunkRecord]:
+        """
+        标记近重复知识块，见 ChunkDeduplicator
+
+        Args:
+            chunks: 文档的知识块列表
+            knowledge_base_index: 知识库的近重复检测索引
+
+        Returns:
+            保留的知识块列表，duplicate_of 不为空的块不写入向量数据库
+        """
+        if not self.settings.chunk_dedup_enabled:
+            return chunks
+        return ChunkDeduplicator(self.docs_crud).deduplicate(chunks, knowledge_base_index=knowledge_base_index)
+
+    def _promote_duplicates(self, knowledge_base, canonical_chunk_ids: List[str],
+                            exclude_document_id: Optional[int] = None) -> int:
+        """
+        代表块即将删除前，将其他文档中指向它们的近重复块提升为代表块
+
+        每个代表块的近重复块中第一个（按文档和块索引）嵌入并写入向量数据库，其余改为指向它。
+
+        Args:
+            knowledge_base: 知识库对象
+            canonical_chunk_ids: 即将删除向量的代表块ID
+            exclude_document_id: 排除的文档ID（正在同步的文档，其知识块已按新版本标记）
+
+        Returns:
+            提升的知识块数量
+        """
+        if not canonical_chunk_ids:
+            return 0
+        duplicates = self.docs_crud.get_duplicate_chunks(canonical_chunk_ids, exclude_document_id=exclude_document_id)
+        if not duplicates:
+            return 0
+
+        promoted, duplicate_of_by_id = {}, {}
+        for chunk in duplicates:
+            new_canonical = promoted.get(chunk.duplicate_of)
+            if new_canonical is None:
+                promoted[chunk.duplicate_of] = chunk
+                duplicate_of_by_id[chunk.id] = None
+            else:
+                duplicate_of_by_id[chunk.id] = new_canonical.chunk_id
+
+        records = [ChunkRecord.from_metadata_json(text=chunk.content, chunk_index=chunk.chunk_index,
+                                                  chunk_id=chunk.chunk_id, metadata_json=chunk.document_metadata,
+                                                  simhash=chunk.simhash)
+                   for chunk in promoted.values()]
+        text_vector_store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_base.id,
+                                                               store_type=self._get_store_type(knowledge_base))
+        inserted_ids = text_vector_store.add_chunks(records)
+        self._mirror_to_migration_target(knowledge_base.id, text_vector_store, inserted_ids)
+        self.docs_crud.update_chunk_duplicates(duplicate_of_by_id)
+        logger.info(f"知识库 {knowledge_base.id} 有 {len(records)} 个近重复块提升为代表块，"
+                    f"{len(duplicate_of_by_id) - len(records)} 个近重复块改为指向新的代表块")
+        return len(records)
+
     async def _create_document_record(
             self,
             knowledge_id: int,
@@ -338,59 +451,116 @@ class DocumentProcessingService:
     async def _create_chunk_records(
             self,
             document_id: int,
-            documents: List[LangchainDocument],
-            document_ids: List[str]
+            chunks: List[ChunkRecord]
     ) -> None:
         """
-        在数据库中创建知识块记录
+        在数据库中创建知识块记录，单个事务批量写入
 
         Args:
             document_id: 文档ID
-            documents: 文档列表
-            document_ids: 文档ID列表
+            chunks: 知识块列表
         """
         logger.info(f"创建知识块记录，文档ID: {document_id}")
-        for idx, (document, doc_id) in enumerate(zip(documents, document_ids)):
-            logger.debug(f"创建第 {idx+1}/{len(documents)} 个知识块记录")
-            chunk_data = {
-                "chunk_id": doc_id,
-                "content": document.page_content,
-                "page_label": document.metadata.get("page_label"),
-                "chunk_index": document.metadata.get("chunk_index"),
-                "document_metadata": json.dumps(document.metadata, ensure_ascii=False),
-                "document_id": document_id,
-            }
-            logger.debug(f"知识块数据: {chunk_data}")
-            self.docs_crud.create_chunk(data=chunk_data)
-        logger.info(f"知识块记录创建完成，共创建 {len(documents)} 个记录")
+        self.docs_crud.create_chunks([self._build_chunk_data(document_id=document_id, chunk=chunk)
+                                      for chunk in chunks])
+        logger.info(f"知识块记录创建完成，共创建 {len(chunks)} 个记录")
 
     @staticmethod
+    def _build_chunk_data(document_id: int, chunk: ChunkRecord) -> Dict[str, Any]:
+        """
+        构造知识块记录数据
+
+        Args:
+            document_id: 文档ID
+            chunk: 知识块
+
+        Returns:
+            知识块数据字典
+        """
+        return {
+            "chunk_id": chunk.chunk_id,
+            "content": chunk.text,
+            "page_label": chunk.page_label,  # TXT/MD 等无页码
+            "chunk_index": chunk.chunk_index,
+            "document_metadata": chunk.metadata_json(),
+            "simhash": chunk.simhash,
+            "duplicate_of": chunk.duplicate_of,
+            "document_id": document_id,
+        }
+
+    def _get_parse_artifact_path(self, kb_uuid: str, document_id: int) -> Path:
+        """获取文档解析产物的存储路径"""
+        return self.upload_directory / str(kb_uuid) / ".artifacts" / f"{document_id}.json.gz"
+
+    def _save_parse_artifact(self, kb_uuid: str, document_id: int, raw_documents: List[Document]) -> None:
+        """
+        保存文档解析产物（逐页文本及元数据，gzip压缩）
+
+        Args:
+            kb_uuid: 知识库UUID
+            document_id: 文档ID
+            raw_documents: 解析得到的原始文档列表
+        """
+        artifact_path = self._get_parse_artifact_path(kb_uuid, document_id)
+        artifact_path.parent.mkdir(parents=True, exist_ok=True)
+        # 排除字段会影响切分时的元数据长度，一并保存以保证重新切分结果一致
+        pages = [{
+            "text": document.text,
+            "metadata": document.metadata,
+            "excluded_embed_metadata_keys": document.excluded_embed_metadata_keys,
+            "excluded_llm_metadata_keys": document.excluded_llm_metadata_keys,
+        } for document in raw_documents]
+        with gzip.open(artifact_path, "wt", encoding="utf-8") as artifact_file:
+            json.dump(pages, artifact_file, ensure_ascii=False, default=str)
+        logger.debug(f"解析产物已保存: {artifact_path}")
+
+    def _load_parse_artifact(self, kb_uuid: str, document_id: int) -> List[Document] | None:
+        """
+        读取文档解析产物
+
+        Args:
+            kb_uuid: 知识库UUID
+            document_id: 文档ID
+
+        Returns:
+            原始文档列表，产物不存在时返回None
+        """
+        artifact_path = self._get_parse_artifact_path(kb_uuid, document_id)
+        if not artifact_path.exists():
+            return None
+        with gzip.open(artifact_path, "rt", encoding="utf-8") as artifact_file:
+            pages = json.load(artifact_file)
+        return [Document(
+            text=page["text"],
+            metadata=page["metadata"],
+            excluded_embed_metadata_keys=page.get("excluded_embed_metadata_keys", []),
+            excluded_llm_metadata_keys=page.get("excluded_llm_metadata_keys", []),
+        ) for page in pages]
+
     async def _store_documents_to_vector_db(
-            collection_name: str,
+            self,
+            knowledge_id: int,
             store_type: str,
-            document_list: List[Document]
+            chunks: List[ChunkRecord]
     ) -> List[str]:
         """
-        将文档存储到向量数据库
+        将知识块存储到向量数据库，以知识块ID作为向量ID
 
         Args:
-            collection_name: 集合名称
+            knowledge_id: 知识库ID
             store_type: 存储类型
-            document_list: 文档列表
+            chunks: 知识块列表
 
         Returns:
-            插入的文档ID列表
+            插入的知识块ID列表
         """
-        logger.info(f"将文档存储到向量数据库，集合名称: {collection_name}")
-        logger.debug(f"存储类型: {store_type}, 文档数量: {len(document_list)}")
+        text_vector_store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_id, store_type=store_type)
+        logger.info(f"将文档存储到向量数据库，集合名称: {text_vector_store.collection_name}")
+        logger.debug(f"存储类型: {store_type}, 知识块数量: {len(chunks)}")
 
-        text_vector_store = TextVectorStore(
-            collection_name=collection_name,
-            store_type=store_type
-        )
-        logger.debug("调用TextVectorStore.add_documents方法")
-        inserted_ids = text_vector_store.add_documents(documents=document_list)
+        inserted_ids = text_vector_store.add_chunks(chunks)
         logger.info(f"文档存储完成，插入 {len(inserted_ids)} 个文档")
+        self._mirror_to_migration_target(knowledge_id, text_vector_store, inserted_ids)
         return inserted_ids
 
     def _update_knowledge_base_statistics(self, knowledge_id: int) -> None:
@@ -404,136 +574,456 @@ class DocumentProcessingService:
         self.docs_crud.update_document_chunk_counts(knowledge_id=knowledge_id)
         logger.debug("知识库统计信息更新完成")
 
-    def delete_document(self, document_id: int, knowledge_id: int) -> Dict[str, Any]:
+    def reindex_knowledge_base(self, knowledge_id: int) -> Dict[str, Any]:
+        """
+        按知识库当前的切片配置重新切分全部文档
+
+        优先使用保存的解析产物而不是重新解析原文件；文本未变化的块复用已有向量，
+        只对新出现的文本调用嵌入模型。
+
+        Args:
+            knowledge_id: 知识库ID
+
+        Returns:
+            重新切分结果字典
+
+        Raises:
+            ValueError: 知识库不存在
+        """
+        knowledge_base = KnowledgeBaseDB(self.db_session).get_knowledge_base_by_id(knowledge_id)
+        if not knowledge_base:
+            logger.error(f"未找到ID为 {knowledge_id} 的知识库")
+            raise ValueError(f"未找到ID为 {knowledge_id} 的知识库")
+
+        logger.info(f"开始重新切分知识库 {knowledge_id}，chunk_size={knowledge_base.chunk_size}, "
+                    f"chunk_overlap={knowledge_base.chunk_overlap}, splitter={knowledge_base.splitter_type.value}")
+        documents = self.docs_crud.get_documents_by_knowledge_id(knowledge_id)
+
+        result = {"document_count": len(documents)}
+        for idx, document in enumerate(documents):
+            logger.info(f"重新切分第 {idx+1}/{len(documents)} 个文档: {document.name}")
+            document_result = self._reindex_document(document=document, knowledge_base=knowledge_base)
+            for key, value in document_result.items():
+                result[key] = result.get(key, 0) + value
+
+        logger.info(f"知识库 {knowledge_id} 重新切分完成: {result}")
+        return result
+
+    def _reindex_document(self, document, knowledge_base) -> Dict[str, int]:
+        """
+        按知识库当前的切片配置重新切分单个文档
+
+        Args:
+            document: 文档对象
+            knowledge_base: 知识库对象
+
+        Returns:
+            知识块同步结果
+        """
+        raw_documents = self._load_parse_artifact(kb_uuid=knowledge_base.uuid, document_id=document.id)
+        if raw_documents is None:
+            logger.info(f"文档 {document.id} 无解析产物，重新解析原文件")
+            raw_documents = self._load_document(file_path=document.file_path)
+            self._save_parse_artifact(kb_uuid=knowledge_base.uuid, document_id=document.id,
+                                      raw_documents=raw_documents)
+
+        new_chunks = self._split_documents(
+            raw_documents=raw_documents,
+            chunk_size=knowledge_base.chunk_size,
+            chunk_overlap=knowledge_base.chunk_overlap,
+            splitter_type=knowledge_base.splitter_type.value,
+            kb_uuid=knowledge_base.uuid,
+            tags=knowledge_base.tags,
+            document_id=document.id
+        )
+        return self._sync_document_chunks(document=document, knowledge_base=knowledge_base, new_chunks=new_chunks)
+
+    async def replace_document(self, document_id: int, knowledge_id: int, file: UploadFile) -> Dict[str, Any]:
         """
-        删除指定文档的所有相关信息
+        用新版本文件替换已有文档
+
+        保留文档记录，按内容生成的确定性块ID比较新旧版本，只对变化的知识块做增删和嵌入。
 
         Args:
             document_id: 文档ID
             knowledge_id: 知识库ID
+            file: 新版本文件
 
         Returns:
-            删除结果字典
+            替换结果字典
 
         Raises:
-            Exception: 删除过程中发生的任何异常
+            ValueError: 文档或知识库不存在
         """
+        logger.info(f"开始替换文档 {document_id}，新文件: {file.filename}")
+        document = self.docs_crud.get_document_by_id(document_id)
+        if not document or document.knowledge_base_id != knowledge_id:
+            logger.error(f"在知识库 {knowledge_id} 中未找到ID为 {document_id} 的文档")
+            raise ValueError(f"在知识库 {knowledge_id} 中未找到ID为 {document_id} 的文档")
+
+        knowledge_base = KnowledgeBaseDB(self.db_session).get_knowledge_base_by_id(knowledge_id)
+        if not knowledge_base:
+            logger.error(f"未找到ID为 {knowledge_id} 的知识库")
+            raise ValueError(f"未找到ID为 {knowledge_id} 的知识库")
+
+        # 先保存到暂存目录，文件名与最终文件名一致，解析出的元数据不受暂存位置影响
+        staging_kb_uuid = f"{knowledge_base.uuid}/.staging"
+        staged_file_path = Path((await self._save_uploaded_files(files=[file], kb_uuid=staging_kb_uuid))[0])
+
+        old_file_path = Path(document.file_path)
+        target_file_path = old_file_path.with_name(staged_file_path.name)
+        counter = 1
+        while target_file_path != old_file_path and target_file_path.exists():
+            target_file_path = old_file_path.with_name(f"{staged_file_path.stem} -{counter}{staged_file_path.suffix}")
+            counter += 1
+
         try:
-            logger.info(f"开始删除文档，文档ID: {document_id}, 知识库ID: {knowledge_id}")
-
-            # 从数据库获取文档信息
-            logger.debug("获取文档信息")
-            document = self.docs_crud.get_document_by_id(document_id)
-            if not document:
-                logger.error(f"未找到ID为 {document_id} 的文档")
-                raise ValueError(f"未找到ID为 {document_id} 的文档")
-
-            # 构建集合名称
-            collection_name = f'kb_{knowledge_id}'
-            logger.debug(f"集合名称: {collection_name}")
-
-            # 从向量数据库中删除文档chunks
-            logger.debug("获取文档的所有chunks")
-            chunks = self.docs_crud.get_chunks_by_document_id(document_id)
-            chunk_ids = [chunk.chunk_id for chunk in chunks]
-            logger.info(f"找到 {len(chunk_ids)} 个chunks需要删除")
-
-            if chunk_ids:
-                text_vector_store = TextVectorStore(
-                    collection_name=collection_name,
-                    store_type='milvus'
-                )
-                logger.info(f"准备删除 {len(chunk_ids)} 个 chunks")
-                result = text_vector_store.delete_documents(document_ids=chunk_ids)
-                logger.info(f"删除结果: {result}")
-
-            # 删除本地文件
-            logger.debug("删除本地文件")
-            file_path = Path(document.file_path)
-            if file_path.exists():
-                file_path.unlink()
-                logger.info(f"本地文件删除成功: {file_path}")
-            else:
-                logger.warning(f"本地文件不存在: {file_path}")
+            raw_documents = self._load_document(file_path=str(staged_file_path))
+            new_chunks = self._split_documents(
+                raw_documents=raw_documents,
+                chunk_size=knowledge_base.chunk_size,
+                chunk_overlap=knowledge_base.chunk_overlap,
+                splitter_type=knowledge_base.splitter_type.value,
+                kb_uuid=knowledge_base.uuid,
+                tags=knowledge_base.tags,
+                document_id=document_id
+            )
+            file_info = get_file_info(str(staged_file_path))
+            result = self._sync_document_chunks(
+                document=document,
+                knowledge_base=knowledge_base,
+                new_chunks=new_chunks,
+                document_data={
+                    "name": target_file_path.name,
+                    "file_path": str(target_file_path),
+                    "file_type": file_info.get("file_type"),
+                    "file_size": file_info.get("file_size"),
+                }
+            )
+        except Exception:
+            staged_file_path.unlink(missing_ok=True)
+            raise
 
-            # 从SQL数据库中删除chunks和document记录
-            logger.debug("从数据库中删除chunks和document记录")
-            self.docs_crud.delete_chunks_by_document_id(document_id)
-            self.docs_crud.delete_document(document_id)
-            logger.info("数据库记录删除成功")
+        # 数据库已切换到新版本，再替换本地文件和解析产物
+        os.replace(staged_file_path, target_file_path)
+        if target_file_path != old_file_path:
+            old_file_path.unlink(missing_ok=True)
+        self._save_parse_artifact(kb_uuid=knowledge_base.uuid, document_id=document_id, raw_documents=raw_documents)
+        self._update_knowledge_base_statistics(knowledge_id=knowledge_id)
 
-            # 更新知识库统计信息
-            logger.debug("更新知识库统计信息")
-            self.docs_crud.update_document_chunk_counts(knowledge_id=document.knowledge_base_id)
-            logger.info("知识库统计信息更新完成")
+        logger.info(f"文档 {document_id} 替换完成: {result}")
+        return result
 
-            result = {
-                "status": "success",
-                "message": f"成功删除文档 {document.name}"
-            }
-            logger.info(result["message"])
-            return result
+    def _sync_document_chunks(self, document, knowledge_base, new_chunks: List[ChunkRecord],
+                              document_data: Dict[str, Any] = None) -> Dict[str, int]:
+        """
+        将文档的知识块同步为新的块集合，只处理有变化的块
 
-        except Exception as error:
-            logger.error(f"删除文档时出错: {str(error)}")
+        流程：近重复检测 -> 按确定性块ID与已有块比较 -> 只嵌入并写入新增的代表块 -> 单事务同步数据库
+        -> 用原向量更新保留的代表块中元数据有变化的向量 -> 提升指向已移除代表块的近重复块 -> 删除已移除代表块的向量。
+        数据库同步失败时清理新写入的向量，旧数据保持不变。
+
+        Args:
+            document: 文档对象
+            knowledge_base: 知识库对象
+            new_chunks: 新的知识块列表（已完成元数据增强）
+            document_data: 需要同时更新的文档字段
+
+        Returns:
+            块数量、新增/删除数量、近重复块数量、更新元数据的向量数量以及复用和新嵌入的向量数量
+        """
+        store_type = self._get_store_type(knowledge_base)
+        new_chunks = self._deduplicate_chunks(
+            chunks=new_chunks,
+            knowledge_base_index=self._build_dedup_index(knowledge_id=knowledge_base.id,
+                                                         exclude_document_id=document.id)
+        )
+
+        # 只有代表块（duplicate_of 为空）有向量，按有向量的块集合计算需要嵌入和删除的向量
+        new_chunk_id_set = {chunk.chunk_id for chunk in new_chunks if chunk.duplicate_of is None}
+        old_chunks = self.docs_crud.get_chunks_by_document_id(document.id)
+        old_chunk_id_set = {chunk.chunk_id for chunk in old_chunks if chunk.duplicate_of is None}
+
+        added = [chunk for chunk in new_chunks
+                 if chunk.duplicate_of is None and chunk.chunk_id not in old_chunk_id_set]
+        removed_chunks = [chunk for chunk in old_chunks
+                          if chunk.duplicate_of is None and chunk.chunk_id not in new_chunk_id_set]
+        removed_chunk_ids = [chunk.chunk_id for chunk in removed_chunks]
+        # 保留的块ID相同、文本相同，但块索引、页码、来源文件等元数据可能已变化，需要覆盖向量元数据
+        old_metadata_by_id = {chunk.chunk_id: chunk.document_metadata for chunk in old_chunks
+                              if chunk.duplicate_of is None}
+        changed_chunks = [chunk for chunk in new_chunks
+                          if chunk.duplicate_of is None and chunk.chunk_id in old_metadata_by_id
+                          and chunk.metadata_json() != old_metadata_by_id[chunk.chunk_id]]
+
+        # 旧版本随机ID或重复文本次序变化的块，ID不同但文本相同，仍可复用其向量
+        added_texts = {chunk.text for chunk in added}
+        reusable_ids_by_text = {chunk.content: chunk.chunk_id for chunk in removed_chunks
+                                if chunk.content in added_texts}
+
+        text_vector_store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_base.id, store_type=store_type)
+        vectors_by_id = (text_vector_store.get_embeddings_by_ids(list(reusable_ids_by_text.values()))
+                         if reusable_ids_by_text else {})
+        cached_embeddings = CachedEmbeddings(
+            embeddings=get_knowledge_base_embeddings(knowledge_base.id),
+            cache={text: vectors_by_id[chunk_id] for text, chunk_id in reusable_ids_by_text.items()
+                   if chunk_id in vectors_by_id}
+        )
+
+        added_chunk_ids = [chunk.chunk_id for chunk in added]
+        if added:
+            TextVectorStore.for_knowledge_base(knowledge_id=knowledge_base.id, store_type=store_type,
+                                               embeddings=cached_embeddings).add_chunks(added)
+            self._mirror_to_migration_target(knowledge_base.id, text_vector_store, added_chunk_ids)
+
+        try:
+            delta = self.docs_crud.apply_document_chunk_delta(
+                document_id=document.id,
+                chunks=[self._build_chunk_data(document_id=document.id, chunk=chunk) for chunk in new_chunks],
+                document_data=document_data
+            )
+        except Exception:
+            logger.error(f"同步文档 {document.id} 的知识块失败，清理新写入的向量")
+            if added_chunk_ids:
+                text_vector_store.delete_documents(document_ids=added_chunk_ids)
+                self._delete_from_migration_target(knowledge_base.id, added_chunk_ids)
             raise
 
-    async def delete_knowledge_base(self, kb_uuid: str, knowledge_id: int) -> Dict[str, Any]:
+        updated_count = self._update_vector_metadata(knowledge_base.id, text_vector_store, changed_chunks)
+
+        if removed_chunk_ids:
+            self._promote_duplicates(knowledge_base, removed_chunk_ids, exclude_document_id=document.id)
+            text_vector_store.delete_documents(document_ids=removed_chunk_ids)
+            self._delete_from_migration_target(knowledge_base.id, removed_chunk_ids)
+
+        duplicate_count = sum(chunk.duplicate_of is not None for chunk in new_chunks)
+        logger.info(f"文档 {document.id} 知识块同步完成，共 {len(new_chunks)} 个块，新增 {delta['added']} 个，"
+                    f"删除 {delta['removed']} 个，近重复 {duplicate_count} 个，更新元数据 {updated_count} 个，"
+                    f"复用向量 {cached_embeddings.hit_count} 个，新嵌入 {cached_embeddings.miss_count} 个")
+        return {
+            "chunk_count": len(new_chunks),
+            "added_count": delta["added"],
+            "removed_count": delta["removed"],
+            "duplicate_count": duplicate_count,
+            "updated_count": updated_count,
+            "reused_count": cached_embeddings.hit_count,
+            "embedded_count": cached_embeddings.miss_count,
+        }
+
+    def delete_document(self, document_id: int, knowledge_id: int) -> Dict[str, Any]:
         """
-        删除整个知识库及其所有相关数据
+        删除指定文档：只做删除标记并立即返回，向量、文件和数据库记录由后台回收器清理
+
+        Args:
+            document_id: 文档ID
+            knowledge_id: 知识库ID
+
+        Returns:
+            删除结果字典
+
+        Raises:
+            ValueError: 文档不存在
+        """
+        logger.info(f"标记删除文档，文档ID: {document_id}, 知识库ID: {knowledge_id}")
+        document = self.docs_crud.get_document_by_id(document_id)
+        if not document or document.knowledge_base_id != knowledge_id:
+            logger.error(f"在知识库 {knowledge_id} 中未找到ID为 {document_id} 的文档")
+            raise ValueError(f"未找到ID为 {document_id} 的文档")
+
+        document_name = document.name
+        self.docs_crud.mark_document_deleted(document_id)
+
+        result = {
+            "status": "success",
+            "message": f"成功删除文档 {document_name}"
+        }
+        logger.info(result["message"])
+        return result
+
+    def delete_knowledge_base(self, knowledge_id: int) -> Dict[str, Any]:
+        """
+        删除整个知识库：将知识库及其文档标记为已删除并立即返回，实际数据由后台回收器清理
 
         Args:
-            kb_uuid: 知识库UUID
             knowledge_id: 知识库ID
 
         Returns:
             删除结果字典
 
         Raises:
-            Exception: 删除过程中发生的任何异常
+            ValueError: 知识库不存在
         """
+        logger.info(f"标记删除知识库，ID: {knowledge_id}")
+        if not KnowledgeBaseDB(self.db_session).mark_knowledge_base_deleted(knowledge_id):
+            logger.error(f"未找到ID为 {knowledge_id} 的知识库")
+            raise ValueError(f"未找到ID为 {knowledge_id} 的知识库")
+
+        result = {
+            "status": "success",
+            "message": f"成功删除知识库 {knowledge_id}"
+        }
+        logger.info(result["message"])
+        return result
+
+    def purge_documents(self, knowledge_base, documents: List) -> int:
+        """
+        物理删除一批已标记删除的文档：向量、本地文件、解析产物和数据库记录
+
+        Args:
+            knowledge_base: 文档所属知识库
+            documents: 文档列表，须属于同一知识库
+
+        Returns:
+            删除的文档数量
+        """
+        if not documents:
+            return 0
+        document_ids = [document.id for document in documents]
+        logger.info(f"回收知识库 {knowledge_base.id} 的 {len(document_ids)} 个文档")
+
+        # 其他文档中指向这些文档代表块的近重复块先提升为代表块，再删除向量
+        vector_chunk_ids = self.docs_crud.list_vector_chunk_ids(document_ids)
+        self._promote_duplicates(knowledge_base, vector_chunk_ids)
+
+        # 按 document_id 元数据批量删除向量，迁移中的知识库同时删除目标向量数据库中的数据
+        text_vector_stores = [TextVectorStore.for_knowledge_base(
+            knowledge_id=knowledge_base.id,
+            store_type=self._get_store_type(knowledge_base)
+        )]
+        migration_store = self._get_migration_store(knowledge_base.id)
+        if migration_store is not None:
+            text_vector_stores.append(migration_store)
+
+        for text_vector_store in text_vector_stores:
+            try:
+                deleted_count = text_vector_store.delete_by_metadata(field="document_id", values=document_ids)
+            except Exception as error:
+                logger.warning(f"按 document_id 删除向量失败，回退为按块ID删除: {str(error)}")
+                deleted_count = 0
+
+            # 早期写入的向量没有 document_id 元数据，删除数量不足时按块ID补删
+            if deleted_count < len(vector_chunk_ids):
+                logger.info(f"按块ID删除 {len(vector_chunk_ids)} 个向量")
+                text_vector_store.delete_documents(document_ids=vector_chunk_ids)
+
+        # 删除本地文件和解析产物
+        for document in documents:
+            Path(document.file_path).unlink(missing_ok=True)
+            self._get_parse_artifact_path(knowledge_base.uuid, document.id).unlink(missing_ok=True)
+
+        # 从SQL数据库中删除chunks和document记录（单事务）
+        return self.docs_crud.delete_documents_by_ids(document_ids)
+
+    def purge_knowledge_base_storage(self, knowledge_base) -> None:
+        """
+        删除已标记删除的知识库的向量集合和本地文件目录，数据库记录由调用方分批删除
+
+        Args:
+            knowledge_base: 知识库对象
+        """
+        logger.info(f"回收知识库 {knowledge_base.id} 的向量集合和本地文件")
+        TextVectorStore.for_knowledge_base(
+            knowledge_id=knowledge_base.id,
+            store_type=self._get_store_type(knowledge_base)
+        ).delete_collection()
+        migration_store = self._get_migration_store(knowledge_base.id)
+        if migration_store is not None:
+            migration_store.delete_collection()
+        get_projection_path(knowledge_base.id).unlink(missing_ok=True)
+
+        kb_directory = self.upload_directory / str(knowledge_base.uuid)
+        if kb_directory.exists():
+            shutil.rmtree(kb_directory)
+            logger.info(f"本地文件目录删除成功: {kb_directory}")
+
+    @staticmethod
+    def _get_store_type(knowledge_base) -> str:
+        """获取知识库使用的向量数据库类型"""
+        return knowledge_base.vector_db_type.value if knowledge_base and knowledge_base.vector_db_type else "milvus"
+
+    def _get_migration_store(self, knowledge_id: int) -> Optional[TextVectorStore]:
+        """获取知识库迁移中的目标向量存储，未在迁移时返回None"""
+        target = KnowledgeBaseDB(self.db_session).get_migration_target(knowledge_id)
+        if target is None:
+            return None
+        return TextVectorStore.for_knowledge_base(knowledge_id=knowledge_id, store_type=target.value)
+
+    def _update_vector_metadata(self, knowledge_id: int, vector_store: TextVectorStore,
+                                chunks: List[ChunkRecord]) -> int:
+        """
+        用向量数据库中已存储的向量覆盖写入知识块的新元数据，不重新嵌入
+
+        Args:
+            knowledge_id: 知识库ID
+            vector_store: 知识库的向量存储
+            chunks: 元数据有变化的代表块
+
+        Returns:
+            更新的向量数量，向量数据库中不存在的块被跳过
+        """
+        if not chunks:
+            return 0
+        vectors_by_id = vector_store.get_embeddings_by_ids([chunk.chunk_id for chunk in chunks])
+        records = [{"id": chunk.chunk_id, "text": chunk.text, "embedding": vectors_by_id[chunk.chunk_id],
+                    "metadata": chunk.to_metadata()} for chunk in chunks if chunk.chunk_id in vectors_by_id]
+        updated_ids = vector_store.replace_records(records)
+        self._mirror_to_migration_target(knowledge_id, vector_store, updated_ids, replace=True)
+        return len(updated_ids)
+
+    def _mirror_to_migration_target(self, knowledge_id: int, source_store: TextVectorStore,
+                                    chunk_ids: List[str], replace: bool = False) -> None:
+        """
+        双写：将刚写入源向量数据库的记录连同向量复制到迁移目标，不重新嵌入
+
+        replace 为 True 时覆盖迁移目标中已有的同ID记录。双写失败只记录警告，迁移任务切换前的校验阶段会补齐缺失的记录。
+        """
+        if not chunk_ids:
+            return
+        migration_store = self._get_migration_store(knowledge_id)
+        if migration_store is None:
+            return
         try:
-            logger.info(f"开始删除知识库，UUID: {kb_uuid}, ID: {knowledge_id}")
-
-            # 获取知识库中的所有文档
-            logger.debug("获取知识库中的所有文档")
-            documents = self.docs_crud.get_documents_by_knowledge_id(knowledge_id)
-            logger.info(f"找到 {len(documents)} 个文档需要删除")
-
-            # 删除向量数据库中的整个集合
-            logger.debug("删除向量数据库中的集合")
-            collection_name = f'kb_{knowledge_id}'
-            text_vector_store = TextVectorStore(
-                collection_name=collection_name,
-                store_type="milvus"
-            )
-            text_vector_store.delete_collection()
-            logger.info("向量数据库集合删除成功")
-
-            # 删除所有本地文件
-            logger.debug("删除本地文件")
-            kb_directory = self.upload_directory / str(kb_uuid)
-            if kb_directory.exists():
-                shutil.rmtree(kb_directory)
-                logger.info(f"本地文件目录删除成功: {kb_directory}")
+            records = source_store.get_records_by_ids(chunk_ids)
+            if replace:
+                migration_store.replace_records(records)
             else:
-                logger.warning(f"本地文件目录不存在: {kb_directory}")
+                migration_store.add_records(records)
+        except Exception as error:
+            logger.warning(f"双写到迁移目标失败，将在迁移校验阶段补齐: {str(error)}")
 
-            # 从SQL数据库中删除所有相关记录
-            logger.debug("从数据库中删除所有相关记录")
-            for idx, document in enumerate(documents):
-                logger.debug(f"删除第 {idx+1}/{len(documents)} 个文档记录")
-                self.docs_crud.delete_chunks_by_document_id(document.id)
-                self.docs_crud.delete_document(document.id)
-            logger.info("数据库记录删除成功")
+    def _delete_from_migration_target(self, knowledge_id: int, chunk_ids: List[str]) -> None:
+        """双写：从迁移目标中删除已从源向量数据库删除的记录"""
+        migration_store = self._get_migration_store(knowledge_id)
+        if migration_store is None or not chunk_ids:
+            return
+        try:
+            migration_store.delete_documents(document_ids=chunk_ids)
+        except Exception as error:
+            logger.warning(f"从迁移目标删除向量失败，将在迁移校验阶段清理: {str(error)}")
 
-            result = {
-                "status": "success",
-                "message": f"成功删除知识库 {kb_uuid}"
-            }
-            logger.info(result["message"])
-            return result
 
-        except Exception as error:
-            logger.error(f"删除知识库时出错: {str(error)}")
-            raise
+def run_knowledge_base_reindex(knowledge_id: int) -> None:
+    """
+    后台任务：使用独立的数据库会话重新切分知识库
+
+    提交前需已通过 knowledge_task_registry.claim 登记；运行期间合并进来的重跑请求在本次结束后
+    按最新的切片配置再执行一次，全部完成后结束登记。
+
+    Args:
+        knowledge_id: 知识库ID
+    """
+    db_session = SessionLocal()
+    try:
+        while True:
+            try:
+                DocumentProcessingService(db_session=db_session).reindex_knowledge_base(knowledge_id=knowledge_id)
+            except Exception as error:
+                db_session.rollback()
+                logger.error(f"后台重新切分知识库 {knowledge_id} 失败: {str(error)}")
+            if not knowledge_task_registry.finish(knowledge_id):
+                break
+            logger.info(f"知识库 {knowledge_id} 重新切分期间切片配置再次变化，按最新配置重新切分")
+            # 丢弃会话中缓存的知识库对象，重新读取最新的切片配置
+            db_session.expire_all()
+    finally:
+        db_session.close()
@@ -0,0 +1,282 @@
+import time
+from typing import Dict, Any, List
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud.docs import DocsCRUD
+from app.crud.knowledge import KnowledgeBaseDB
+from app.llm.projected_embeddings import (
+    EmbeddingProjection, ProjectedEmbeddings, PROJECTION_METHODS, get_projection_path, load_projection
+)
+from app.llm.model_client import get_embeddings
+from app.services.rag.knowledge_task_registry import knowledge_task_registry, PROJECTION_TASK
+from app.utils.chunk_record import ChunkRecord
+from app.vector_store.text_vector_store import TextVectorStore
+
+PROJECTED_SUFFIX = "__projected"
+OLD_SUFFIX = "__unprojected"
+
+
+def evaluate_projection(vectors: np.ndarray, queries: np.ndarray, projection: EmbeddingProjection,
+                        k: int = 10) -> Dict[str, Any]:
+    """
+    离线评估投影对精确检索的影响
+
+    以原始维度的精确余弦检索结果为基准，计算投影后的 recall@k、单次查询耗时和每条向量的内存占用。
+
+    Args:
+        vectors: 原始向量，形状为 (数量, 原始维度)
+        queries: 原始维度的查询向量
+        projection: 投影
+        k: 每个查询返回的结果数
+
+    Returns:
+        recall、查询耗时（毫秒）和每条向量的字节数
+    """
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1)
+
+    def search(index: np.ndarray, query_vectors: np.ndarray) -> tuple:
+        started = time.perf_counter()
+        top_k = np.argpartition(-(query_vectors @ index.T), kth=k - 1, axis=1)[:, :k]
+        return top_k, (time.perf_counter() - started) * 1000 / len(query_vectors)
+
+    vectors = normalize(np.asarray(vectors, dtype=np.float32))
+    queries = normalize(np.asarray(queries, dtype=np.float32))
+    expected, full_ms = search(vectors, queries)
+    actual, projected_ms = search(projection.transform(vectors), projection.transform(queries))
+    hits = sum(len(set(row_expected) & set(row_actual)) for row_expected, row_actual in zip(expected, actual))
+    return {
+        "dimension": projection.dimension,
+        "recall": round(hits / expected.size, 4),
+        "full_ms": round(full_ms, 3),
+        "projected_ms": round(projected_ms, 3),
+        "bytes_per_vector": projection.dimension * 4,
+        "memory_ratio": round(projection.dimension / projection.source_dimension, 3),
+    }
+
+
+class EmbeddingProjectionService:
+    """
+    知识库向量降维服务
+
+    流程：
+    1. 从知识库已有向量中取样拟合 PCA（或构造 Matryoshka 截断），得到投影
+    2. 分批读取全部记录，投影后写入临时集合，不重新嵌入
+    3. 交换集合名称，最后保存投影文件：投影文件是降维生效的标志，此后写入和检索该知识库都经过同一投影；
+       交换或保存失败时还原集合名称并移除投影文件，知识库保持原始维度
+    4. 按数据库中的知识块补齐切换期间写入旧集合的记录并删除多余记录，最后删除旧集合
+
+    投影不可逆，知识库启用降维后不能再恢复原始维度（只能重新导入）。
+    Milvus 共享集合布局下所有知识库共用一个固定维度的集合，不支持按知识库降维。
+    """
+
+    def __init__(self, db_session):
+        """
+        初始化向量降维服务
+
+        Args:
+            db_session: 数据库会话对象
+        """
+        self.db_session = db_session
+        self.knowledge_base_db = KnowledgeBaseDB(db_session)
+        self.docs_crud = DocsCRUD(db=db_session)
+        self.batch_size = settings.vector_migration_batch_size
+
+    @staticmethod
+    def check_supported(knowledge_base, method: str) -> None:
+        """
+        检查知识库能否按指定方式降维
+
+        Raises:
+            ValueError: 不支持的投影方式、已启用降维、有其他后台任务或迁移中、共享集合布局或嵌入模型不支持截断
+        """
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"不支持的降维方式: {method}，可选: {', '.join(PROJECTION_METHODS)}")
+        if load_projection(knowledge_base.id) is not None:
+            raise ValueError(f"知识库 {knowledge_base.id} 已启用向量降维")
+        knowledge_task_registry.check_idle(knowledge_base)
+        if knowledge_base.vector_db_type.value == "milvus" and settings.milvus_layout == "shared":
+            raise ValueError("Milvus 共享集合布局不支持按知识库降维")
+        matryoshka_models = {model.strip() for model in settings.embedding_matryoshka_models.split(",")}
+        if method == "truncate" and settings.embedding_provider != "fake" \
+                and settings.embedding_model not in matryoshka_models:
+            raise ValueError(f"嵌入模型 {settings.embedding_model} 不支持 Matryoshka 截断，请使用 pca")
+
+    def apply(self, knowledge_id: int, method: str, dimension: int) -> Dict[str, Any]:
+        """
+        为知识库启用向量降维
+
+        Args:
+            knowledge_id: 知识库ID
+            method: 降维方式，pca 或 truncate
+            dimension: 目标维度
+
+        Returns:
+            降维结果，包含原始维度、目标维度、样本数、复制和补齐的记录数量、拟合方差比例和耗时
+
+        Raises:
+            ValueError: 知识库不存在、不支持降维或没有可用于拟合的向量
+        """
+        with knowledge_task_registry.lock:
+            knowledge_base = self.knowledge_base_db.get_knowledge_base_by_id(knowledge_id)
+            if not knowledge_base:
+                raise ValueError(f"未找到ID为 {knowledge_id} 的知识库")
+            self.check_supported(knowledge_base, method)
+            knowledge_task_registry.start(knowledge_base, PROJECTION_TASK)
+        try:
+            return self._apply(knowledge_base, method, dimension)
+        finally:
+            knowledge_task_registry.finish(knowledge_id)
+
+    def _apply(self, knowledge_base, method: str, dimension: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        knowledge_id = knowledge_base.id
+        store_type = knowledge_base.vector_db_type.value
+        source_store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_id, store_type=store_type)
+        sample = self._sample_vectors(source_store, settings.embedding_projection_sample_size)
+        if not len(sample):
+            raise ValueError(f"知识库 {knowledge_id} 没有向量，无法拟合投影")
+        projection = (EmbeddingProjection.fit_pca(sample, dimension) if method == "pca"
+                      else EmbeddingProjection.truncate(sample.shape[1], dimension))
+        explained = self._explained_variance(sample, projection)
+        logger.info(f"知识库 {knowledge_id} 投影拟合完成: {method}, {projection.source_dimension} -> {dimension} 维，"
+                    f"样本 {len(sample)} 条，保留方差 {explained:.2%}")
+
+        embeddings = ProjectedEmbeddings(get_embeddings(), projection)
+        projected_name = f"{source_store.collection_name}{PROJECTED_SUFFIX}"
+        projected_store = TextVectorStore(store_type=store_type, collection_name=projected_name, embeddings=embeddings)
+        try:
+            projected_store.delete_collection()
+            copied_count = 0
+            for records in source_store.iter_records(batch_size=self.batch_size):
+                vectors = projection.transform([record["embedding"] for record in records])
+                for record, vector in zip(records, vectors.tolist()):
+                    record["embedding"] = vector
+                projected_store.add_records(records)
+                copied_count += len(records)
+                logger.info(f"知识库 {knowledge_id} 已投影 {copied_count} 条记录")
+        except Exception:
+            logger.error(f"知识库 {knowledge_id} 向量降维失败，清理临时集合")
+            projected_store.delete_collection()
+            raise
+
+        self._switch(knowledge_id, source_store, projected_store, projection)
+        target_store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_id, store_type=store_type)
+        reconciled = self._reconcile(knowledge_id, target_store)
+        TextVectorStore(store_type=store_type, collection_name=source_store.collection_name).delete_collection()
+
+        result = {
+            "knowledge_id": knowledge_id,
+            "method": method,
+            "source_dimension": projection.source_dimension,
+            "dimension": dimension,
+            "sample_size": len(sample),
+            "explained_variance": round(explained, 4),
+            "copied": copied_count,
+            **reconciled,
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+        logger.info(f"知识库 {knowledge_id} 向量降维完成: {result}")
+        return result
+
+    @staticmethod
+    def _switch(knowledge_id: int, source_store: TextVectorStore, projected_store: TextVectorStore,
+                projection: EmbeddingProjection) -> None:
+        """
+        切换到降维后的集合：旧集合改名保留到补齐完成，降维集合改用知识库的集合名称，最后保存投影文件
+
+        先交换集合再保存投影，其他线程不会在投影生效时仍读写原始维度的集合；
+        任一步失败时移除投影文件、按相反顺序还原集合名称并删除降维集合。
+        """
+        collection_name = source_store.collection_name
+        projected_name = projected_store.collection_name
+        projection_path = get_projection_path(knowledge_id)
+        renamed = []
+        try:
+            source_store.rename_collection(f"{collection_name}{OLD_SUFFIX}")
+            renamed.append((source_store, collection_name))
+            projected_store.rename_collection(collection_name)
+            renamed.append((projected_store, projected_name))
+            projection.save(projection_path)
+        except Exception:
+            logger.error(f"知识库 {knowledge_id} 切换到降维集合失败，还原集合名称")
+            projection_path.unlink(missing_ok=True)
+            for store, name in reversed(renamed):
+                store.rename_collection(name)
+            projected_store.delete_collection()
+            raise
+
+    @staticmethod
+    def _sample_vectors(store: TextVectorStore, sample_size: int) -> np.ndarray:
+        """按固定步长从全部记录中均匀取样，记录数不超过样本量时取全部"""
+        total = store.count()
+        step = max(total // sample_size, 1) if sample_size else 1
+        sample, position = [], 0
+        for records in store.iter_records(batch_size=1000):
+            for record in records:
+                if position % step == 0 and len(sample) < sample_size:
+                    sample.append(record["embedding"])
+                position += 1
+        return np.asarray(sample, dtype=np.float32)
+
+    @staticmethod
+    def _explained_variance(sample: np.ndarray, projection: EmbeddingProjection) -> float:
+        """投影保留的样本方差比例"""
+        centered = sample - sample.mean(axis=0)
+        total = float((centered ** 2).sum())
+        if not total:
+            return 1.0
+        if projection.method == "pca":
+            kept = float(((centered @ projection.components) ** 2).sum())
+        else:
+            kept = float((centered[:, :projection.dimension] ** 2).sum())
+        return kept / total
+
+    def _reconcile(self, knowledge_id: int, store: TextVectorStore) -> Dict[str, int]:
+        """
+        以数据库为准对齐降维后的集合：重新嵌入缺失的知识块（切换期间写入旧集合的记录），删除多余的记录
+
+        Returns:
+            补齐和删除的记录数量
+        """
+        document_ids = [document.id for document in self.docs_crud.get_documents_by_knowledge_id(knowledge_id)]
+        expected_ids = set(self.docs_crud.list_vector_chunk_ids(document_ids)) if document_ids else set()
+        existing_ids = {record_id for ids in store.iter_ids(batch_size=self.batch_size) for record_id in ids}
+
+        stale_ids = list(existing_ids - expected_ids)
+        if stale_ids:
+            store.delete_documents(document_ids=stale_ids)
+
+        missing_ids: List[str] = list(expected_ids - existing_ids)
+        for start in range(0, len(missing_ids), self.batch_size):
+            chunks = self.docs_crud.get_chunks_by_chunk_ids(missing_ids[start:start + self.batch_size])
+            store.add_chunks([ChunkRecord.from_metadata_json(text=chunk.content, chunk_index=chunk.chunk_index,
+                                                             chunk_id=chunk.chunk_id,
+                                                             metadata_json=chunk.document_metadata,
+                                                             simhash=chunk.simhash) for chunk in chunks])
+        if stale_ids or missing_ids:
+            logger.info(f"知识库 {knowledge_id} 降维后补齐 {len(missing_ids)} 条、删除 {len(stale_ids)} 条记录")
+        return {"missing_embedded": len(missing_ids), "stale_removed": len(stale_ids)}
+
+
+def run_embedding_projection(knowledge_id: int, method: str, dimension: int) -> None:
+    """
+    后台任务：使用独立的数据库会话为知识库启用向量降维
+
+    Args:
+        knowledge_id: 知识库ID
+        method: 降维方式
+        dimension: 目标维度
+    """
+    db_session = SessionLocal()
+    try:
+        EmbeddingProjectionService(db_session=db_session).apply(knowledge_id, method=method, dimension=dimension)
+    except Exception as error:
+        logger.error(f"后台为知识库 {knowledge_id} 启用向量降维失败: {str(error)}")
+    finally:
+        db_session.close()
@@ -0,0 +1,101 @@
+from typing import Dict, Any, List, Optional
+
+from langchain_core.documents import Document
+from loguru import logger
+
+from app.crud.docs import DocsCRUD
+from app.crud.knowledge import KnowledgeBaseDB
+from app.vector_store.text_vector_store import TextVectorStore
+
+
+class KnowledgeSearchService:
+    """
+    知识库检索服务
+
+    在 TextVectorStore 的检索之上处理知识库层面的规则：
+    已标记删除、等待回收的文档的向量仍在向量数据库中，检索时通过 document_id 过滤排除。
+    """
+
+    def __init__(self, db_session):
+        """
+        初始化检索服务
+
+        Args:
+            db_session: 数据库会话对象
+        """
+        self.db_session = db_session
+        self.knowledge_base_db = KnowledgeBaseDB(db_session)
+        self.docs_crud = DocsCRUD(db=db_session)
+
+    def scope_filters(self, knowledge_id: int,
+                       filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        知识库有等待回收的文档时，把检索范围限定为未删除的文档
+
+        Returns:
+            实际使用的过滤条件；没有可检索的文档时返回None
+        """
+        filters = dict(filters or {})
+        live_ids, deleted_ids = self.docs_crud.list_document_ids_by_state(knowledge_id)
+        if "document_id" in filters:
+            values = filters["document_id"]
+            requested = {int(value) for value in (values if isinstance(values, list) else [values])}
+            document_ids = [document_id for document_id in live_ids if document_id in requested]
+        elif deleted_ids:
+            document_ids = live_ids
+        else:
+            return filters
+        if not document_ids:
+            return None
+        filters["document_id"] = document_ids
+        return filters
+
+    @staticmethod
+    def format_result(document: Document, score: float) -> Dict[str, Any]:
+        """检索结果转换为接口返回的字典"""
+        metadata = dict(document.metadata)
+        return {
+            "chunk_id": document.id or metadata.get("doc_id"),
+            "document_id": metadata.get("document_id"),
+            "content": document.page_content,
+            "score": float(score),
+            "metadata": metadata,
+        }
+
+    def batch_search(self, knowledge_id: int, queries: List[str], k: int = 4,
+                     filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        在知识库中批量检索
+
+        Args:
+            knowledge_id: 知识库ID
+            queries: 查询文本列表
+            k: 每个查询返回的知识块数量
+            filters: 元数据过滤条件，含义同 TextVectorStore.similarity_search
+
+        Returns:
+            与 queries 顺序一致的结果列表，每条结果包含 chunk_id、document_id、content、score（距离，越小越相似）和 metadata
+
+        Raises:
+            ValueError: 知识库不存在
+        """
+        knowledge_base = self.knowledge_base_db.get_knowledge_base_by_id(knowledge_id)
+        if not knowledge_base:
+            raise ValueError(f"未找到ID为 {knowledge_id} 的知识库")
+
+        scoped_filters = self.scope_filters(knowledge_id, filters)
+        if scoped_filters is None:
+            logger.info(f"知识库 {knowledge_id} 没有可检索的文档")
+            return [[] for _ in queries]
+        store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_id,
+                                                   store_type=knowledge_base.vector_db_type.value)
+        results = store.batch_similarity_search(queries, k=k, filters=scoped_filters or None)
+        return [[self.format_result(document, score) for document, score in query_results]
+                for query_results in results]
+
+    def search(self, knowledge_id: int, query: str, k: int = 4,
+               filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        在知识库中检索单个查询，参数和返回值同 batch_search 的单个查询
+        """
+        return self.batch_search(knowledge_id, [query], k=k, filters=filters)[0]
@@ -0,0 +1,426 @@
+import json
+import shutil
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator
+
+from loguru import logger
+
+from app.core.config import settings
+from app.crud.docs import DocsCRUD
+from app.crud.knowledge import KnowledgeBaseDB
+from app.llm.projected_embeddings import get_projection_path, load_projection
+from app.models.knowledge import KnowledgeBase, VectorDatabaseType, TextSplitterType
+from app.utils.chunk_record import ChunkRecord
+from app.utils.chunk_utils import generate_chunk_id
+from app.vector_store.text_vector_store import TextVectorStore
+
+# 快照格式版本，格式不兼容变更时递增
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+DOCUMENTS_FILE = "documents.parquet"
+CHUNKS_FILE = "chunks.parquet"
+PROJECTION_FILE = "projection.npz"
+
+
+def _require_pyarrow():
+    """按需导入 pyarrow：只有快照导入导出使用它，不在应用启动时加载"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError as error:
+        raise ImportError("知识库快照需要 pyarrow，请执行 uv sync 安装项目依赖") from error
+
+
+class KnowledgeSnapshotService:
+    """
+    知识库快照服务
+
+    快照是一个目录，包含：
+    - manifest.json: 格式版本、知识库配置、向量维度和数量统计
+    - documents.parquet: 文档记录
+    - chunks.parquet: 按 (文档, 块索引) 排序的知识块记录及其原始向量（float32 定长列表），每批一个行组；
+      近重复块（duplicate_of 非空）只有记录没有向量，导入时按新的块ID保留近重复关系
+    - files/: 原始上传文件和解析产物，导入后可直接重新切分
+    - projection.npz: 启用向量降维的知识库的投影，导入后新知识库沿用同一投影
+
+    导出和导入都按批流式处理，Parquet 以内存映射方式读取；导入时直接写入已有向量，不调用嵌入模型。
+    """
+
+    def __init__(self, db_session):
+        """
+        初始化知识库快照服务
+
+        Args:
+            db_session: 数据库会话对象
+        """
+        self.db_session = db_session
+        self.docs_crud = DocsCRUD(db=db_session)
+        self.knowledge_base_db = KnowledgeBaseDB(db_session)
+        self.upload_directory = Path(settings.knowledge_file_path)
+
+    def export_snapshot(self, knowledge_id: int, output_dir: Path, batch_size: int = 1000,
+                        include_files: bool = True) -> Dict[str, Any]:
+        """
+        导出知识库快照
+
+        Args:
+            knowledge_id: 知识库ID
+            output_dir: 快照目录，必须不存在或为空
+            batch_size: 每批读取的知识块数量（即 Parquet 行组大小）
+            include_files: 是否一并导出原始文件和解析产物
+
+        Returns:
+            快照清单
+
+        Raises:
+            ValueError: 知识库不存在或快照目录非空
+        """
+        pa = _require_pyarrow()
+        knowledge_base = self.knowledge_base_db.get_knowledge_base_by_id(knowledge_id)
+        if not knowledge_base:
+            raise ValueError(f"知识库 {knowledge_id} 不存在")
+        output_dir = Path(output_dir)
+        if output_dir.exists() and any(output_dir.iterdir()):
+            raise ValueError(f"快照目录 {output_dir} 不为空")
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        store_type = knowledge_base.vector_db_type.value
+        vector_store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_id, store_type=store_type)
+        documents = self.docs_crud.get_documents_by_knowledge_id(knowledge_id)
+        logger.info(f"开始导出知识库 {knowledge_id} 快照，文档数量: {len(documents)}, 目录: {output_dir}")
+
+        pa.parquet.write_table(pa.table({
+            "id": [document.id for document in documents],
+            "name": [document.name for document in documents],
+            "file_name": [Path(document.file_path).name for document in documents],
+            "file_type": [document.file_type for document in documents],
+            "file_size": [document.file_size for document in documents],
+            "chunk_count": [document.chunk_count for document in documents],
+        }), output_dir / DOCUMENTS_FILE, compression="zstd")
+
+        writer = None
+        dimension = None
+        # 确定向量维度之前的批次（只含近重复块或缺少向量的块）暂存，创建写入器后再写出
+        pending_columns = []
+        chunk_total = 0
+        missing_vectors = 0
+        try:
+            for document in documents:
+                for chunks in self.docs_crud.iter_chunks_by_document_id(document.id, batch_size=batch_size):
+                    # 近重复块不在向量数据库中，向量列为空，导入时也不重新计算
+                    vectors = vector_store.get_embeddings_by_ids(
+                        [chunk.chunk_id for chunk in chunks if chunk.duplicate_of is None])
+                    embeddings = [None if chunk.duplicate_of is not None else vectors.get(chunk.chunk_id)
+                                  for chunk in chunks]
+                    missing_vectors += sum(chunk.duplicate_of is None and embedding is None
+                                           for chunk, embedding in zip(chunks, embeddings))
+                    if dimension is None:
+                        dimension = next((len(embedding) for embedding in embeddings if embedding), None)
+                    pending_columns.append({
+                        "document_id": [chunk.document_id for chunk in chunks],
+                        "chunk_index": [chunk.chunk_index for chunk in chunks],
+                        "chunk_id": [chunk.chunk_id for chunk in chunks],
+                        "content": [chunk.content for chunk in chunks],
+                        "page_label": [chunk.page_label for chunk in chunks],
+                        "document_metadata": [chunk.document_metadata for chunk in chunks],
+                        "simhash": [chunk.simhash for chunk in chunks],
+                        "duplicate_of": [chunk.duplicate_of for chunk in chunks],
+                        "embedding": embeddings,
+                    })
+                    chunk_total += len(chunks)
+                    if dimension is None:
+                        continue
+                    if writer is None:
+                        writer = pa.parquet.ParquetWriter(output_dir / CHUNKS_FILE,
+                                                          self._chunk_schema(pa, dimension), compression="zstd")
+                    for columns in pending_columns:
+                        writer.write_table(pa.table(columns, schema=self._chunk_schema(pa, dimension)))
+                    pending_columns = []
+        finally:
+            if writer is not None:
+                writer.close()
+        if pending_columns:
+            raise ValueError(f"知识库 {knowledge_id} 的向量缺失，无法确定向量维度")
+        if missing_vectors:
+            logger.warning(f"知识库 {knowledge_id} 有 {missing_vectors} 个知识块缺少向量，导入时将重新计算")
+
+        if include_files:
+            self._export_files(knowledge_base, documents, output_dir / "files")
+        projection = load_projection(knowledge_id)
+        if projection is not None:
+            shutil.copy2(get_projection_path(knowledge_id), output_dir / PROJECTION_FILE)
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_time": datetime.now(timezone.utc).isoformat(),
+            "knowledge_base": {
+                "id": knowledge_base.id,
+                "name": knowledge_base.name,
+                "uuid": knowledge_base.uuid,
+                "description": knowledge_base.description,
+                "tags": knowledge_base.tags,
+                "chunk_size": knowledge_base.chunk_size,
+                "chunk_overlap": knowledge_base.chunk_overlap,
+                "splitter_type": knowledge_base.splitter_type.value,
+                "vector_db_type": store_type,
+                "is_public": knowledge_base.is_public,
+            },
+            "embedding_provider": settings.embedding_provider,
+            "embedding_dimension": dimension,
+            "projection": None if projection is None else {
+                "method": projection.method,
+                "source_dimension": projection.source_dimension,
+                "dimension": projection.dimension,
+            },
+            "document_count": len(documents),
+            "chunk_count": chunk_total,
+            "missing_vectors": missing_vectors,
+            "include_files": include_files,
+        }
+        (output_dir / MANIFEST_FILE).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        logger.info(f"知识库 {knowledge_id} 快照导出完成，知识块数量: {chunk_total}")
+        return manifest
+
+    def import_snapshot(self, snapshot_dir: Path, user_id: int, name: Optional[str] = None,
+                        vector_db_type: Optional[VectorDatabaseType] = None,
+                        batch_size: int = 1000) -> KnowledgeBase:
+        """
+        从快照导入为新的知识库
+
+        文档和知识块获得新的ID，知识块ID按新文档ID重新生成（与正常入库一致），向量直接写入目标向量数据库。
+        导入失败时新知识库被标记删除，由后台回收器清理已写入的数据。
+
+        Args:
+            snapshot_dir: 快照目录
+            user_id: 新知识库的所有者ID
+            name: 新知识库名称，默认沿用快照中的名称
+            vector_db_type: 目标向量数据库类型，默认沿用快照中的类型
+            batch_size: 每批写入的知识块数量
+
+        Returns:
+            新建的知识库对象
+
+        Raises:
+            ValueError: 快照格式不兼容或知识库名称已存在
+        """
+        pa = _require_pyarrow()
+        snapshot_dir = Path(snapshot_dir)
+        manifest = json.loads((snapshot_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+        if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"不支持的快照格式版本: {manifest.get('format_version')}")
+        if manifest.get("embedding_provider") != settings.embedding_provider:
+            logger.warning(f"快照嵌入模型 {manifest.get('embedding_provider')} 与当前配置 "
+                           f"{settings.embedding_provider} 不一致，检索结果可能不可用")
+
+        source = manifest["knowledge_base"]
+        name = name or source["name"]
+        if self.knowledge_base_db.get_knowledge_base_by_name(name):
+            raise ValueError(f"知识库名称 {name} 已存在")
+        vector_db_type = vector_db_type or VectorDatabaseType(source["vector_db_type"])
+
+        knowledge_base = self.knowledge_base_db.create_knowledge_base(
+            name=name,
+            uuid=str(uuid.uuid4()),
+            description=source["description"],
+            tags=source["tags"],
+            vector_db_type=vector_db_type,
+            user_id=user_id,
+            chunk_size=source["chunk_size"],
+            chunk_overlap=source["chunk_overlap"],
+            is_public=source["is_public"],
+            # 旧版本快照没有切分器类型
+            splitter_type=TextSplitterType(source.get("splitter_type", TextSplitterType.SENTENCE.value)),
+        )
+        logger.info(f"开始从快照 {snapshot_dir} 导入知识库 {knowledge_base.id}，目标向量数据库: {vector_db_type.value}")
+
+        try:
+            # 投影须在创建向量存储之前就位，重新计算缺失向量时使用同一投影
+            if (snapshot_dir / PROJECTION_FILE).exists():
+                if vector_db_type == VectorDatabaseType.MILVUS and settings.milvus_layout == "shared":
+                    raise ValueError("快照启用了向量降维，不能导入到 Milvus 共享集合")
+                get_projection_path(knowledge_base.id).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(snapshot_dir / PROJECTION_FILE, get_projection_path(knowledge_base.id))
+            vector_store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_base.id,
+                                                              store_type=vector_db_type.value)
+            document_ids = self._import_documents(pa, snapshot_dir, knowledge_base, vector_store.collection_name)
+            record_batches = self._import_chunk_batches(pa, snapshot_dir, knowledge_base, document_ids,
+                                                        vector_store, batch_size)
+            if vector_store._use_bulk_import(manifest["chunk_count"]):
+                written_count = vector_store.bulk_import_records(record_batches)
+            else:
+                written_count = sum(len(vector_store.add_records(records)) for records in record_batches)
+        except Exception:
+            logger.error(f"快照导入失败，标记删除知识库 {knowledge_base.id}")
+            self.knowledge_base_db.mark_knowledge_base_deleted(knowledge_base.id)
+            raise
+
+        logger.info(f"快照导入完成，知识库: {knowledge_base.id}, 文档: {len(document_ids)}, 向量: {written_count}")
+        return knowledge_base
+
+    @staticmethod
+    def _chunk_schema(pa, dimension: int):
+        return pa.schema([
+            ("document_id", pa.int64()),
+            ("chunk_index", pa.int64()),
+            ("chunk_id", pa.string()),
+            ("content", pa.large_string()),
+            ("page_label", pa.string()),
+            ("document_metadata", pa.large_string()),
+            ("simhash", pa.int64()),
+            ("duplicate_of", pa.string()),
+            ("embedding", pa.list_(pa.float32(), dimension)),
+        ])
+
+    def _export_files(self, knowledge_base: KnowledgeBase, documents: List, files_dir: Path) -> None:
+        """复制原始文件和解析产物到快照目录"""
+        artifact_directory = self.upload_directory / str(knowledge_base.uuid) / ".artifacts"
+        (files_dir / ".artifacts").mkdir(parents=True, exist_ok=True)
+        for document in documents:
+            file_path = Path(document.file_path)
+            if file_path.exists():
+                shutil.copy2(file_path, files_dir / file_path.name)
+            artifact_path = artifact_directory / f"{document.id}.json.gz"
+            if artifact_path.exists():
+                shutil.copy2(artifact_path, files_dir / ".artifacts" / artifact_path.name)
+
+    def _import_documents(self, pa, snapshot_dir: Path, knowledge_base: KnowledgeBase,
+                          collection_name: str) -> Dict[int, int]:
+        """创建文档记录并复制原始文件，返回 快照文档ID -> 新文档ID"""
+        files_dir = snapshot_dir / "files"
+        kb_directory = self.upload_directory / str(knowledge_base.uuid)
+        (kb_directory / ".artifacts").mkdir(parents=True, exist_ok=True)
+
+        document_ids = {}
+        for row in pa.parquet.read_table(snapshot_dir / DOCUMENTS_FILE).to_pylist():
+            file_path = kb_directory / row["file_name"]
+            document = self.docs_crud.create_document({
+                "name": row["name"],
+                "file_path": str(file_path),
+                "file_type": row["file_type"],
+                "file_size": row["file_size"],
+                "vector_path": collection_name,
+                "chunk_count": row["chunk_count"],
+                "knowledge_base_id": knowledge_base.id,
+            })
+            document_ids[row["id"]] = document.id
+
+            if (files_dir / row["file_name"]).exists():
+                shutil.copy2(files_dir / row["file_name"], file_path)
+            artifact_path = files_dir / ".artifacts" / f"{row['id']}.json.gz"
+            if artifact_path.exists():
+                shutil.copy2(artifact_path, kb_directory / ".artifacts" / f"{document.id}.json.gz")
+        return document_ids
+
+    def _import_chunk_batches(self, pa, snapshot_dir: Path, knowledge_base: KnowledgeBase,
+                              document_ids: Dict[int, int], vector_store: TextVectorStore,
+                              batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """
+        流式读取知识块，写入知识块记录并生成待写入向量数据库的记录批次
+
+        块ID的生成见 _iter_new_chunk_ids。元数据按新的块ID、文档ID和知识库UUID重新生成，
+        数据库记录和向量元数据中的 doc_id 都是新的块ID。近重复块的 duplicate_of 换成代表块的新块ID，
+        只写入知识块记录、不写入向量数据库；旧版本快照没有 simhash 和 duplicate_of 列，按空值处理。
+        """
+        chunks_path = snapshot_dir / CHUNKS_FILE
+        if not chunks_path.exists():
+            return
+        parquet_file = pa.parquet.ParquetFile(chunks_path, memory_map=True)
+        representative_ids = self._map_representative_ids(parquet_file, document_ids, batch_size)
+        for batch, chunk_ids in self._iter_new_chunk_ids(parquet_file.iter_batches(batch_size=batch_size),
+                                                         document_ids):
+            columns = batch.to_pydict()
+            simhashes = columns.get("simhash") or [None] * len(batch)
+            duplicate_of_column = columns.get("duplicate_of") or [None] * len(batch)
+            embedding_column = batch.column("embedding")
+            # 定长列表整体转为二维数组，比逐行 to_pylist 快一个数量级；近重复块和缺少向量的块为空值，先滤掉再放回
+            valid = embedding_column.is_valid()
+            dense_embeddings = embedding_column.filter(valid).flatten().to_numpy(zero_copy_only=False)
+            dense_embeddings = iter(dense_embeddings.reshape(-1, embedding_column.type.list_size).tolist())
+            embeddings = [next(dense_embeddings) if is_valid else None
+                          for is_valid in valid.to_numpy(zero_copy_only=False)]
+
+            chunk_rows, records = [], []
+            missing = []
+            for position, (old_document_id, content) in enumerate(zip(columns["document_id"], columns["content"])):
+                document_id = document_ids[old_document_id]
+                chunk_id = chunk_ids[position]
+                # 代表块不在快照中时（不应出现）按普通块导入
+                duplicate_of = representative_ids.get(duplicate_of_column[position])
+
+                chunk = ChunkRecord.from_metadata_json(
+                    text=content, chunk_index=columns["chunk_index"][position], chunk_id=chunk_id,
+                    metadata_json=columns["document_metadata"][position], simhash=simhashes[position],
+                    overrides={"document_id": document_id, "kb_uuid": knowledge_base.uuid},
+                )
+                chunk_rows.append({
+                    "chunk_id": chunk_id,
+                    "content": content,
+                    "page_label": columns["page_label"][position],
+                    "chunk_index": chunk.chunk_index,
+                    "document_metadata": chunk.metadata_json(),
+                    "document_id": document_id,
+                    "simhash": chunk.simhash,
+                    "duplicate_of": duplicate_of,
+                })
+                if duplicate_of is not None:
+                    continue
+                records.append({"id": chunk_id, "text": content, "embedding": embeddings[position],
+                                "metadata": chunk.to_metadata()})
+                if embeddings[position] is None:
+                    missing.append(records[-1])
+
+            if missing:
+                # 导出时缺少向量的块只能重新计算
+                vectors = vector_store.embeddings.embed_documents([record["text"] for record in missing])
+                for record, vector in zip(missing, vectors):
+                    record["embedding"] = vector
+            self.docs_crud.create_chunks(chunk_rows)
+            yield records
+
+    @staticmethod
+    def _iter_new_chunk_ids(batches: Iterator, document_ids: Dict[int, int]) -> Iterator:
+        """
+        为快照中的知识块生成新的块ID，逐批返回 (批次, 新块ID列表)
+
+        块ID按 (新文档ID, 同文本出现次序, 文本) 重新生成，与正常入库的 generate_chunk_ids 一致；
+        同一文档的块可能跨越多个批次，因此在批次之间保留当前文档各文本的出现次数。
+        批次须包含 document_id 和 content 列。
+        """
+        current_document, occurrences = None, {}
+        for batch in batches:
+            chunk_ids = []
+            for old_document_id, content in zip(batch.column("document_id").to_pylist(),
+                                                batch.column("content").to_pylist()):
+                document_id = document_ids[old_document_id]
+                if document_id != current_document:
+                    current_document, occurrences = document_id, {}
+                occurrence = occurrences.get(content, 0)
+                occurrences[content] = occurrence + 1
+                chunk_ids.append(generate_chunk_id(document_id, occurrence, content))
+            yield batch, chunk_ids
+
+    def _map_representative_ids(self, parquet_file, document_ids: Dict[int, int],
+                                batch_size: int) -> Dict[str, str]:
+        """
+        预先读取一遍知识块，返回近重复块引用的代表块 快照块ID -> 新块ID
+
+        知识库范围去重时代表块可能在排序靠后的其他文档中，只能在写入之前建立完整映射；
+        映射只包含被引用的代表块，预读只读取块ID、文档ID和文本列。
+        """
+        if "duplicate_of" not in parquet_file.schema_arrow.names:
+            return {}
+        referenced = set()
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=["duplicate_of"]):
+            referenced.update(value for value in batch.column("duplicate_of").to_pylist() if value is not None)
+        if not referenced:
+            return {}
+        batches = parquet_file.iter_batches(batch_size=batch_size, columns=["document_id", "chunk_id", "content"])
+        representative_ids = {}
+        for batch, chunk_ids in self._iter_new_chunk_ids(batches, document_ids):
+            for old_chunk_id, chunk_id in zip(batch.column("chunk_id").to_pylist(), chunk_ids):
+                if old_chunk_id in referenced:
+                    representative_ids[old_chunk_id] = chunk_id
+        return representative_ids
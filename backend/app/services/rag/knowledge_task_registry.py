@@ -0,0 +1,90 @@
+import threading
+from typing import Dict, Optional, Set
+
+REINDEX_TASK = "重新切分"
+PROJECTION_TASK = "降维"
+SHARD_BUILD_TASK = "构建分片"
+
+
+class KnowledgeTaskRegistry:
+    """
+    知识库后台任务登记
+
+    重新切分、降维和构建分片都会整库读写向量，同一知识库同时只允许其中一个运行，
+    正在迁移向量数据库（migration_target 非空）时也不允许启动。重新切分运行期间再次修改切片配置时
+    不并发启动第二个任务，而是合并为当前任务结束后的一次重跑，多次修改只重跑一次。
+
+    检查知识库状态和登记任务需要在同一把锁内完成：调用方持有 lock 时重新读取知识库，
+    再修改知识库或登记任务，避免两个请求同时通过检查。
+    """
+
+    def __init__(self):
+        """初始化任务登记"""
+        self.lock = threading.RLock()
+        self._running: Dict[int, str] = {}
+        self._pending_reruns: Set[int] = set()
+
+    def get_running(self, knowledge_id: int) -> Optional[str]:
+        """获取知识库正在运行的后台任务名称，没有时返回None"""
+        with self.lock:
+            return self._running.get(knowledge_id)
+
+    def check_idle(self, knowledge_base) -> None:
+        """
+        检查知识库没有正在运行的后台任务，也没有在迁移向量数据库
+
+        Raises:
+            ValueError: 知识库正在运行后台任务或正在迁移
+        """
+        with self.lock:
+            task = self._running.get(knowledge_base.id)
+            if task is not None:
+                raise ValueError(f"知识库 {knowledge_base.id} 正在{task}")
+            if knowledge_base.migration_target is not None:
+                raise ValueError(f"知识库 {knowledge_base.id} 正在迁移向量数据库")
+
+    def start(self, knowledge_base, task: str) -> None:
+        """
+        登记知识库开始运行后台任务
+
+        Raises:
+            ValueError: 知识库正在运行后台任务或正在迁移
+        """
+        with self.lock:
+            self.check_idle(knowledge_base)
+            self._running[knowledge_base.id] = task
+
+    def claim(self, knowledge_base, task: str) -> bool:
+        """
+        登记后台任务，同一任务正在运行时合并为一次重跑
+
+        Returns:
+            bool: 登记成功、调用方需要提交任务时返回True；已合并到正在运行的任务时返回False
+
+        Raises:
+            ValueError: 知识库正在运行其他后台任务或正在迁移
+        """
+        with self.lock:
+            if self._running.get(knowledge_base.id) == task:
+                self._pending_reruns.add(knowledge_base.id)
+                return False
+            self.start(knowledge_base, task)
+            return True
+
+    def finish(self, knowledge_id: int) -> bool:
+        """
+        结束知识库的后台任务
+
+        Returns:
+            bool: 有合并进来的重跑请求时返回True，此时任务仍保持登记，调用方应再运行一次；否则返回False
+        """
+        with self.lock:
+            if knowledge_id in self._pending_reruns:
+                self._pending_reruns.discard(knowledge_id)
+                return True
+            self._running.pop(knowledge_id, None)
+            return False
+
+
+# 创建全局任务登记实例
+knowledge_task_registry = KnowledgeTaskRegistry()
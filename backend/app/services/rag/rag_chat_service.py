@@ -0,0 +1,219 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, AsyncIterator, Callable, Awaitable
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
+from loguru import logger
+
+from app.core.config import settings
+from app.services.multi_rag.federated_search_service import FederatedSearchService
+
+SYSTEM_PROMPT = (
+    "你是知识库问答助手。请只根据下面的参考资料回答用户的问题，资料中没有相关信息时直接说明无法回答，不要编造。"
+    "引用资料时标注编号，如[1]。\n\n参考资料：\n{context}"
+)
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ChatStreamStats:
+    """
+    知识库问答流式输出统计
+
+    记录完成、客户端断开取消和失败的请求数、输出 token 总数，以及最近请求的首字耗时（从收到请求到输出第一个字）。
+    """
+
+    def __init__(self, window_size: int):
+        """
+        初始化统计
+
+        Args:
+            window_size: 用于计算首字耗时分位数的最近请求数量
+        """
+        self._lock = threading.Lock()
+        self.ttft_samples: deque = deque(maxlen=window_size)
+        self.outcomes = {"completed": 0, "cancelled": 0, "failed": 0}
+        self.completion_tokens = 0
+
+    def record(self, outcome: str, ttft_ms: Optional[float], completion_tokens: int) -> None:
+        """记录一次请求的结果、首字耗时和输出 token 数"""
+        with self._lock:
+            self.outcomes[outcome] += 1
+            self.completion_tokens += completion_tokens
+            if ttft_ms is not None:
+                self.ttft_samples.append(ttft_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取问答流式输出统计
+
+        Returns:
+            包含各结果的请求数、输出 token 总数和首字耗时分位数的字典
+        """
+        with self._lock:
+            samples = sorted(self.ttft_samples)
+            outcomes = dict(self.outcomes)
+            completion_tokens = self.completion_tokens
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            index = min(int(len(samples) * p), len(samples) - 1)
+            return round(samples[index], 2)
+
+        return {
+            **outcomes,
+            "requests": sum(outcomes.values()),
+            "completion_tokens": completion_tokens,
+            "ttft_sample_count": len(samples),
+            "ttft_p50_ms": percentile(0.50),
+            "ttft_p95_ms": percentile(0.95),
+            "ttft_max_ms": round(samples[-1], 2) if samples else 0.0,
+        }
+
+
+# 创建全局统计实例
+chat_stream_stats = ChatStreamStats(window_size=settings.chat_stats_window_size)
+
+
+class RagChatService:
+    """
+    知识库问答服务
+
+    先通过联合检索从一个或多个知识库取出相关知识块，再拼成提示词交给聊天模型；
+    模型的回答由 stream_chat_answer 以 Server-Sent Events 逐段推送给客户端。
+    """
+
+    def __init__(self, db_session):
+        """
+        初始化问答服务
+
+        Args:
+            db_session: 数据库会话对象
+        """
+        self.db_session = db_session
+        self.federated_search_service = FederatedSearchService(db_session)
+
+    def prepare(self, user_id: int, query: str, knowledge_ids: Optional[List[int]] = None, k: int = 4,
+                filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        检索知识块并构建提示词
+
+        Args:
+            user_id: 用户ID
+            query: 用户问题
+            knowledge_ids: 知识库ID列表，为None时检索用户自己的全部知识库
+            k: 参考的知识块数量
+            filters: 元数据过滤条件
+
+        Returns:
+            messages 为发送给模型的消息，sources 为参考的知识块，knowledge_bases 为各知识库的检索状态，
+            retrieval_ms 为检索耗时
+
+        Raises:
+            ValueError: 检索参数不合法
+        """
+        retrieval = self.federated_search_service.search(user_id, query, knowledge_ids=knowledge_ids, k=k,
+                                                          filters=filters)
+        return {
+            "messages": self.build_messages(query, retrieval["results"]),
+            "sources": retrieval["results"],
+            "knowledge_bases": retrieval["knowledge_bases"],
+            "retrieval_ms": retrieval["took_ms"],
+        }
+
+    @staticmethod
+    def build_messages(query: str, results: List[Dict[str, Any]]) -> List[BaseMessage]:
+        """
+        把检索结果按相关度顺序编号拼入系统提示词，总字符数超过 CHAT_MAX_CONTEXT_CHARS 时丢弃后面的知识块
+
+        Args:
+            query: 用户问题
+            results: 联合检索结果
+
+        Returns:
+            系统消息和用户消息
+        """
+        sections, remaining = [], settings.chat_max_context_chars
+        for index, result in enumerate(results, start=1):
+            content = result["content"]
+            if len(content) > remaining:
+                break
+            sections.append(f"[{index}] {content}")
+            remaining -= len(content)
+        context = "\n\n".join(sections) or "（没有检索到相关资料）"
+        return [SystemMessage(content=SYSTEM_PROMPT.format(context=context)), HumanMessage(content=query)]
+
+
+async def stream_chat_answer(llm: BaseChatModel, prepared: Dict[str, Any], started: float,
+                             is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncIterator[str]:
+    """
+    以 Server-Sent Events 流式输出问答结果
+
+    依次推送 sources（参考的知识块和各知识库的检索状态）、逐段的 token、最后的 done（耗时和 token 数）；
+    模型调用失败时推送 error。每收到一段输出检查一次客户端是否已断开，断开后停止读取，
+    关闭模型的流式响应，上游不再继续生成；服务器取消或关闭生成器时同样计为取消。
+
+    Args:
+        llm: 聊天模型
+        prepared: RagChatService.prepare 的返回值
+        started: 收到请求的时间（time.perf_counter），首字耗时从这里算起，包含检索耗时
+        is_disconnected: 检查客户端是否已断开的协程函数，通常为 request.is_disconnected
+
+    Yields:
+        SSE 格式的消息
+    """
+    yield format_sse("sources", {"sources": prepared["sources"], "knowledge_bases": prepared["knowledge_bases"]})
+
+    outcome, ttft_ms, chunk_count, usage = "cancelled", None, 0, None
+    try:
+        async for chunk in llm.astream(prepared["messages"]):
+            if is_disconnected is not None and await is_disconnected():
+                logger.info(f"客户端已断开，停止生成，已输出 {chunk_count} 段")
+                return
+            # 流式用量在最后一个分块中返回，各分块的用量相加即为总量
+            if chunk.usage_metadata:
+                usage = chunk.usage_metadata if usage is None else {
+                    key: usage.get(key, 0) + chunk.usage_metadata.get(key, 0)
+                    for key in ("input_tokens", "output_tokens", "total_tokens")
+                }
+            if not chunk.content:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+            chunk_count += 1
+            yield format_sse("token", {"content": chunk.content})
+        outcome = "completed"
+    except asyncio.CancelledError:
+        logger.info(f"问答流被取消，已输出 {chunk_count} 段")
+        raise
+    except Exception as error:
+        outcome = "failed"
+        logger.error(f"问答生成失败: {str(error)}")
+        yield format_sse("error", {"msg": f"回答生成失败: {str(error)}"})
+        return
+    finally:
+        # 没有用量信息的模型（如假模型）以输出分段数近似输出 token 数
+        completion_tokens = usage["output_tokens"] if usage else chunk_count
+        chat_stream_stats.record(outcome, ttft_ms, completion_tokens)
+
+    total_ms = (time.perf_counter() - started) * 1000
+    summary = {
+        "retrieval_ms": prepared["retrieval_ms"],
+        "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+        "total_ms": round(total_ms, 1),
+        "prompt_tokens": usage["input_tokens"] if usage else None,
+        "completion_tokens": completion_tokens,
+        "total_tokens": usage["total_tokens"] if usage else None,
+        "token_source": "usage" if usage else "chunks",
+    }
+    logger.info(f"问答完成，检索: {summary['retrieval_ms']}ms，首字: {summary['ttft_ms']}ms，"
+                f"总耗时: {summary['total_ms']}ms，输出 token: {completion_tokens}")
+    yield format_sse("done", summary)
@@ -0,0 +1,73 @@
+from typing import Dict, Any, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud.knowledge import KnowledgeBaseDB
+from app.services.rag.knowledge_task_registry import knowledge_task_registry, SHARD_BUILD_TASK
+from app.vector_store.text_vector_store import TextVectorStore
+
+
+def check_shards_supported(knowledge_base) -> None:
+    """
+    检查知识库能否构建分片
+
+    Raises:
+        ValueError: 未启用分片检索、向量数据不在本机、知识库有其他后台任务或正在迁移
+    """
+    if not settings.sharded_search_enabled:
+        raise ValueError("未启用分片检索（SHARDED_SEARCH_ENABLED）")
+    store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_base.id,
+                                               store_type=knowledge_base.vector_db_type.value)
+    if not store.is_local:
+        raise ValueError(f"知识库 {knowledge_base.id} 的向量数据不在本机，不支持分片检索")
+    knowledge_task_registry.check_idle(knowledge_base)
+
+
+def build_knowledge_base_shards(db_session, knowledge_id: int, shard_count: Optional[int] = None) -> Dict[str, Any]:
+    """
+    为知识库的向量集合构建本地分片
+
+    分片是构建时的快照，知识库之后有写入或删除时分片自动失效，检索回退到向量数据库，需要重新构建。
+
+    Args:
+        db_session: 数据库会话对象
+        knowledge_id: 知识库ID
+        shard_count: 分片数量，默认取配置
+
+    Returns:
+        分片清单
+
+    Raises:
+        ValueError: 知识库不存在或不支持分片检索
+    """
+    with knowledge_task_registry.lock:
+        knowledge_base = KnowledgeBaseDB(db_session).get_knowledge_base_by_id(knowledge_id)
+        if not knowledge_base:
+            raise ValueError(f"未找到ID为 {knowledge_id} 的知识库")
+        check_shards_supported(knowledge_base)
+        knowledge_task_registry.start(knowledge_base, SHARD_BUILD_TASK)
+    try:
+        store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_id,
+                                                   store_type=knowledge_base.vector_db_type.value)
+        return store.build_search_shards(shard_count)
+    finally:
+        knowledge_task_registry.finish(knowledge_id)
+
+
+def run_search_shard_build(knowledge_id: int, shard_count: Optional[int] = None) -> None:
+    """
+    后台任务：使用独立的数据库会话为知识库构建分片
+
+    Args:
+        knowledge_id: 知识库ID
+        shard_count: 分片数量
+    """
+    db_session = SessionLocal()
+    try:
+        build_knowledge_base_shards(db_session, knowledge_id, shard_count)
+    except Exception as error:
+        logger.error(f"后台为知识库 {knowledge_id} 构建分片失败: {str(error)}")
+    finally:
+        db_session.close()
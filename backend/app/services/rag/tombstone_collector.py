@@ -0,0 +1,188 @@
+import threading
+import time
+from typing import Optional, Dict, Any, Set, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud.docs import DocsCRUD
+from app.crud.knowledge import KnowledgeBaseDB
+from app.services.rag.document_processing_service import DocumentProcessingService
+
+
+class TombstoneCollector:
+    """
+    已标记删除数据的后台回收器
+
+    删除接口只给文档或知识库打上删除标记，本回收器在独立线程中定期清理向量、本地文件和数据库记录。
+    每批最多处理 batch_size 个文档，批与批之间暂停 batch_pause 秒，避免大批量删除拖慢其他请求。
+
+    回收按知识库隔离失败：某个知识库回收失败（如其 Milvus 集合暂时无法访问）只记录错误并跳过，
+    之后按失败次数指数退避重试，不阻塞排在它后面的知识库和文档。
+    """
+
+    def __init__(self, interval: float, batch_size: int, batch_pause: float, max_backoff: float):
+        """
+        初始化回收器
+
+        Args:
+            interval: 两轮回收之间的间隔（秒）
+            batch_size: 每批回收的文档数量
+            batch_pause: 批与批之间的暂停时间（秒）
+            max_backoff: 回收失败后重试的最长退避时间（秒）
+        """
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.max_backoff = max_backoff
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.last_run: Dict[str, Any] = {}
+        # (回收类型, 知识库ID) -> 连续失败次数、下次重试时间和最近的错误；回收类型为 knowledge_base 或 documents
+        self._failures: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    def start(self) -> None:
+        """启动后台回收线程"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="tombstone-collector", daemon=True)
+        self._thread.start()
+        logger.info(f"删除数据回收器已启动，间隔: {self.interval}s, 每批文档数: {self.batch_size}")
+
+    def stop(self) -> None:
+        """停止后台回收线程，正在处理的批次完成后退出"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        logger.info("删除数据回收器已停止")
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.collect_once()
+            except Exception as error:
+                logger.error(f"回收已删除数据失败: {str(error)}")
+
+    def collect_once(self) -> Dict[str, Any]:
+        """
+        执行一轮回收：先回收整个被删除的知识库，再回收单独被删除的文档
+
+        Returns:
+            本轮回收的知识库数量、文档数量、失败的知识库和批次数量、正在退避的数量和耗时
+        """
+        with self._lock:
+            started = time.perf_counter()
+            result = {"knowledge_bases": 0, "documents": 0, "failed": 0}
+            db_session = SessionLocal()
+            try:
+                service = DocumentProcessingService(db_session=db_session)
+                knowledge_bases = KnowledgeBaseDB(db_session).list_deleted_knowledge_bases(
+                    limit=self.batch_size, exclude_ids=self._backing_off("knowledge_base"))
+                for knowledge_base in knowledge_bases:
+                    if self._stop_event.is_set():
+                        break
+                    knowledge_id = knowledge_base.id
+                    try:
+                        result["documents"] += self._collect_knowledge_base(db_session, service, knowledge_base)
+                    except Exception as error:
+                        db_session.rollback()
+                        self._record_failure("knowledge_base", knowledge_id, error)
+                        result["failed"] += 1
+                        continue
+                    self._failures.pop(("knowledge_base", knowledge_id), None)
+                    result["knowledge_bases"] += 1
+                collected_count, failed_count = self._collect_documents(db_session, service)
+                result["documents"] += collected_count
+                result["failed"] += failed_count
+            finally:
+                db_session.close()
+
+            result["backing_off"] = len(self._failures)
+
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            if result["knowledge_bases"] or result["documents"]:
+                logger.info(f"回收已删除数据完成: {result}")
+            self.last_run = result
+            return result
+
+    def _collect_knowledge_base(self, db_session, service: DocumentProcessingService, knowledge_base) -> int:
+        """回收单个知识库：删除向量集合和本地目录后，分批删除文档记录，最后删除知识库记录"""
+        knowledge_id = knowledge_base.id
+        service.purge_knowledge_base_storage(knowledge_base)
+
+        docs_crud = DocsCRUD(db_session)
+        collected_count = 0
+        while not self._stop_event.is_set():
+            document_ids = docs_crud.list_document_ids_by_knowledge_id(knowledge_id, limit=self.batch_size)
+            if not document_ids:
+                KnowledgeBaseDB(db_session).delete_knowledge_base_record(knowledge_id)
+                logger.info(f"知识库 {knowledge_id} 回收完成，共删除 {collected_count} 个文档")
+                break
+            collected_count += docs_crud.delete_documents_by_ids(document_ids)
+            self._stop_event.wait(self.batch_pause)
+        return collected_count
+
+    def _collect_documents(self, db_session, service: DocumentProcessingService) -> Tuple[int, int]:
+        """
+        分批回收单独被删除的文档，每批只包含同一知识库的文档
+
+        某个知识库的批次失败时，本轮不再处理该知识库的文档；查询后知识库被整体标记删除时，
+        其文档留给下一轮随知识库一起回收。
+
+        Returns:
+            回收的文档数量和失败的批次数量
+        """
+        docs_crud = DocsCRUD(db_session)
+        knowledge_base_db = KnowledgeBaseDB(db_session)
+        skipped_ids = self._backing_off("documents")
+        collected_count, failed_count = 0, 0
+        while not self._stop_event.is_set():
+            documents = docs_crud.list_deleted_documents(limit=self.batch_size, exclude_knowledge_ids=skipped_ids)
+            if not documents:
+                break
+            knowledge_id = documents[0].knowledge_base_id
+            batch = [document for document in documents if document.knowledge_base_id == knowledge_id]
+            knowledge_base = knowledge_base_db.get_knowledge_base_by_id(knowledge_id)
+            if knowledge_base is None:
+                logger.info(f"知识库 {knowledge_id} 已被标记删除，其文档随知识库一起回收")
+                skipped_ids.add(knowledge_id)
+                continue
+            try:
+                collected_count += service.purge_documents(knowledge_base=knowledge_base, documents=batch)
+            except Exception as error:
+                db_session.rollback()
+                self._record_failure("documents", knowledge_id, error)
+                skipped_ids.add(knowledge_id)
+                failed_count += 1
+                continue
+            self._failures.pop(("documents", knowledge_id), None)
+            self._stop_event.wait(self.batch_pause)
+        return collected_count, failed_count
+
+    def _backing_off(self, kind: str) -> Set[int]:
+        """获取回收失败后仍在退避期内的知识库ID"""
+        now = time.monotonic()
+        return {knowledge_id for (failure_kind, knowledge_id), failure in self._failures.items()
+                if failure_kind == kind and failure["retry_at"] > now}
+
+    def _record_failure(self, kind: str, knowledge_id: int, error: Exception) -> None:
+        """记录回收失败，下次重试的间隔从 interval 开始按连续失败次数翻倍，不超过 max_backoff"""
+        failure = self._failures.setdefault((kind, knowledge_id), {"count": 0})
+        failure["count"] += 1
+        backoff = min(self.interval * 2 ** (failure["count"] - 1), self.max_backoff)
+        failure.update(retry_at=time.monotonic() + backoff, error=str(error))
+        target = "知识库" if kind == "knowledge_base" else "已删除文档，知识库"
+        logger.error(f"回收{target} {knowledge_id} 失败（连续第 {failure['count']} 次），"
+                     f"{backoff:g}s 后重试: {str(error)}")
+
+
+tombstone_collector = TombstoneCollector(
+    interval=settings.gc_interval,
+    batch_size=settings.gc_batch_size,
+    batch_pause=settings.gc_batch_pause,
+    max_backoff=settings.gc_max_backoff,
+)
@@ -0,0 +1,145 @@
+import time
+from typing import Dict, Any, List, Set
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud.docs import DocsCRUD
+from app.crud.knowledge import KnowledgeBaseDB
+from app.vector_store.text_vector_store import TextVectorStore
+
+
+class VectorStoreMigrationService:
+    """
+    知识库向量数据库在线迁移服务（Chroma <-> Milvus）
+
+    迁移流程：
+    1. 知识库被标记迁移目标（migration_target）后，新写入和删除同时作用于新旧两个向量数据库（双写）
+    2. 分批把源向量数据库中的记录（ID、文本、向量、元数据）复制到目标，不重新嵌入
+    3. 按ID比对两边数据：删除目标中多余的记录，补齐目标缺失的记录
+    4. 单条UPDATE语句切换知识库的向量数据库类型并清除迁移标记，读请求随即改用目标
+    5. 等待宽限期，补齐切换前已开始、切换后才写入源的记录，然后删除源集合
+
+    切换前任何一步失败都会取消迁移标记并清理目标中已写入的数据，知识库继续使用源向量数据库。
+    """
+
+    def __init__(self, db_session):
+        """
+        初始化迁移服务
+
+        Args:
+            db_session: 数据库会话对象
+        """
+        self.db_session = db_session
+        self.knowledge_base_db = KnowledgeBaseDB(db_session)
+        self.docs_crud = DocsCRUD(db=db_session)
+        self.batch_size = settings.vector_migration_batch_size
+
+    def migrate(self, knowledge_id: int) -> Dict[str, Any]:
+        """
+        执行知识库的向量数据库迁移，知识库须已通过 start_vector_store_migration 标记迁移目标
+
+        Args:
+            knowledge_id: 知识库ID
+
+        Returns:
+            迁移结果，包含复制、清理、补齐的记录数量和耗时
+
+        Raises:
+            ValueError: 知识库不存在或未标记迁移目标
+            RuntimeError: 切换时迁移已被取消或知识库已删除
+        """
+        started = time.perf_counter()
+        knowledge_base = self.knowledge_base_db.get_knowledge_base_by_id(knowledge_id)
+        target = self.knowledge_base_db.get_migration_target(knowledge_id)
+        if not knowledge_base or target is None:
+            raise ValueError(f"知识库 {knowledge_id} 不存在或未在迁移中")
+
+        source_store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_id,
+                                                          store_type=knowledge_base.vector_db_type.value)
+        target_store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_id, store_type=target.value)
+        logger.info(f"开始迁移知识库 {knowledge_id} 的向量: {source_store.store_type}/{source_store.collection_name}"
+                    f" -> {target_store.store_type}/{target_store.collection_name}")
+
+        try:
+            copied_count = 0
+            for records in source_store.iter_records(batch_size=self.batch_size):
+                self._copy_records(target_store, records)
+                copied_count += len(records)
+                logger.info(f"知识库 {knowledge_id} 已复制 {copied_count} 条记录")
+
+            source_ids, target_ids = self._collect_ids(source_store), self._collect_ids(target_store)
+            stale_ids = list(target_ids - source_ids)
+            if stale_ids:
+                target_store.delete_documents(document_ids=stale_ids)
+            missing_count = self._copy_by_ids(source_store, target_store, list(source_ids - target_ids))
+
+            if not self.knowledge_base_db.finish_vector_store_migration(
+                    knowledge_id, target, vector_path=target_store.collection_name):
+                raise RuntimeError(f"知识库 {knowledge_id} 的迁移已被取消或知识库已删除")
+        except Exception as error:
+            logger.error(f"迁移知识库 {knowledge_id} 的向量失败，取消迁移并清理目标数据: {str(error)}")
+            self.knowledge_base_db.abort_vector_store_migration(knowledge_id)
+            try:
+                target_store.delete_collection()
+            except Exception as cleanup_error:
+                logger.warning(f"清理迁移目标失败: {str(cleanup_error)}")
+            raise
+        logger.info(f"知识库 {knowledge_id} 已切换到 {target.value}")
+
+        # 切换前已读取旧类型的请求可能仍在写入源集合，宽限期后把这些仍有效的记录补到目标
+        time.sleep(settings.vector_migration_grace_seconds)
+        late_ids = self._collect_ids(source_store) - self._collect_ids(target_store)
+        late_count = self._copy_by_ids(source_store, target_store,
+                                       self.docs_crud.filter_existing_chunk_ids(list(late_ids)))
+        source_store.delete_collection()
+
+        result = {
+            "knowledge_id": knowledge_id,
+            "target": target.value,
+            "copied": copied_count,
+            "stale_removed": len(stale_ids),
+            "missing_copied": missing_count,
+            "late_copied": late_count,
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+        logger.info(f"知识库 {knowledge_id} 向量迁移完成: {result}")
+        return result
+
+    def _collect_ids(self, store: TextVectorStore) -> Set[str]:
+        return {record_id for ids in store.iter_ids(batch_size=self.batch_size) for record_id in ids}
+
+    @staticmethod
+    def _copy_records(target_store: TextVectorStore, records: List[Dict[str, Any]]) -> None:
+        """复制一批记录；Milvus 插入不覆盖相同主键，先删除双写可能已写入的同ID记录"""
+        if not records:
+            return
+        if target_store.store_type.lower() == "milvus":
+            target_store.delete_documents(document_ids=[str(record["id"]) for record in records])
+        target_store.add_records(records)
+
+    def _copy_by_ids(self, source_store: TextVectorStore, target_store: TextVectorStore, ids: List[str]) -> int:
+        """按ID从源复制记录到目标"""
+        copied_count = 0
+        for start in range(0, len(ids), self.batch_size):
+            records = source_store.get_records_by_ids(ids[start:start + self.batch_size])
+            self._copy_records(target_store, records)
+            copied_count += len(records)
+        return copied_count
+
+
+def run_vector_store_migration(knowledge_id: int) -> None:
+    """
+    后台任务：使用独立的数据库会话迁移知识库的向量数据库
+
+    Args:
+        knowledge_id: 知识库ID
+    """
+    db_session = SessionLocal()
+    try:
+        VectorStoreMigrationService(db_session=db_session).migrate(knowledge_id=knowledge_id)
+    except Exception as error:
+        logger.error(f"后台迁移知识库 {knowledge_id} 的向量数据库失败: {str(error)}")
+    finally:
+        db_session.close()
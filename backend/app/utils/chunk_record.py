@@ -0,0 +1,85 @@
+import json
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+from app.vector_store.metadata_schema import ARRAY_FIELDS
+
+
+@dataclass(slots=True)
+class ChunkSource:
+    """
+    同一页（块）切出的全部知识块共享的元数据
+
+    元数据只构造和序列化一次，知识块只保存引用，不复制。构造后不应再修改。
+    """
+
+    metadata: Dict[str, Any]
+    # 元数据 JSON 去掉结尾的右花括号，拼接知识块自身的字段即得到完整 JSON
+    metadata_json_prefix: str
+
+    @classmethod
+    def from_metadata(cls, metadata: Dict[str, Any]) -> "ChunkSource":
+        return cls(metadata=metadata,
+                   metadata_json_prefix=json.dumps(metadata, ensure_ascii=False, default=str)[:-1])
+
+
+@dataclass(slots=True)
+class ChunkRecord:
+    """
+    入库流水线中的知识块
+
+    从切分到元数据增强、嵌入、写入向量数据库和数据库的全过程只使用这一种表示；
+    只在写入向量数据库时生成各自的元数据字典，写入数据库时拼接共享元数据的 JSON。
+    """
+
+    text: str
+    chunk_index: int
+    source: ChunkSource
+    chunk_id: str
+    # 近重复检测结果：内容的SimHash，以及近重复时代表块的块ID（不写入向量数据库）
+    simhash: Optional[int] = None
+    duplicate_of: Optional[str] = None
+
+    @classmethod
+    def from_metadata_json(cls, text: str, chunk_index: int, chunk_id: str, metadata_json: str,
+                           simhash: Optional[int] = None,
+                           overrides: Optional[Dict[str, Any]] = None) -> "ChunkRecord":
+        """
+        由数据库中的知识块记录还原知识块，metadata_json 为 metadata_json() 的结果
+
+        doc_id 和 chunk_index 总是取自参数而不是 metadata_json；overrides 覆盖共享元数据中的字段，
+        如导入快照时的新文档ID和知识库UUID。
+        """
+        metadata = json.loads(metadata_json or "{}")
+        metadata.pop("doc_id", None)
+        metadata.pop("chunk_index", None)
+        metadata.update(overrides or {})
+        return cls(text=text, chunk_index=chunk_index, source=ChunkSource.from_metadata(metadata),
+                   chunk_id=chunk_id, simhash=simhash)
+
+    @property
+    def page_label(self) -> str:
+        return self.source.metadata.get("page_label") or ""
+
+    def to_metadata(self, drop_empty_arrays: bool = False) -> Dict[str, Any]:
+        """
+        生成写入向量数据库的元数据字典
+
+        Args:
+            drop_empty_arrays: 是否移除空的数组字段（Chroma 不接受空列表）
+
+        Returns:
+            新的元数据字典，调用方可以修改
+        """
+        metadata = {**self.source.metadata, "doc_id": self.chunk_id, "chunk_index": self.chunk_index}
+        if drop_empty_arrays:
+            for name in ARRAY_FIELDS:
+                if metadata.get(name) == []:
+                    metadata.pop(name)
+        return metadata
+
+    def metadata_json(self) -> str:
+        """生成写入数据库的元数据 JSON，与 json.dumps(to_metadata()) 的结果一致"""
+        separator = ", " if self.source.metadata else ""
+        return (f'{self.source.metadata_json_prefix}{separator}"doc_id": {json.dumps(self.chunk_id)}, '
+                f'"chunk_index": {self.chunk_index}}}')
@@ -0,0 +1,43 @@
+import uuid
+from typing import List, Dict
+
+# 知识块ID的命名空间，修改后已有知识块的ID将全部失效
+CHUNK_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "knowledge-chunk")
+
+
+def generate_chunk_id(document_id: int, occurrence: int, text: str) -> str:
+    """
+    生成单个知识块ID
+
+    Args:
+        document_id: 文档ID
+        occurrence: 该文本在文档中第几次出现，从0开始
+        text: 块文本
+
+    Returns:
+        UUID字符串
+    """
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{document_id}:{occurrence}:{text}"))
+
+
+def generate_chunk_ids(document_id: int, texts: List[str]) -> List[str]:
+    """
+    根据文档ID和块内容生成确定性的知识块ID
+
+    相同文档中内容相同的块得到相同的ID，使重新上传或重新切分时可以按ID比较新旧块集合；
+    同一文档内重复出现的文本按出现次序区分，保证ID唯一。
+
+    Args:
+        document_id: 文档ID
+        texts: 块文本列表
+
+    Returns:
+        与 texts 一一对应的UUID字符串列表
+    """
+    occurrences: Dict[str, int] = {}
+    chunk_ids = []
+    for text in texts:
+        occurrence = occurrences.get(text, 0)
+        occurrences[text] = occurrence + 1
+        chunk_ids.append(generate_chunk_id(document_id, occurrence, text))
+    return chunk_ids
@@ -1,11 +1,15 @@
-import json
 import logging
-from typing import List
+from typing import Any, Dict, List
+from uuid import uuid4
 
-from langchain_core.documents import Document as LangchainDocument
 from llama_index.core import Document as LlamaDocument
+from llama_index.core.node_parser.interface import MetadataAwareTextSplitter
+from llama_index.core.schema import MetadataMode
 
 from app.core.config import settings
+from app.utils.chunk_record import ChunkRecord, ChunkSource
+from app.utils.chunk_utils import generate_chunk_ids
+from app.vector_store.metadata_schema import parse_tags, parse_page, parse_file_type
 
 # 默认排除的元数据字段列表
 DEFAULT_EXCLUDE_FIELDS = [
@@ -13,107 +17,113 @@ DEFAULT_EXCLUDE_FIELDS = [
     for field in settings.metadata_exclude_fields.split(",")
     if field.strip()
 ]
+# 知识块自身的字段，不属于共享元数据
+CHUNK_FIELDS = ("doc_id", "chunk_index")
 
 
-def _enrich_document_metadata(
-        document: LlamaDocument,
+def _build_source_metadata(
+        page_metadata: Dict[str, Any],
         kb_uuid: str,
-        chunk_index: int,
-        tags: List[str] = None
-):
+        tags: List[str] = None,
+        document_id: int = None
+) -> Dict[str, Any]:
     """
-    为单个文档增强元数据
+    构造同一页切出的知识块共享的增强元数据
 
     Args:
-        document: 要增强的LlamaIndex文档
+        page_metadata: 解析得到的页面元数据
         kb_uuid: 知识库UUID
-        chunk_index: 块索引
         tags: 标签列表
-    """
-    try:
-        if document.metadata is None:
-            document.metadata = {}
-
-        # 提取原始元数据
-        raw_file_name = document.metadata.get("file_name")
-        raw_page_label = document.metadata.get("page_label")
-        raw_creation_date = document.metadata.get("creation_date")
-
-        # 新的元数据更新
-        metadata_updates = {
-            "doc_id": document.doc_id,
-            "kb_uuid": kb_uuid,
-            "source_file": raw_file_name or f"unknown_file_{document.doc_id[:8]}.pdf",
-            "tags": json.dumps(tags or [], ensure_ascii=False),
-            "page_label": raw_page_label,
-            "creation_date": raw_creation_date,
-            "chunk_index": chunk_index,
-        }
-
-        # 移除不需要的字段
-        for field in DEFAULT_EXCLUDE_FIELDS:
-            document.metadata.pop(field, None)
-
-        document.metadata.update(metadata_updates)
-
-    except Exception as error:
-        logging.error(
-            f"元数据增强失败: doc_id={document.doc_id}, kb_uuid={kb_uuid}, "
-            f"chunk_index={chunk_index}, error={str(error)}"
-        )
-        raise
-
-
-def _convert_llama_to_langchain_document(llama_document: LlamaDocument) -> LangchainDocument:
-    """
-    将LlamaIndex的Document转换为LangChain的Document
-
-    Args:
-        llama_document: LlamaIndex文档对象
+        document_id: 所属文档ID，用于按文档过滤删除向量
 
     Returns:
-        LangChain文档对象
+        新的元数据字典
     """
-    return LangchainDocument(
-        page_content=llama_document.text if hasattr(llama_document, 'text') else str(llama_document),
-        metadata=llama_document.metadata or {}
-    )
-
-
-def process_pdf_documents(
-        documents: List[LlamaDocument],
+    metadata = dict(page_metadata or {})
+
+    # 提取原始元数据
+    raw_file_name = metadata.get("file_name")
+    raw_page_label = metadata.get("page_label")
+    raw_creation_date = metadata.get("creation_date")
+
+    # 新的元数据更新，tags、page、file_type 等类型化字段见 app.vector_store.metadata_schema
+    source_file = raw_file_name or f"unknown_file_{uuid4().hex[:8]}.pdf"
+    metadata_updates = {
+        "kb_uuid": kb_uuid,
+        "source_file": source_file,
+        "file_type": parse_file_type(source_file),
+        "tags": parse_tags(tags),
+        "page_label": raw_page_label or "",  # TXT/MD 等无页码，Milvus 无法推断None字段的类型
+        "page": parse_page(raw_page_label),
+        "creation_date": raw_creation_date,
+    }
+
+    # 移除不需要的字段
+    for field in DEFAULT_EXCLUDE_FIELDS + list(CHUNK_FIELDS):
+        metadata.pop(field, None)
+
+    if document_id is not None:
+        metadata_updates["document_id"] = document_id
+
+    metadata.update(metadata_updates)
+    return metadata
+
+
+def _get_metadata_str(document: LlamaDocument) -> str:
+    """与 LlamaIndex 切分节点时相同：取嵌入和 LLM 两种模式中较长的元数据字符串计入切块长度"""
+    embed_metadata_str = document.get_metadata_str(mode=MetadataMode.EMBED)
+    llm_metadata_str = document.get_metadata_str(mode=MetadataMode.LLM)
+    return embed_metadata_str if len(embed_metadata_str) > len(llm_metadata_str) else llm_metadata_str
+
+
+def build_chunk_records(
+        raw_documents: List[LlamaDocument],
+        splitter: MetadataAwareTextSplitter,
         kb_uuid: str,
+        document_id: int,
         tags: List[str] = None,
-) -> List[LangchainDocument]:
+) -> List[ChunkRecord]:
     """
-    处理PDF文档列表，进行元数据增强并转换为LangChain格式
+    切分原始文档并构造带增强元数据的知识块
+
+    直接调用切分器的 split_text_metadata_aware，不创建中间节点；每页的增强元数据只构造一次，由该页的知识块共享。
+    切分结果与 get_nodes_from_documents 一致，空白切块被丢弃。
 
     Args:
-        documents: LlamaIndex文档列表
-        knowledge_base_uuid: 知识库UUID
+        raw_documents: 解析得到的原始文档列表
+        splitter: 切分器
+        kb_uuid: 知识库UUID
+        document_id: 所属文档ID，同时用于生成确定性的知识块ID
         tags: 标签列表
 
     Returns:
-        处理后的LangChain文档列表
+        按文档顺序排列的知识块列表
     """
     try:
-        processed_documents = []
-        for chunk_index, document in enumerate(documents):
-            # 增强元数据
-            _enrich_document_metadata(
-                document=document,
+        texts, sources = [], []
+        for document in raw_documents:
+            splits = splitter.split_text_metadata_aware(
+                document.get_content(metadata_mode=MetadataMode.NONE),
+                metadata_str=_get_metadata_str(document)
+            )
+            splits = [split for split in splits if split.strip()]
+            if not splits:
+                continue
+            source = ChunkSource.from_metadata(_build_source_metadata(
+                page_metadata=document.metadata,
                 kb_uuid=kb_uuid,
                 tags=tags,
-                chunk_index=chunk_index,
-            )
+                document_id=document_id,
+            ))
+            texts.extend(splits)
+            sources.extend([source] * len(splits))
 
-            # 转换为LangChain文档类型
-            langchain_document = _convert_llama_to_langchain_document(document)
-            processed_documents.append(langchain_document)
-
-        logging.info(f"元数据增强完成，共 {len(processed_documents)} 个文档。")
-        return processed_documents
+        chunks = [ChunkRecord(text=text, chunk_index=chunk_index, source=source, chunk_id=chunk_id)
+                  for chunk_index, (text, source, chunk_id) in enumerate(
+                      zip(texts, sources, generate_chunk_ids(document_id, texts)))]
+        logging.info(f"切分及元数据增强完成，共 {len(chunks)} 个知识块。")
+        return chunks
 
     except Exception as error:
-        logging.error(f"处理文档列表失败: {str(error)}")
-        raise
\ No newline at end of file
+        logging.error(f"构造知识块失败: kb_uuid={kb_uuid}, document_id={document_id}, error={str(error)}")
+        raise
@@ -0,0 +1,202 @@
+import math
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.callbacks.base import CallbackManager
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.node_parser.interface import MetadataAwareTextSplitter
+from llama_index.core.utils import get_tokenizer
+
+# 句末标点（中日文全角、英文半角），英文句点只在其后为空白或文本结尾时断句，避免切开小数和缩写；
+# 句末标点后的右引号、右括号归属当前句；换行也作为句子边界
+SENTENCE_END_PATTERN = re.compile(
+    r"(?:[。！？!?；;…]+|\.(?=\s|$))[”’」』）)】》〉\"']*[ \t]*|\n\s*"
+)
+# 超长句子的次级切分点：逗号、顿号、冒号和空白
+CLAUSE_END_PATTERN = re.compile(r"[，,、：:]+\s*|\s+")
+
+
+@lru_cache(maxsize=1)
+def get_cached_tokenizer() -> Callable[[str], List]:
+    """
+    获取进程内只加载一次的分词器，与 SentenceSplitter 使用相同的 tiktoken 编码，chunk_size 的含义保持一致
+
+    Returns:
+        文本 -> token 列表的函数
+    """
+    return get_tokenizer()
+
+
+@lru_cache(maxsize=1)
+def get_token_counter() -> Callable[[List[str]], List[int]]:
+    """
+    获取批量统计 token 数的函数
+
+    缓存的分词器是 tiktoken 编码时直接调用其 encode_ordinary，省去 partial 包装和特殊 token 检查的开销；
+    否则逐条调用分词器。
+
+    Returns:
+        文本列表 -> token 数列表的函数
+    """
+    tokenizer = get_cached_tokenizer()
+    encoding = getattr(getattr(tokenizer, "func", None), "__self__", None)
+    encode = getattr(encoding, "encode_ordinary", None) or tokenizer
+    return lambda texts: [len(encode(text)) for text in texts]
+
+
+def _split_by_pattern(text: str, pattern: re.Pattern) -> List[str]:
+    """按分隔符切分文本，分隔符保留在前一段末尾，拼接全部片段即为原文"""
+    pieces, start = [], 0
+    for match in pattern.finditer(text):
+        if match.end() > start:
+            pieces.append(text[start:match.end()])
+            start = match.end()
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+class CJKSentenceSplitter(MetadataAwareTextSplitter):
+    """
+    面向中日文的句子切分器
+
+    与 SentenceSplitter 的区别：
+    1. 按中日文全角标点和英文句末标点切句，不依赖 nltk 的英文句子模型
+    2. 每个句子只统计一次 token 数，超长句子按逗号、空白切分，仍超长时按字符等分
+    3. 以前缀和二分定位每个切块的结尾，按整句回退得到重叠部分，切分耗时与句子数量成线性关系
+
+    chunk_size 和 chunk_overlap 与 SentenceSplitter 一样以 token 计。
+    """
+
+    chunk_size: int = Field(default=1024, description="每个切块的 token 数上限", gt=0)
+    chunk_overlap: int = Field(default=20, description="相邻切块重叠的 token 数上限", ge=0)
+
+    _tokenizer: Callable = PrivateAttr()
+    _count_tokens: Callable = PrivateAttr()
+
+    def __init__(
+            self,
+            chunk_size: int = 1024,
+            chunk_overlap: int = 20,
+            tokenizer: Optional[Callable] = None,
+            callback_manager: Optional[CallbackManager] = None,
+            include_metadata: bool = True,
+            include_prev_next_rel: bool = True,
+    ):
+        """
+        初始化切分器
+
+        Args:
+            chunk_size: 每个切块的 token 数上限
+            chunk_overlap: 相邻切块重叠的 token 数上限
+            tokenizer: 分词函数，默认使用进程内缓存的分词器
+            callback_manager: LlamaIndex 回调管理器
+            include_metadata: 切块是否继承文档元数据
+            include_prev_next_rel: 是否建立前后切块关系
+        """
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"切块重叠 ({chunk_overlap}) 不能大于切块大小 ({chunk_size})")
+        super().__init__(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            callback_manager=callback_manager or CallbackManager([]),
+            include_metadata=include_metadata,
+            include_prev_next_rel=include_prev_next_rel,
+        )
+        self._tokenizer = tokenizer or get_cached_tokenizer()
+        self._count_tokens = (get_token_counter() if tokenizer is None
+                              else lambda texts: [len(tokenizer(text)) for text in texts])
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CJKSentenceSplitter"
+
+    def split_text_metadata_aware(self, text: str, metadata_str: str) -> List[str]:
+        metadata_len = len(self._tokenizer(metadata_str))
+        effective_chunk_size = self.chunk_size - metadata_len
+        if effective_chunk_size <= 0:
+            raise ValueError(f"元数据长度 ({metadata_len}) 超过切块大小 ({self.chunk_size})，请增大切块大小或精简元数据")
+        return self._split_text(text, effective_chunk_size)
+
+    def split_text(self, text: str) -> List[str]:
+        return self._split_text(text, self.chunk_size)
+
+    def _split_text(self, text: str, chunk_size: int) -> List[str]:
+        """将文本切分为不超过 chunk_size 个 token 的切块，相邻切块按整句重叠"""
+        if not text.strip():
+            return []
+        units = self._split_units(text, chunk_size)
+        texts = [unit for unit, _ in units]
+        # prefix[i] 为前 i 个片段的 token 总数
+        prefix = [0]
+        for _, token_count in units:
+            prefix.append(prefix[-1] + token_count)
+
+        chunks = []
+        start, unit_count = 0, len(units)
+        while start < unit_count:
+            # 在前缀和上二分查找本块能容纳的最后一个片段，单个片段超长时独占一块
+            end = max(bisect_right(prefix, prefix[start] + chunk_size) - 1, start + 1)
+            chunk = "".join(texts[start:end]).strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= unit_count:
+                break
+            # 从块尾向前回退整句作为下一块的开头：重叠不超过 chunk_overlap，
+            # 且重叠部分加上下一个片段仍能放进一块，保证下一块包含新内容
+            next_start = end
+            while (next_start - 1 > start
+                   and prefix[end] - prefix[next_start - 1] <= self.chunk_overlap
+                   and prefix[end + 1] - prefix[next_start - 1] <= chunk_size):
+                next_start -= 1
+            start = next_start
+        return chunks
+
+    def _split_units(self, text: str, chunk_size: int) -> List[Tuple[str, int]]:
+        """将文本切分为带 token 数的片段：优先整句，超长句子再按子句或字符切分"""
+        count_tokens = self._count_tokens
+        sentences = _split_by_pattern(text, SENTENCE_END_PATTERN)
+        units = []
+        for sentence, token_count in zip(sentences, count_tokens(sentences)):
+            if token_count <= chunk_size:
+                units.append((sentence, token_count))
+                continue
+            clauses = _split_by_pattern(sentence, CLAUSE_END_PATTERN)
+            for clause, clause_tokens in zip(clauses, count_tokens(clauses)):
+                if clause_tokens <= chunk_size:
+                    units.append((clause, clause_tokens))
+                else:
+                    units.extend(self._split_by_chars(clause, clause_tokens, chunk_size))
+        return units
+
+    def _split_by_chars(self, text: str, token_count: int, chunk_size: int) -> List[Tuple[str, int]]:
+        """没有可用分隔符的超长片段按字符等分，份数由 token 数估算"""
+        step = max(math.ceil(len(text) / math.ceil(token_count / chunk_size)), 1)
+        pieces = [text[start:start + step] for start in range(0, len(text), step)]
+        return list(zip(pieces, self._count_tokens(pieces)))
+
+
+@lru_cache(maxsize=32)
+def get_text_splitter(splitter_type: str, chunk_size: int, chunk_overlap: int) -> MetadataAwareTextSplitter:
+    """
+    按类型和切片参数获取切分器，相同参数的切分器在进程内复用
+
+    Args:
+        splitter_type: 切分器类型，sentence（LlamaIndex SentenceSplitter）或 cjk（CJKSentenceSplitter）
+        chunk_size: 切块 token 数上限
+        chunk_overlap: 切块重叠 token 数
+
+    Returns:
+        切分器实例
+
+    Raises:
+        ValueError: 未知的切分器类型
+    """
+    if splitter_type == "sentence":
+        return SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if splitter_type == "cjk":
+        return CJKSentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    raise ValueError(f"未知的切分器类型: {splitter_type}")
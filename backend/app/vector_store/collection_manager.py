@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Set
+
+from loguru import logger
+
+from app.core.config import settings
+
+# 内存估算结果的有效期（秒），过期后下次访问时重新统计行数
+ESTIMATE_TTL = 60
+
+
+class MilvusCollectionManager:
+    """
+    Milvus 集合加载管理器
+
+    集合在首次访问时才被加载（langchain_milvus 构造时加载），管理器按最近访问顺序记录已加载的集合，
+    当已加载集合数量或估算内存超过预算时，释放最久未访问的集合；被释放的集合下次访问时重新加载。
+    共享集合服务于所有知识库，不会被释放。
+
+    未设置预算时不做任何记录。统计行数、查询加载状态和释放集合等远程调用都在锁外完成，
+    锁内只更新本地记录，避免所有 Milvus 请求排队等待网络往返。
+    """
+
+    def __init__(self, max_loaded_collections: int, max_loaded_memory_mb: float, pinned: Set[str] = None):
+        """
+        初始化加载管理器
+
+        Args:
+            max_loaded_collections: 最多同时加载的集合数量，0 表示不限制
+            max_loaded_memory_mb: 已加载集合的估算内存上限（MB），0 表示不限制
+            pinned: 不参与释放的集合名称
+        """
+        self.max_loaded_collections = max_loaded_collections
+        self.max_loaded_memory_mb = max_loaded_memory_mb
+        self.pinned = set(pinned or ())
+        # 集合名称 -> {"last_access", "access_count", "memory_mb", "estimated_at"}，按访问时间从旧到新排列
+        self._loaded: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._synced = False
+        self.hit_count = 0
+        self.cold_load_count = 0
+        self.cold_load_seconds = 0.0
+        self.release_count = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_loaded_collections or self.max_loaded_memory_mb)
+
+    def record_access(self, client, collection_name: str, elapsed: float) -> None:
+        """
+        记录一次集合访问，必要时释放最久未访问的集合
+
+        Args:
+            client: MilvusClient 实例
+            collection_name: 被访问的集合名称
+            elapsed: 本次创建向量存储（含加载集合）的耗时（秒）
+        """
+        if not self.enabled:
+            return
+
+        server_loaded = None if self._synced else self._list_loaded(client)
+        now = time.time()
+        with self._lock:
+            entry = self._loaded.get(collection_name)
+            needs_estimate = entry is None or now - entry["estimated_at"] > ESTIMATE_TTL
+        memory_mb = self._estimate_memory_mb(client, collection_name) if needs_estimate else None
+
+        with self._lock:
+            if server_loaded is not None and not self._synced:
+                self._synced = True
+                # 服务端已加载的集合视为最久未访问，排在已有记录之前
+                server_loaded.update(self._loaded)
+                self._loaded = server_loaded
+
+            entry = self._loaded.pop(collection_name, None)
+            if entry is None:
+                self.cold_load_count += 1
+                self.cold_load_seconds += elapsed
+                entry = {"access_count": 0, "memory_mb": 0.0, "estimated_at": 0.0}
+                logger.info(f"集合 {collection_name} 冷加载，耗时: {elapsed * 1000:.1f}ms")
+            else:
+                self.hit_count += 1
+            entry["last_access"] = now
+            entry["access_count"] += 1
+            if memory_mb is not None:
+                entry["memory_mb"] = memory_mb
+                entry["estimated_at"] = now
+            self._loaded[collection_name] = entry
+            evicted = self._select_evictions(keep=collection_name)
+
+        self._release(client, evicted)
+
+    def forget(self, collection_name: str) -> None:
+        """集合被删除后移除其记录"""
+        with self._lock:
+            self._loaded.pop(collection_name, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取加载统计
+
+        Returns:
+            预算、命中/冷加载/释放次数，以及按最近访问排序的已加载集合
+        """
+        with self._lock:
+            loaded = [{
+                "collection_name": name,
+                "last_access": round(entry["last_access"], 3),
+                "access_count": entry["access_count"],
+                "memory_mb": round(entry["memory_mb"], 2),
+                "pinned": name in self.pinned,
+            } for name, entry in reversed(self._loaded.items())]
+            return {
+                "max_loaded_collections": self.max_loaded_collections,
+                "max_loaded_memory_mb": self.max_loaded_memory_mb,
+                "loaded_count": len(loaded),
+                "loaded_memory_mb": round(sum(item["memory_mb"] for item in loaded), 2),
+                "hit_count": self.hit_count,
+                "cold_load_count": self.cold_load_count,
+                "avg_cold_load_ms": round(self.cold_load_seconds / self.cold_load_count * 1000, 1)
+                if self.cold_load_count else 0.0,
+                "release_count": self.release_count,
+                "loaded": loaded,
+            }
+
+    def _select_evictions(self, keep: str) -> Dict[str, Dict[str, Any]]:
+        """在锁内按最久未访问的顺序移除记录，直到满足预算，返回需要释放的集合"""
+        evicted = {}
+        for name in list(self._loaded):
+            if not self._over_budget():
+                break
+            if name == keep or name in self.pinned:
+                continue
+            evicted[name] = self._loaded.pop(name)
+        return evicted
+
+    def _release(self, client, evicted: Dict[str, Dict[str, Any]]) -> None:
+        """在锁外释放集合"""
+        for name, entry in evicted.items():
+            try:
+                client.release_collection(collection_name=name)
+                with self._lock:
+                    self.release_count += 1
+                logger.info(f"释放集合 {name}，累计访问: {entry['access_count']} 次")
+            except Exception as error:
+                logger.warning(f"释放集合 {name} 失败: {str(error)}")
+
+    def _over_budget(self) -> bool:
+        if self.max_loaded_collections and len(self._loaded) > self.max_loaded_collections:
+            return True
+        if self.max_loaded_memory_mb:
+            return sum(entry["memory_mb"] for entry in self._loaded.values()) > self.max_loaded_memory_mb
+        return False
+
+    def _list_loaded(self, client) -> "OrderedDict[str, Dict[str, Any]]":
+        """首次访问时获取服务端已加载的集合（如服务重启前加载的），由调用方在锁内登记"""
+        loaded: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        try:
+            for name in client.list_collections():
+                state = client.get_load_state(collection_name=name).get("state")
+                if str(state).endswith("Loaded"):
+                    loaded[name] = {
+                        "last_access": 0.0,
+                        "access_count": 0,
+                        "memory_mb": self._estimate_memory_mb(client, name),
+                        "estimated_at": time.time(),
+                    }
+        except Exception as error:
+            logger.warning(f"获取已加载集合失败: {str(error)}")
+        return loaded
+
+    @staticmethod
+    def _estimate_memory_mb(client, collection_name: str) -> float:
+        """按 行数 x 向量维度 x 4字节 估算集合加载后占用的内存"""
+        try:
+            row_count = int(client.get_collection_stats(collection_name=collection_name).get("row_count", 0))
+            dim = 0
+            for field in client.describe_collection(collection_name=collection_name).get("fields", []):
+                dim = max(dim, int(field.get("params", {}).get("dim", 0)))
+            return row_count * dim * 4 / 1024 / 1024
+        except Exception as error:
+            logger.warning(f"估算集合 {collection_name} 内存失败: {str(error)}")
+            return 0.0
+
+
+milvus_collection_manager = MilvusCollectionManager(
+    max_loaded_collections=settings.milvus_max_loaded_collections,
+    max_loaded_memory_mb=settings.milvus_max_loaded_memory_mb,
+    pinned={settings.milvus_shared_collection},
+)
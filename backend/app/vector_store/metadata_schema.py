@@ -0,0 +1,100 @@
+import json
+from pathlib import Path
+from typing import Dict, Any, Optional, List
+
+from pymilvus import DataType
+
+# 标签数组的容量和单个标签的最大长度，超出部分写入时截断
+TAGS_MAX_CAPACITY = 64
+TAG_MAX_LENGTH = 128
+FILE_TYPE_MAX_LENGTH = 16
+
+# 文本集合的类型化元数据字段：Milvus 中建为对应类型的标量字段并创建倒排索引，Chroma 中以同样的类型存储，
+# 检索时的过滤条件可以在 ANN 查询中直接下推，而不是检索后再过滤
+TEXT_METADATA_FIELDS: Dict[str, Dict[str, Any]] = {
+    "document_id": {"dtype": DataType.INT64},
+    "doc_id": {"dtype": DataType.VARCHAR, "kwargs": {"max_length": 64}},
+    "kb_uuid": {"dtype": DataType.VARCHAR, "kwargs": {"max_length": 64}},
+    "page": {"dtype": DataType.INT64},
+    "file_type": {"dtype": DataType.VARCHAR, "kwargs": {"max_length": FILE_TYPE_MAX_LENGTH}},
+    "tags": {"dtype": DataType.ARRAY, "kwargs": {"element_type": DataType.VARCHAR,
+                                                 "max_capacity": TAGS_MAX_CAPACITY, "max_length": TAG_MAX_LENGTH}},
+}
+
+# 数组字段的过滤条件表示“包含任一取值”，其他字段表示等值或取值在列表中
+ARRAY_FIELDS = {name for name, field in TEXT_METADATA_FIELDS.items() if field["dtype"] == DataType.ARRAY}
+
+# 类型化字段使用的 Milvus 标量索引类型，倒排索引支持整数、字符串和数组字段
+MILVUS_SCALAR_INDEX_TYPE = "INVERTED"
+
+
+def milvus_metadata_schema() -> Dict[str, Dict[str, Any]]:
+    """
+    返回 langchain_milvus 的 metadata_schema 参数
+
+    Returns:
+        字段名 -> {"dtype", "kwargs"}，每次返回新的字典，调用方可以追加字段
+    """
+    return {name: {"dtype": field["dtype"], "kwargs": dict(field.get("kwargs", {}))}
+            for name, field in TEXT_METADATA_FIELDS.items()}
+
+
+def parse_tags(value: Any) -> List[str]:
+    """
+    将标签统一为字符串列表，兼容旧数据中 JSON 编码的标签字符串
+
+    Args:
+        value: 标签列表、JSON 字符串或空值
+
+    Returns:
+        去重后保持顺序的标签列表，按容量和长度截断
+    """
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value else []
+        except json.JSONDecodeError:
+            value = [value]
+    tags = [str(tag)[:TAG_MAX_LENGTH] for tag in (value or []) if tag is not None and str(tag)]
+    return list(dict.fromkeys(tags))[:TAGS_MAX_CAPACITY]
+
+
+def parse_page(page_label: Any) -> int:
+    """将页码标签转换为整数页码，无页码或非数字页码（如罗马数字）返回 0"""
+    if isinstance(page_label, int):
+        return page_label
+    page_label = str(page_label or "").strip()
+    return int(page_label) if page_label.isdigit() else 0
+
+
+def parse_file_type(source_file: Optional[str]) -> str:
+    """从文件名中取小写扩展名作为文件类型"""
+    return Path(source_file or "").suffix.lstrip(".").lower()[:FILE_TYPE_MAX_LENGTH]
+
+
+def normalize_metadata(metadata: Dict[str, Any], drop_empty_arrays: bool = False) -> Dict[str, Any]:
+    """
+    将元数据中的类型化字段规范为声明的类型，缺失的派生字段根据原始字段补齐
+
+    用于写入向量数据库前统一新旧两种格式：旧数据的 tags 为 JSON 字符串、没有 page 和 file_type 字段。
+
+    Args:
+        metadata: 原始元数据
+        drop_empty_arrays: 是否移除空的数组字段（Chroma 不接受空列表）
+
+    Returns:
+        规范化后的新元数据字典
+    """
+    metadata = dict(metadata or {})
+    if "tags" in metadata:
+        metadata["tags"] = parse_tags(metadata["tags"])
+    if "page" in metadata or "page_label" in metadata:
+        metadata["page"] = parse_page(metadata.get("page", metadata.get("page_label")))
+    if "file_type" not in metadata and "source_file" in metadata:
+        metadata["file_type"] = parse_file_type(metadata["source_file"])
+    if metadata.get("document_id") is not None:
+        metadata["document_id"] = int(metadata["document_id"])
+    if drop_empty_arrays:
+        for name in ARRAY_FIELDS:
+            if metadata.get(name) == []:
+                metadata.pop(name)
+    return metadata
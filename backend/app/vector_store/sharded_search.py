@@ -0,0 +1,319 @@
+import heapq
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+
+MANIFEST_NAME = "manifest.json"
+# 单个分片一次参与矩阵乘法的行数，限制查询时的临时内存
+SCAN_BLOCK_ROWS = 65536
+# 工作进程中保留映射的分片段数量
+WORKER_SEGMENT_CACHE_SIZE = 256
+
+# 工作进程内：分片段目录 -> (向量, 向量模长平方, 文档ID)，均为只读内存映射
+_worker_segments: "OrderedDict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]" = OrderedDict()
+
+
+def get_shard_root(shard_key: str) -> Optional[Path]:
+    """集合分片的根目录，与向量数据放在一起；未配置向量文件路径时返回None"""
+    if not settings.vector_file_path:
+        return None
+    return Path(settings.vector_file_path) / "shards" / shard_key
+
+
+def drop_shards(shard_key: str) -> bool:
+    """
+    删除集合的分片，集合写入或删除后调用，之后的检索回退到向量数据库直到重新构建分片
+
+    先删除清单再删除数据，正在查询的工作进程持有的映射不受影响。
+
+    Returns:
+        是否存在并删除了分片
+    """
+    root = get_shard_root(shard_key)
+    if root is None or not root.exists():
+        return False
+    (root / MANIFEST_NAME).unlink(missing_ok=True)
+    shutil.rmtree(root, ignore_errors=True)
+    logger.info(f"集合 {shard_key} 的分片已失效并删除")
+    return True
+
+
+def build_shards(shard_key: str, record_batches: Iterable[List[Dict[str, Any]]], shard_count: int) -> Dict[str, Any]:
+    """
+    将集合的全部向量按记录顺序轮流写入 shard_count 个分片段
+
+    每个分片段包含 float32 向量矩阵、向量模长平方、文档ID（原始二进制，按内存映射读取）和记录ID列表。
+    数据写入新的构建目录，最后替换清单，检索方只会看到完整的一次构建。
+
+    Args:
+        shard_key: 分片键（集合名称，共享集合中带知识库ID）
+        record_batches: 记录批次，格式同 TextVectorStore.iter_records
+        shard_count: 分片数量
+
+    Returns:
+        清单内容
+    """
+    root = get_shard_root(shard_key)
+    if root is None:
+        raise ValueError("未配置 VECTOR_FILE_PATH，无法构建分片")
+    started = time.perf_counter()
+    build_id = uuid.uuid4().hex
+    build_dir = root / build_id
+    build_dir.mkdir(parents=True)
+
+    vector_files = [open(build_dir / f"vectors_{index}.f32", "wb") for index in range(shard_count)]
+    ids: List[List[str]] = [[] for _ in range(shard_count)]
+    norms: List[List[float]] = [[] for _ in range(shard_count)]
+    document_ids: List[List[int]] = [[] for _ in range(shard_count)]
+    dimension, position = None, 0
+    try:
+        for records in record_batches:
+            for record in records:
+                vector = np.asarray(record["embedding"], dtype=np.float32)
+                if dimension is None:
+                    dimension = len(vector)
+                shard = position % shard_count
+                vector_files[shard].write(vector.tobytes())
+                ids[shard].append(str(record["id"]))
+                norms[shard].append(float(vector @ vector))
+                document_id = record["metadata"].get("document_id")
+                document_ids[shard].append(int(document_id) if document_id is not None else -1)
+                position += 1
+    except Exception:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    finally:
+        for vector_file in vector_files:
+            vector_file.close()
+
+    segments = []
+    for index in range(shard_count):
+        np.asarray(norms[index], dtype=np.float32).tofile(build_dir / f"norms_{index}.f32")
+        np.asarray(document_ids[index], dtype=np.int64).tofile(build_dir / f"document_ids_{index}.i64")
+        with open(build_dir / f"ids_{index}.json", "w", encoding="utf-8") as ids_file:
+            json.dump(ids[index], ids_file)
+        segments.append({"index": index, "rows": len(ids[index])})
+
+    manifest = {
+        "build_id": build_id,
+        "dimension": dimension or 0,
+        "count": position,
+        "segments": segments,
+        "built_at": time.time(),
+    }
+    temp_path = root / f"{MANIFEST_NAME}.tmp"
+    temp_path.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(temp_path, root / MANIFEST_NAME)
+    # 清理以前的构建，已映射这些文件的工作进程仍可读完当前查询
+    for stale_dir in root.iterdir():
+        if stale_dir.is_dir() and stale_dir.name != build_id:
+            shutil.rmtree(stale_dir, ignore_errors=True)
+    logger.info(f"集合 {shard_key} 分片构建完成，{position} 条记录，{shard_count} 个分片，"
+                f"耗时: {time.perf_counter() - started:.2f}s")
+    return manifest
+
+
+def _open_segment(segment_dir: str, index: int, rows: int,
+                  dimension: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """在工作进程中以只读方式映射分片段，多个进程映射同一文件时共享页缓存，不各自复制一份"""
+    key = f"{segment_dir}/{index}"
+    segment = _worker_segments.get(key)
+    if segment is None:
+        directory = Path(segment_dir)
+        segment = (
+            np.memmap(directory / f"vectors_{index}.f32", dtype=np.float32, mode="r", shape=(rows, dimension)),
+            np.memmap(directory / f"norms_{index}.f32", dtype=np.float32, mode="r", shape=(rows,)),
+            np.memmap(directory / f"document_ids_{index}.i64", dtype=np.int64, mode="r", shape=(rows,)),
+        )
+        _worker_segments[key] = segment
+        if len(_worker_segments) > WORKER_SEGMENT_CACHE_SIZE:
+            _worker_segments.popitem(last=False)
+    else:
+        _worker_segments.move_to_end(key)
+    return segment
+
+
+def search_segment(segment_dir: str, index: int, rows: int, dimension: int, queries: np.ndarray, k: int,
+                   document_ids: Optional[List[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    在一个分片段内精确检索，返回每个查询的前 k 个结果（在工作进程中执行）
+
+    距离为 L2 距离的平方（|q|² + |x|² - 2q·x），与 Milvus FLAT/L2 和 Chroma l2 的分数一致。
+
+    Args:
+        segment_dir: 构建目录
+        index: 分片段序号
+        rows: 分片段记录数
+        dimension: 向量维度
+        queries: 查询向量，形状为 (查询数, 维度)
+        k: 每个查询返回的结果数
+        document_ids: 只在这些文档的记录中检索，为None时不过滤
+
+    Returns:
+        (距离, 行号)，形状均为 (查询数, 不超过k)，每行按距离从小到大排列
+    """
+    vectors, norms, row_document_ids = _open_segment(segment_dir, index, rows, dimension)
+    queries = np.asarray(queries, dtype=np.float32)
+    query_norms = (queries * queries).sum(axis=1)
+    best_distances = np.empty((len(queries), 0), dtype=np.float32)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, rows, SCAN_BLOCK_ROWS):
+        stop = min(start + SCAN_BLOCK_ROWS, rows)
+        distances = query_norms[:, None] + norms[start:stop][None, :] - 2 * (queries @ vectors[start:stop].T)
+        if document_ids is not None:
+            distances[:, ~np.isin(row_document_ids[start:stop], document_ids)] = np.inf
+        block_rows = np.broadcast_to(np.arange(start, stop), distances.shape)
+        distances = np.concatenate([best_distances, distances], axis=1)
+        candidate_rows = np.concatenate([best_rows, block_rows], axis=1)
+        if distances.shape[1] > k:
+            top = np.argpartition(distances, kth=k - 1, axis=1)[:, :k]
+            distances = np.take_along_axis(distances, top, axis=1)
+            candidate_rows = np.take_along_axis(candidate_rows, top, axis=1)
+        best_distances, best_rows = distances, candidate_rows
+    order = np.argsort(best_distances, axis=1)
+    return np.take_along_axis(best_distances, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+
+class ShardedSearchPool:
+    """
+    本地集合的多进程分片检索
+
+    集合的向量按分片段存放在磁盘上，工作进程以只读内存映射读取，操作系统页缓存在进程间共享，
+    内存占用不随工作进程数增加。查询时每个分片段提交给进程池并行扫描，各自返回前 k 个结果，
+    主进程用堆归并出全局前 k 个。分片是构建时的快照，集合写入后由 TextVectorStore 删除，
+    此后回退到向量数据库检索，直到重新构建。
+    """
+
+    def __init__(self, workers: int):
+        """
+        初始化分片检索进程池
+
+        Args:
+            workers: 工作进程数量
+        """
+        self.workers = max(workers, 1)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 分片键 -> (清单修改时间, 清单, 每个分片段的记录ID列表)
+        self._manifests: Dict[str, Tuple[float, Dict[str, Any], List[List[str]]]] = {}
+        self.query_count = 0
+        self.query_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 服务进程中有多个线程，使用 spawn 启动工作进程，避免 fork 继承锁状态
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+                logger.info(f"分片检索进程池已启动，工作进程数: {self.workers}")
+            return self._executor
+
+    def _load_manifest(self, shard_key: str) -> Optional[Tuple[Dict[str, Any], List[List[str]]]]:
+        """读取分片清单和记录ID，按清单修改时间缓存；没有分片时返回None"""
+        root = get_shard_root(shard_key)
+        if root is None:
+            return None
+        manifest_path = root / MANIFEST_NAME
+        try:
+            modified_time = manifest_path.stat().st_mtime
+        except FileNotFoundError:
+            self._manifests.pop(shard_key, None)
+            return None
+        cached = self._manifests.get(shard_key)
+        if cached is None or cached[0] != modified_time:
+            try:
+                manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+                build_dir = root / manifest["build_id"]
+                ids = []
+                for segment in manifest["segments"]:
+                    with open(build_dir / f"ids_{segment['index']}.json", encoding="utf-8") as ids_file:
+                        ids.append(json.load(ids_file))
+            except FileNotFoundError:
+                # 读取过程中分片被删除或重新构建
+                return None
+            cached = (modified_time, manifest, ids)
+            self._manifests[shard_key] = cached
+        return cached[1], cached[2]
+
+    def has_shards(self, shard_key: str) -> bool:
+        """集合是否有可用的分片"""
+        return self._load_manifest(shard_key) is not None
+
+    def search(self, shard_key: str, queries: np.ndarray, k: int,
+               document_ids: Optional[List[int]] = None) -> Optional[List[List[Tuple[str, float]]]]:
+        """
+        在集合的全部分片段中并行检索，归并每个查询的前 k 个结果
+
+        Args:
+            shard_key: 分片键
+            queries: 查询向量，形状为 (查询数, 维度)
+            k: 每个查询返回的结果数
+            document_ids: 只在这些文档的记录中检索，为None时不过滤
+
+        Returns:
+            每个查询的 (记录ID, 距离) 列表，按距离从小到大排列；没有分片时返回None
+        """
+        loaded = self._load_manifest(shard_key)
+        if loaded is None:
+            return None
+        manifest, ids = loaded
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if queries.shape[1] != manifest["dimension"]:
+            raise ValueError(f"查询向量维度 {queries.shape[1]} 与分片维度 {manifest['dimension']} 不一致")
+
+        started = time.perf_counter()
+        segment_dir = str(get_shard_root(shard_key) / manifest["build_id"])
+        executor = self._get_executor()
+        futures = [
+            executor.submit(search_segment, segment_dir, segment["index"], segment["rows"], manifest["dimension"],
+                            queries, k, document_ids)
+            for segment in manifest["segments"] if segment["rows"]
+        ]
+        segment_results = [(segment_index, *future.result()) for segment_index, future in enumerate(futures)]
+
+        results = []
+        for query_index in range(len(queries)):
+            # 各分片段的结果已按距离排序，用堆归并取全局前 k 个
+            merged = heapq.merge(*[
+                [(float(distance), segment_index, int(row))
+                 for distance, row in zip(distances[query_index], rows[query_index]) if np.isfinite(distance)]
+                for segment_index, distances, rows in segment_results
+            ])
+            results.append([(ids[segment_index][row], distance)
+                            for distance, segment_index, row in islice(merged, k)])
+        self.query_count += len(queries)
+        self.query_seconds += time.perf_counter() - started
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """进程池和查询统计"""
+        return {
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "cached_manifests": len(self._manifests),
+            "query_count": self.query_count,
+            "avg_query_ms": round(self.query_seconds * 1000 / self.query_count, 3) if self.query_count else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        """停止工作进程"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+sharded_search_pool = ShardedSearchPool(workers=settings.sharded_search_workers or os.cpu_count() or 1)
@@ -1,13 +1,31 @@
-from typing import List
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable, Callable, Set
 from uuid import uuid4
 
+import numpy as np
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_milvus import Milvus
 from loguru import logger
+from pymilvus import DataType
 
 from app.core.config import settings
-from app.llm.model_client import get_embeddings
+from app.llm.model_client import get_embeddings, embed_queries
+from app.llm.projected_embeddings import get_knowledge_base_embeddings
+from app.utils.chunk_record import ChunkRecord
+from app.vector_store.collection_manager import milvus_collection_manager
+from app.vector_store.metadata_schema import (
+    ARRAY_FIELDS, MILVUS_SCALAR_INDEX_TYPE, TEXT_METADATA_FIELDS, milvus_metadata_schema, normalize_metadata
+)
+from app.vector_store.milvus_bulk_import import MilvusBulkImporter
+from app.vector_store.sharded_search import build_shards, drop_shards, sharded_search_pool
+
+
+# 本进程中已检查过标量索引的 Milvus 集合
+_indexed_collections: Set[str] = set()
 
 
 class TextVectorStore:
@@ -15,20 +33,66 @@ class TextVectorStore:
     文本向量存储类，支持多种向量数据库
     """
 
-    def __init__(self, store_type: str, collection_name: str):
+    def __init__(self, store_type: str, collection_name: str, embeddings: Embeddings = None,
+                 knowledge_id: Optional[int] = None):
         """
         初始化文本向量存储
 
         Args:
             store_type: 向量数据库类型 ("milvus" 或其他)
             collection_name: 集合名称
+            embeddings: 嵌入模型，默认使用 get_embeddings()
+            knowledge_id: 共享集合中的知识库ID，设置后写入、检索和删除都限定在该知识库范围内
         """
         logger.info(f"初始化TextVectorStore，类型: {store_type}, 集合: {collection_name}")
-        self.embeddings = get_embeddings()
+        self.embeddings = embeddings or get_embeddings()
         self.store_type = store_type
         self.collection_name = collection_name
+        self.knowledge_id = knowledge_id
+        self.delete_batch_size = settings.vector_delete_batch_size
+        self.insert_batch_size = settings.vector_insert_batch_size
+        self.insert_concurrency = max(settings.vector_insert_concurrency, 1)
         logger.debug("TextVectorStore初始化完成")
 
+    @classmethod
+    def for_knowledge_base(cls, knowledge_id: int, store_type: str, embeddings: Embeddings = None) -> "TextVectorStore":
+        """
+        按配置的集合布局创建知识库对应的向量存储
+
+        MILVUS_LAYOUT=shared 时，所有 Milvus 知识库共用一个以 kb_id 为分区键的集合；
+        否则每个知识库使用独立的 kb_{knowledge_id} 集合。
+
+        Args:
+            knowledge_id: 知识库ID
+            store_type: 向量数据库类型
+            embeddings: 嵌入模型，默认使用知识库的嵌入模型（启用降维时包含投影）
+
+        Returns:
+            TextVectorStore 实例
+        """
+        embeddings = embeddings or get_knowledge_base_embeddings(knowledge_id)
+        if store_type.lower() == "milvus" and settings.milvus_layout == "shared":
+            return cls(store_type=store_type, collection_name=settings.milvus_shared_collection,
+                       embeddings=embeddings, knowledge_id=knowledge_id)
+        return cls(store_type=store_type, collection_name=f"kb_{knowledge_id}", embeddings=embeddings)
+
+    @property
+    def is_shared(self) -> bool:
+        """是否为共享集合中按知识库划分的存储"""
+        return self.knowledge_id is not None
+
+    @property
+    def is_local(self) -> bool:
+        """向量数据是否存放在本机（Chroma 或 Milvus Lite 数据文件），只有本地集合支持分片检索"""
+        if self.store_type.lower() != "milvus":
+            return True
+        return not (settings.milvus_client or "").startswith(("http://", "https://", "tcp://", "grpc://"))
+
+    @property
+    def shard_key(self) -> str:
+        """分片键：集合名称，共享集合中按知识库区分"""
+        return f"{self.collection_name}__kb_{self.knowledge_id}" if self.is_shared else self.collection_name
+
     def get_vector_store(self):
         """
         获取指定类型的向量数据库实例
@@ -73,36 +137,263 @@ class TextVectorStore:
         """
         logger.debug(f"创建Milvus存储，集合名: {self.collection_name}, 连接: {settings.milvus_client}")
         logger.debug("Milvus配置: index_type=FLAT, metric_type=L2, consistency_level=Strong")
+        # 类型化元数据字段（tags 数组、document_id/doc_id/kb_uuid/page/file_type 标量）建为声明的类型
+        metadata_schema = milvus_metadata_schema()
+        shared_kwargs = {}
+        if self.is_shared:
+            # 共享集合以 kb_id 为分区键
+            metadata_schema["kb_id"] = {"dtype": DataType.INT64, "kwargs": {"is_partition_key": True}}
+            shared_kwargs = {"num_partitions": settings.milvus_num_partitions}
+        started = time.perf_counter()
         vectorstore = Milvus(
             embedding_function=self.embeddings,
             collection_name=self.collection_name,
             connection_args={"uri": settings.milvus_client},
             index_params={"index_type": "FLAT", "metric_type": "L2"},
             consistency_level="Strong",
+            metadata_schema=metadata_schema,
+            **shared_kwargs,
         )
+        if vectorstore.col is not None:
+            milvus_collection_manager.record_access(vectorstore.client, self.collection_name,
+                                                    time.perf_counter() - started)
+            self._ensure_scalar_indexes(vectorstore)
         logger.info("Milvus向量数据库实例创建完成")
         return vectorstore
 
-    def add_documents(self, documents: List[Document]) -> List[str]:
+    def _milvus_field_types(self, vector_store) -> Dict[str, DataType]:
+        """读取 Milvus 集合的字段类型，集合不存在时返回空字典"""
+        if not vector_store.client.has_collection(self.collection_name):
+            return {}
+        description = vector_store.client.describe_collection(self.collection_name)
+        return {field["name"]: field["type"] for field in description["fields"]}
+
+    def _ensure_scalar_indexes(self, vector_store) -> None:
+        """
+        为集合中已有的类型化元数据字段创建标量索引，每个进程每个集合只检查一次
+
+        旧集合的 tags 是字符串字段，同样建倒排索引；索引类型不被当前 Milvus 版本支持时（如 milvus-lite 的数组字段）
+        只记录警告，过滤仍然可用。
+        """
+        if self.collection_name in _indexed_collections:
+            return
+        _indexed_collections.add(self.collection_name)
+        field_types = self._milvus_field_types(vector_store)
+        for field_name in TEXT_METADATA_FIELDS:
+            if field_name not in field_types or vector_store.client.list_indexes(self.collection_name,
+                                                                                 field_name=field_name):
+                continue
+            index_params = vector_store.client.prepare_index_params()
+            index_params.add_index(field_name=field_name, index_type=MILVUS_SCALAR_INDEX_TYPE, index_name=field_name)
+            try:
+                vector_store.client.create_index(self.collection_name, index_params)
+                logger.info(f"已为集合 {self.collection_name} 的字段 {field_name} 创建标量索引")
+            except Exception as error:
+                logger.warning(f"为集合 {self.collection_name} 的字段 {field_name} 创建标量索引失败: {str(error)}")
+
+    def _prepare_metadatas(self, vector_store, metadatas: List[Dict[str, Any]],
+                           normalized: bool = False) -> List[Dict[str, Any]]:
+        """
+        写入前规范化元数据：统一类型化字段的类型，共享集合补充 kb_id，并适配目标集合的实际字段类型
+
+        Milvus 旧集合的 tags 为字符串字段，写入时仍编码为 JSON 字符串；Chroma 不接受空列表，空数组字段不写入。
+        normalized 为 True 时元数据已是声明的类型（ChunkRecord.to_metadata 的结果），跳过规范化并直接修改传入的字典。
+        """
+        is_milvus = self.store_type.lower() == "milvus"
+        if not normalized:
+            metadatas = [normalize_metadata(metadata, drop_empty_arrays=not is_milvus) for metadata in metadatas]
+        if self.is_shared:
+            for metadata in metadatas:
+                metadata["kb_id"] = self.knowledge_id
+        if is_milvus:
+            legacy_fields = [name for name, dtype in self._milvus_field_types(vector_store).items()
+                             if name in ARRAY_FIELDS and dtype == DataType.VARCHAR]
+            for metadata in metadatas:
+                for name in legacy_fields:
+                    if name in metadata:
+                        metadata[name] = json.dumps(metadata[name], ensure_ascii=False)
+        return metadatas
+
+    def add_documents(self, documents: List[Document], ids: List[str] = None) -> List[str]:
         """
         向向量数据库添加文档
 
+        文档按 insert_batch_size 分批，首批单独写入（确保集合已创建），其余批次并发写入，失败的批次按指数退避重试。
+        Milvus 下文档数达到批量导入阈值时，先并发计算向量，再以列式文件批量导入。
+
         Args:
             documents: 要添加的文档列表
+            ids: 文档ID列表，默认随机生成
 
         Returns:
             插入的文档ID列表
         """
         logger.info(f"向向量数据库添加文档，数量: {len(documents)}")
-        document_ids = [str(uuid4()) for _ in documents]
+        document_ids = ids or [str(uuid4()) for _ in documents]
         logger.debug(f"生成文档IDs: {document_ids}")
 
         vector_store = self.get_vector_store()
-        logger.debug("调用向量数据库添加文档方法")
-        inserted_ids = vector_store.add_documents(documents, ids=document_ids)
+        metadatas = self._prepare_metadatas(vector_store, [document.metadata for document in documents])
+        return self._add_texts(vector_store, [document.page_content for document in documents], metadatas,
+                               document_ids)
+
+    def add_chunks(self, chunks: List[ChunkRecord]) -> List[str]:
+        """
+        向向量数据库添加入库流水线的知识块，以知识块ID作为向量ID
+
+        元数据在这里才由知识块的共享元数据生成，不经过 LangChain Document；写入方式同 add_documents。
+
+        Args:
+            chunks: 知识块列表
+
+        Returns:
+            插入的知识块ID列表
+        """
+        logger.info(f"向向量数据库添加知识块，数量: {len(chunks)}")
+        vector_store = self.get_vector_store()
+        drop_empty_arrays = self.store_type.lower() != "milvus"
+        metadatas = self._prepare_metadatas(
+            vector_store, [chunk.to_metadata(drop_empty_arrays=drop_empty_arrays) for chunk in chunks],
+            normalized=True
+        )
+        return self._add_texts(vector_store, [chunk.text for chunk in chunks], metadatas,
+                               [chunk.chunk_id for chunk in chunks])
+
+    def _add_texts(self, vector_store, texts: List[str], metadatas: List[Dict[str, Any]],
+                   ids: List[str]) -> List[str]:
+        """写入已规范化元数据的文本，达到批量导入阈值时使用 Milvus 批量导入，否则分批并发写入"""
+        drop_shards(self.shard_key)
+        if self._use_bulk_import(len(texts)):
+            return self._bulk_import_texts(texts, metadatas, ids)
+
+        logger.debug("调用向量数据库添加文本方法")
+        inserted_ids = self._insert_in_batches(
+            vector_store, list(zip(texts, metadatas)), ids,
+            lambda batch, batch_ids: vector_store.add_texts(
+                [text for text, _ in batch], metadatas=[metadata for _, metadata in batch], ids=batch_ids)
+        )
+        if self.store_type.lower() == "milvus":
+            # 集合可能在本次写入时才创建
+            self._ensure_scalar_indexes(vector_store)
         logger.info(f"文档添加完成，实际插入数量: {len(inserted_ids)}")
         return inserted_ids
 
+    def _insert_in_batches(self, vector_store, items: List[Any], ids: List[str],
+                           insert: Callable[[List[Any], List[str]], List[str]]) -> List[str]:
+        """
+        分批写入，首批同步写入，其余批次以 insert_concurrency 并发写入
+
+        Args:
+            vector_store: 向量数据库实例
+            items: 待写入的文档或记录
+            ids: 与 items 一一对应的ID
+            insert: 写入单个批次的函数
+
+        Returns:
+            按输入顺序排列的写入ID列表
+        """
+        batches = [(items[start:start + self.insert_batch_size], ids[start:start + self.insert_batch_size])
+                   for start in range(0, len(items), self.insert_batch_size)]
+        if not batches:
+            return []
+
+        # 集合可能在首批写入时才创建，首批单独执行，避免并发建表
+        results = [self._insert_with_retry(vector_store, insert, *batches[0])]
+        if len(batches) > 1:
+            logger.info(f"并发写入向量，批次数: {len(batches)}, 并发数: {self.insert_concurrency}")
+            with ThreadPoolExecutor(max_workers=self.insert_concurrency) as executor:
+                results.extend(executor.map(
+                    lambda batch: self._insert_with_retry(vector_store, insert, *batch), batches[1:]
+                ))
+        return [inserted_id for batch_ids in results for inserted_id in batch_ids]
+
+    def _insert_with_retry(self, vector_store, insert: Callable[[List[Any], List[str]], List[str]],
+                           batch: List[Any], batch_ids: List[str]) -> List[str]:
+        """写入单个批次，失败时按指数退避重试"""
+        max_retries = max(settings.vector_insert_max_retries, 0)
+        for attempt in range(max_retries + 1):
+            try:
+                return insert(batch, batch_ids)
+            except Exception as error:
+                if attempt == max_retries:
+                    raise
+                wait = settings.vector_insert_retry_backoff * 2 ** attempt
+                logger.warning(f"写入向量批次失败（第 {attempt + 1} 次），{wait:.1f}s 后重试: {str(error)}")
+                time.sleep(wait)
+                if self.store_type.lower() == "milvus":
+                    # Milvus insert 不会覆盖相同主键，重试前清理可能已部分写入的数据
+                    try:
+                        vector_store.delete(ids=batch_ids)
+                    except Exception as delete_error:
+                        logger.warning(f"清理失败批次失败: {str(delete_error)}")
+
+    def _use_bulk_import(self, document_count: int) -> bool:
+        """是否对本次写入使用 Milvus 批量导入"""
+        return (self.store_type.lower() == "milvus"
+                and settings.milvus_bulk_import_threshold > 0
+                and document_count >= settings.milvus_bulk_import_threshold
+                and bool(settings.milvus_bulk_endpoint))
+
+    def _bulk_import_texts(self, texts: List[str], metadatas: List[Dict[str, Any]],
+                           document_ids: List[str]) -> List[str]:
+        """
+        并发计算向量后以批量导入写入 Milvus
+
+        记录按 insert_batch_size 分批交给 bulk_import_records：集合尚不存在时只有第一批以普通方式写入来创建集合，
+        其余批次仍走批量导入，新知识库的首次灌库同样受益。
+        """
+        logger.info(f"文档数量 {len(texts)} 达到批量导入阈值，使用 Milvus 批量导入")
+        batches = [texts[start:start + self.insert_batch_size]
+                   for start in range(0, len(texts), self.insert_batch_size)]
+        with ThreadPoolExecutor(max_workers=self.insert_concurrency) as executor:
+            embeddings = [vector for batch_vectors in executor.map(self.embeddings.embed_documents, batches)
+                          for vector in batch_vectors]
+
+        records = [{"id": document_id, "text": text, "embedding": embedding, "metadata": metadata}
+                   for document_id, text, embedding, metadata in zip(document_ids, texts, embeddings, metadatas)]
+        self.bulk_import_records(records[start:start + self.insert_batch_size]
+                                 for start in range(0, len(records), self.insert_batch_size))
+        return document_ids
+
+    def bulk_import_records(self, record_batches: Iterable[List[Dict[str, Any]]]) -> int:
+        """
+        以批量导入方式写入已包含向量的记录，仅支持 Milvus
+
+        集合不存在时先以普通方式写入第一批记录来创建集合，其余记录写成列式文件后由服务端导入。
+
+        Args:
+            record_batches: 记录批次迭代器，格式同 iter_records
+
+        Returns:
+            写入的记录数量
+        """
+        if self.store_type.lower() != "milvus":
+            raise ValueError("批量导入仅支持 Milvus")
+
+        drop_shards(self.shard_key)
+        vector_store = self.get_vector_store()
+        record_batches = iter(record_batches)
+        written_count = 0
+        if vector_store.col is None:
+            first_batch = next(record_batches, [])
+            written_count += len(self.add_records(first_batch))
+            vector_store = self.get_vector_store()
+
+        def scoped_records():
+            for records in record_batches:
+                metadatas = self._prepare_metadatas(vector_store, [record["metadata"] for record in records])
+                for record, metadata in zip(records, metadatas):
+                    yield {**record, "metadata": metadata}
+
+        written_count += MilvusBulkImporter(vector_store.client, self.collection_name).import_records(
+            scoped_records(),
+            primary_field=vector_store._primary_field,
+            text_field=vector_store._text_field,
+            vector_field=vector_store._vector_field,
+        )
+        logger.info(f"批量导入完成，集合: {self.collection_name}, 记录数: {written_count}")
+        return written_count
+
     def delete_documents(self, document_ids: List[str]) -> bool:
         """
         从向量数据库删除文档
@@ -116,26 +407,531 @@ class TextVectorStore:
         logger.info(f"从向量数据库删除文档，数量: {len(document_ids)}")
         logger.debug(f"待删除文档IDs: {document_ids}")
 
+        drop_shards(self.shard_key)
         vector_store = self.get_vector_store()
         logger.debug("调用向量数据库删除方法")
-        result = vector_store.delete(ids=document_ids)
+        result = True
+        for start in range(0, len(document_ids), self.delete_batch_size):
+            batch_result = vector_store.delete(ids=document_ids[start:start + self.delete_batch_size])
+            # Chroma 删除成功时返回None
+            result = result and batch_result is not False
         logger.info(f"文档删除操作完成，结果: {result}")
         return result
 
+    def delete_by_metadata(self, field: str, values: List[Any]) -> int:
+        """
+        按元数据字段批量删除向量，无需先查询块ID
+
+        Milvus 以过滤表达式在服务端删除；Chroma 分批查出匹配的ID再删除，避免一次加载全部ID。
+
+        Args:
+            field: 元数据字段名，如 document_id、kb_uuid
+            values: 字段取值列表
+
+        Returns:
+            删除的向量数量
+
+        Raises:
+            Exception: 集合中不存在该字段等删除失败的情况
+        """
+        logger.info(f"按元数据删除向量，字段: {field}, 取值数量: {len(values)}")
+        drop_shards(self.shard_key)
+        vector_store = self.get_vector_store()
+        deleted_count = 0
+
+        for start in range(0, len(values), self.delete_batch_size):
+            batch_values = values[start:start + self.delete_batch_size]
+            if self.store_type.lower() == "milvus":
+                if not vector_store.client.has_collection(self.collection_name):
+                    break
+                result = vector_store.client.delete(
+                    collection_name=self.collection_name,
+                    filter=self._scope_expr(f"{field} in {json.dumps(batch_values, ensure_ascii=False)}")
+                )
+                # 不同版本的客户端返回 {"delete_count": n} 或被删除的主键列表
+                deleted_count += result.get("delete_count", 0) if isinstance(result, dict) else len(result or [])
+            else:
+                collection = vector_store._collection
+                while True:
+                    matched = collection.get(where={field: {"$in": batch_values}},
+                                             limit=self.delete_batch_size, include=[])
+                    if not matched["ids"]:
+                        break
+                    collection.delete(ids=matched["ids"])
+                    deleted_count += len(matched["ids"])
+
+        logger.info(f"按元数据删除完成，删除数量: {deleted_count}")
+        return deleted_count
+
+    def get_embeddings_by_ids(self, document_ids: List[str], batch_size: int = 1000) -> Dict[str, List[float]]:
+        """
+        按ID批量读取已存储的向量
+
+        Args:
+            document_ids: 文档ID列表
+            batch_size: 每批读取的数量
+
+        Returns:
+            文档ID -> 向量 的字典，不存在的ID不会出现在结果中
+        """
+        logger.info(f"从向量数据库读取向量，数量: {len(document_ids)}")
+        vector_store = self.get_vector_store()
+        vectors = {}
+
+        for start in range(0, len(document_ids), batch_size):
+            batch_ids = document_ids[start:start + batch_size]
+            if self.store_type.lower() == "milvus":
+                rows = vector_store.client.get(
+                    collection_name=self.collection_name,
+                    ids=batch_ids,
+                    output_fields=[vector_store._primary_field, vector_store._vector_field]
+                )
+                for row in rows:
+                    vectors[row[vector_store._primary_field]] = list(row[vector_store._vector_field])
+            else:
+                result = vector_store.get(ids=batch_ids, include=["embeddings"])
+                for document_id, embedding in zip(result["ids"], result["embeddings"]):
+                    vectors[document_id] = list(embedding)
+
+        logger.info(f"向量读取完成，命中数量: {len(vectors)}")
+        return vectors
+
+    def get_records_by_ids(self, document_ids: List[str], batch_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        按ID批量读取完整记录（文本、向量和元数据），用于在向量数据库之间复制数据
+
+        Args:
+            document_ids: 文档ID列表
+            batch_size: 每批读取的数量
+
+        Returns:
+            记录列表，格式同 iter_records，不存在的ID不会出现在结果中
+        """
+        vector_store = self.get_vector_store()
+        records = []
+        for start in range(0, len(document_ids), batch_size):
+            batch_ids = document_ids[start:start + batch_size]
+            if self.store_type.lower() == "milvus":
+                if not vector_store.client.has_collection(self.collection_name):
+                    break
+                rows = vector_store.client.get(collection_name=self.collection_name, ids=batch_ids,
+                                               output_fields=["*"])
+                records.extend(self._milvus_row_to_record(vector_store, row) for row in rows)
+            else:
+                result = vector_store.get(ids=batch_ids, include=["embeddings", "metadatas", "documents"])
+                records.extend(self._chroma_rows_to_records(result))
+        return records
+
+    def iter_ids(self, batch_size: int = 1000) -> Iterator[List[str]]:
+        """
+        分批遍历当前集合（或共享集合中当前知识库）的全部记录ID
+
+        Args:
+            batch_size: 每批数量
+
+        Yields:
+            记录ID列表
+        """
+        vector_store = self.get_vector_store()
+        if self.store_type.lower() == "milvus":
+            if not vector_store.client.has_collection(self.collection_name):
+                return
+            iterator = vector_store.client.query_iterator(
+                collection_name=self.collection_name,
+                batch_size=batch_size,
+                filter=self._scope_expr(None) or "",
+                output_fields=[vector_store._primary_field],
+            )
+            try:
+                while rows := iterator.next():
+                    yield [row[vector_store._primary_field] for row in rows]
+            finally:
+                iterator.close()
+        else:
+            offset = 0
+            while True:
+                result = vector_store._collection.get(limit=batch_size, offset=offset, include=[])
+                if not result["ids"]:
+                    break
+                yield result["ids"]
+                offset += len(result["ids"])
+
     def delete_collection(self) -> None:
         """
-        删除当前集合
+        删除当前集合；共享集合布局下只删除当前知识库的数据
         """
+        if self.is_shared:
+            logger.info(f"从共享集合 {self.collection_name} 删除知识库 {self.knowledge_id} 的数据")
+            self.delete_by_metadata(field="kb_id", values=[self.knowledge_id])
+            return
+
         logger.info(f"删除集合: {self.collection_name}")
+        drop_shards(self.shard_key)
         vector_store = self.get_vector_store()
 
         if self.store_type.lower() == "milvus":
             # Milvus 删除集合的方法
             logger.debug("调用Milvus删除集合方法")
             vector_store.client.drop_collection(self.collection_name)
+            milvus_collection_manager.forget(self.collection_name)
+            _indexed_collections.discard(self.collection_name)
             logger.info("Milvus集合删除成功")
         else:
             # Chroma 删除集合的方法
             logger.debug("调用Chroma删除集合方法")
             vector_store.delete_collection()
             logger.info("Chroma集合删除成功")
+
+    def rename_collection(self, new_name: str) -> None:
+        """
+        重命名当前集合，之后本实例使用新名称；共享集合不支持
+
+        Args:
+            new_name: 新集合名称
+        """
+        if self.is_shared:
+            raise ValueError(f"共享集合 {self.collection_name} 不能重命名")
+        logger.info(f"重命名集合: {self.collection_name} -> {new_name}")
+        drop_shards(self.shard_key)
+        drop_shards(new_name)
+        vector_store = self.get_vector_store()
+        if self.store_type.lower() == "milvus":
+            vector_store.client.rename_collection(old_name=self.collection_name, new_name=new_name)
+            milvus_collection_manager.forget(self.collection_name)
+            _indexed_collections.discard(self.collection_name)
+        else:
+            vector_store._collection.modify(name=new_name)
+        self.collection_name = new_name
+
+    def similarity_search(self, query: str, k: int = 4,
+                          filters: Dict[str, Any] = None) -> List[Tuple[Document, float]]:
+        """
+        相似度检索，可按元数据等值过滤
+
+        Args:
+            query: 查询文本
+            k: 返回结果数量
+            filters: 元数据过滤条件，值为列表时表示取值在列表中，如 {"document_id": [1, 2]}；
+                数组字段（tags）表示包含任一取值，如 {"tags": ["产品", "FAQ"]}
+
+        Returns:
+            (文档, 分数) 列表，分数含义取决于向量数据库的度量方式
+        """
+        logger.info(f"相似度检索，集合: {self.collection_name}, k={k}, 过滤条件: {filters}")
+        if self._can_use_shards(filters):
+            try:
+                results = self._sharded_search([self.embeddings.embed_query(query)], k, filters)
+                if results is not None:
+                    return results[0]
+            except Exception as error:
+                logger.warning(f"集合 {self.collection_name} 分片检索失败，回退到向量数据库: {str(error)}")
+        vector_store = self.get_vector_store()
+        if self.store_type.lower() == "milvus":
+            return vector_store.similarity_search_with_score(query, k=k, expr=self._scope_expr(
+                self._build_milvus_expr(filters, self._milvus_field_types(vector_store) if filters else {})))
+        return vector_store.similarity_search_with_score(query, k=k, filter=self._build_chroma_where(filters))
+
+    def batch_similarity_search(self, queries: List[str], k: int = 4,
+                                filters: Dict[str, Any] = None) -> List[List[Tuple[Document, float]]]:
+        """
+        批量相似度检索：全部查询一次批量嵌入，每种向量数据库只发起一次多向量检索
+
+        相同的查询文本只嵌入和检索一次。过滤条件作用于全部查询，含义同 similarity_search。
+
+        Args:
+            queries: 查询文本列表
+            k: 每个查询返回的结果数量
+            filters: 元数据过滤条件
+
+        Returns:
+            与 queries 顺序一致的 (文档, 分数) 列表
+        """
+        if not queries:
+            return []
+        unique_queries = list(dict.fromkeys(queries))
+        logger.info(f"批量相似度检索，集合: {self.collection_name}, 查询数: {len(queries)}"
+                    f"（去重后 {len(unique_queries)}）, k={k}, 过滤条件: {filters}")
+        results = self.similarity_search_by_vectors(embed_queries(self.embeddings, unique_queries), k, filters)
+        results_by_query = dict(zip(unique_queries, results))
+        return [list(results_by_query[query]) for query in queries]
+
+    def similarity_search_by_vectors(self, query_vectors: List[List[float]], k: int = 4,
+                                     filters: Dict[str, Any] = None) -> List[List[Tuple[Document, float]]]:
+        """
+        以已计算的查询向量批量检索，每种向量数据库只发起一次多向量检索
+
+        查询向量必须与集合使用同一嵌入模型（启用降维的知识库需先经过同一投影）。
+
+        Args:
+            query_vectors: 查询向量列表
+            k: 每个查询返回的结果数量
+            filters: 元数据过滤条件，含义同 similarity_search
+
+        Returns:
+            与 query_vectors 顺序一致的 (文档, 分数) 列表
+        """
+        if not query_vectors:
+            return []
+        results = None
+        if self._can_use_shards(filters):
+            try:
+                results = self._sharded_search(query_vectors, k, filters)
+            except Exception as error:
+                logger.warning(f"集合 {self.collection_name} 分片检索失败，回退到向量数据库: {str(error)}")
+        if results is None:
+            vector_store = self.get_vector_store()
+            if self.store_type.lower() == "milvus":
+                results = self._milvus_batch_search(vector_store, query_vectors, k, filters)
+            else:
+                response = vector_store._collection.query(
+                    query_embeddings=query_vectors, n_results=k, where=self._build_chroma_where(filters),
+                    include=["documents", "metadatas", "distances"])
+                results = [[(Document(page_content=text, metadata=metadata or {}, id=record_id), distance)
+                            for text, metadata, record_id, distance in zip(texts, metadatas, ids, distances)
+                            if text is not None]
+                           for texts, metadatas, ids, distances in zip(
+                               response["documents"], response["metadatas"], response["ids"],
+                               response["distances"])]
+        return results
+
+    def _milvus_batch_search(self, vector_store, query_vectors: List[List[float]], k: int,
+                             filters: Optional[Dict[str, Any]]) -> List[List[Tuple[Document, float]]]:
+        """以一次多向量请求检索 Milvus，参数与 langchain_milvus 的单向量检索一致"""
+        if vector_store.col is None:
+            return [[] for _ in query_vectors]
+        expr = self._scope_expr(
+            self._build_milvus_expr(filters, self._milvus_field_types(vector_store) if filters else {}))
+        response = vector_store.client.search(
+            self.collection_name,
+            data=query_vectors,
+            anns_field=vector_store._vector_field,
+            search_params=vector_store._as_list(vector_store.search_params)[0],
+            limit=k,
+            filter=expr or "",
+            output_fields=vector_store._get_output_fields(),
+        )
+        return [vector_store._parse_documents_from_search_results([hits]) for hits in response]
+
+    def _can_use_shards(self, filters: Optional[Dict[str, Any]]) -> bool:
+        """分片只保存向量和文档ID，仅支持无过滤或按 document_id 过滤的检索"""
+        return (settings.sharded_search_enabled and self.is_local
+                and set(filters or {}) <= {"document_id"})
+
+    def _sharded_search(self, query_vectors: List[List[float]], k: int,
+                        filters: Optional[Dict[str, Any]]) -> Optional[List[List[Tuple[Document, float]]]]:
+        """
+        在集合的本地分片上检索一批查询向量，再一次按ID读取全部命中记录的文本和元数据
+
+        Returns:
+            每个查询的 (文档, 分数) 列表，分数为 L2 距离的平方；集合没有可用分片时返回None
+        """
+        if not sharded_search_pool.has_shards(self.shard_key):
+            return None
+        document_ids = None
+        if filters and "document_id" in filters:
+            values = filters["document_id"]
+            document_ids = [int(value) for value in (values if isinstance(values, list) else [values])]
+        hits = sharded_search_pool.search(self.shard_key, np.asarray(query_vectors, dtype=np.float32), k,
+                                          document_ids=document_ids)
+        if hits is None:
+            return None
+        hit_ids = list(dict.fromkeys(record_id for query_hits in hits for record_id, _ in query_hits))
+        records = {record["id"]: record for record in self.get_records_by_ids(hit_ids)}
+        # 分片构建后被删除的记录读取不到，直接跳过
+        return [[(Document(page_content=records[record_id]["text"], metadata=records[record_id]["metadata"],
+                           id=record_id), distance)
+                 for record_id, distance in query_hits if record_id in records]
+                for query_hits in hits]
+
+    def build_search_shards(self, shard_count: int = None) -> Dict[str, Any]:
+        """
+        将当前集合（或共享集合中当前知识库）的向量导出为本地分片，供多进程分片检索使用
+
+        Args:
+            shard_count: 分片数量，默认取配置，未配置时等于工作进程数
+
+        Returns:
+            分片清单
+        """
+        if not self.is_local:
+            raise ValueError(f"集合 {self.collection_name} 不在本机，不支持分片检索")
+        shard_count = shard_count or settings.sharded_search_shards or sharded_search_pool.workers
+        return build_shards(self.shard_key, self.iter_records(batch_size=settings.vector_migration_batch_size),
+                            shard_count)
+
+    def iter_records(self, batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        分批遍历当前集合（或共享集合中当前知识库）的全部记录，用于迁移和导出
+
+        Args:
+            batch_size: 每批记录数量
+
+        Yields:
+            记录列表，每条记录包含 id、text、embedding、metadata
+        """
+        vector_store = self.get_vector_store()
+        if self.store_type.lower() == "milvus":
+            if not vector_store.client.has_collection(self.collection_name):
+                return
+            iterator = vector_store.client.query_iterator(
+                collection_name=self.collection_name,
+                batch_size=batch_size,
+                filter=self._scope_expr(None) or "",
+                output_fields=["*"],
+            )
+            try:
+                while rows := iterator.next():
+                    yield [self._milvus_row_to_record(vector_store, row) for row in rows]
+            finally:
+                iterator.close()
+        else:
+            collection = vector_store._collection
+            offset = 0
+            while True:
+                result = collection.get(limit=batch_size, offset=offset,
+                                        include=["embeddings", "metadatas", "documents"])
+                if not result["ids"]:
+                    break
+                yield self._chroma_rows_to_records(result)
+                offset += len(result["ids"])
+
+    def _milvus_row_to_record(self, vector_store, row: Dict[str, Any]) -> Dict[str, Any]:
+        """将 Milvus 查询结果行转换为记录，共享集合的 kb_id 不属于记录本身的元数据"""
+        row = dict(row)
+        record = {
+            "id": row.pop(vector_store._primary_field),
+            "text": row.pop(vector_store._text_field),
+            "embedding": list(row.pop(vector_store._vector_field)),
+        }
+        if self.is_shared:
+            row.pop("kb_id", None)
+        record["metadata"] = row
+        return record
+
+    @staticmethod
+    def _chroma_rows_to_records(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """将 Chroma get 结果转换为记录列表"""
+        return [{
+            "id": record_id,
+            "text": text,
+            "embedding": list(embedding),
+            "metadata": metadata or {},
+        } for record_id, text, embedding, metadata in zip(
+            result["ids"], result["documents"], result["embeddings"], result["metadatas"])]
+
+    def add_records(self, records: List[Dict[str, Any]]) -> List[str]:
+        """
+        写入已包含向量的记录，不调用嵌入模型
+
+        Args:
+            records: 记录列表，格式同 iter_records
+
+        Returns:
+            写入的记录ID列表
+        """
+        if not records:
+            return []
+        drop_shards(self.shard_key)
+        ids = [str(record["id"]) for record in records]
+        texts = [record["text"] for record in records]
+        embeddings = [record["embedding"] for record in records]
+        vector_store = self.get_vector_store()
+        metadatas = self._prepare_metadatas(vector_store, [record["metadata"] for record in records])
+        items = list(zip(texts, embeddings, metadatas))
+
+        def insert(batch: List[Tuple[str, List[float], Dict[str, Any]]], batch_ids: List[str]) -> List[str]:
+            batch_texts, batch_embeddings, batch_metadatas = (list(column) for column in zip(*batch))
+            if self.store_type.lower() == "milvus":
+                return vector_store.add_embeddings(texts=batch_texts, embeddings=batch_embeddings,
+                                                   metadatas=batch_metadatas, ids=batch_ids)
+            vector_store._collection.upsert(ids=batch_ids, embeddings=batch_embeddings,
+                                            metadatas=batch_metadatas, documents=batch_texts)
+            return batch_ids
+
+        inserted_ids = self._insert_in_batches(vector_store, items, ids, insert)
+        if self.store_type.lower() == "milvus":
+            self._ensure_scalar_indexes(vector_store)
+        return inserted_ids
+
+    def replace_records(self, records: List[Dict[str, Any]]) -> List[str]:
+        """
+        覆盖写入已存在的记录（如只更新元数据），向量取自记录，不调用嵌入模型
+
+        Chroma 按ID覆盖写入；Milvus 插入相同主键会产生重复行，先删除旧记录再写入。
+
+        Args:
+            records: 记录列表，格式同 iter_records
+
+        Returns:
+            写入的记录ID列表
+        """
+        if not records:
+            return []
+        if self.store_type.lower() == "milvus":
+            self.delete_documents([str(record["id"]) for record in records])
+        return self.add_records(records)
+
+    def count(self) -> int:
+        """
+        统计当前集合（或共享集合中当前知识库）的记录数量
+
+        Returns:
+            记录数量
+        """
+        vector_store = self.get_vector_store()
+        if self.store_type.lower() == "milvus":
+            if not vector_store.client.has_collection(self.collection_name):
+                return 0
+            rows = vector_store.client.query(collection_name=self.collection_name,
+                                             filter=self._scope_expr(None) or "", output_fields=["count(*)"])
+            return rows[0]["count(*)"] if rows else 0
+        return vector_store._collection.count()
+
+    def _scope_expr(self, expr: Optional[str]) -> Optional[str]:
+        """为共享集合的过滤表达式加上知识库范围条件"""
+        if not self.is_shared:
+            return expr
+        scope = f"kb_id == {self.knowledge_id}"
+        return f"{scope} and ({expr})" if expr else scope
+
+    @staticmethod
+    def _build_milvus_expr(filters: Optional[Dict[str, Any]],
+                           field_types: Dict[str, DataType] = None) -> Optional[str]:
+        """
+        将过滤条件转换为 Milvus 过滤表达式
+
+        数组字段使用 array_contains_any；旧集合中以 JSON 字符串存储的数组字段退化为 like 匹配，无法使用索引。
+        """
+        if not filters:
+            return None
+        field_types = field_types or {}
+        conditions = []
+        for key, value in filters.items():
+            if key in ARRAY_FIELDS:
+                values = list(value) if isinstance(value, (list, tuple)) else [value]
+                if field_types.get(key) == DataType.VARCHAR:
+                    patterns = [json.dumps(f"%{json.dumps(item, ensure_ascii=False)}%", ensure_ascii=False)
+                                for item in values]
+                    conditions.append("(" + " or ".join(f"{key} like {pattern}" for pattern in patterns) + ")")
+                else:
+                    conditions.append(f"array_contains_any({key}, {json.dumps(values, ensure_ascii=False)})")
+            elif isinstance(value, (list, tuple)):
+                conditions.append(f"{key} in {json.dumps(list(value), ensure_ascii=False)}")
+            else:
+                conditions.append(f"{key} == {json.dumps(value, ensure_ascii=False)}")
+        return " and ".join(conditions)
+
+    @staticmethod
+    def _build_chroma_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """将等值过滤条件转换为 Chroma where 条件"""
+        if not filters:
+            return None
+        conditions = []
+        for key, value in filters.items():
+            if key in ARRAY_FIELDS:
+                values = list(value) if isinstance(value, (list, tuple)) else [value]
+                contains = [{key: {"$contains": item}} for item in values]
+                conditions.append(contains[0] if len(contains) == 1 else {"$or": contains})
+            else:
+                conditions.append({key: {"$in": list(value)} if isinstance(value, (list, tuple)) else value})
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
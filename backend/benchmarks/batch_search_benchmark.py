@@ -0,0 +1,176 @@
+"""
+批量检索基准测试
+
+在本地替身环境中入库合成语料，分别对 Chroma 和 Milvus Lite 对比：逐条调用 similarity_search 和一次调用
+batch_similarity_search 完成同一批查询的总耗时、嵌入请求次数和向量数据库检索请求次数，并检查两种方式结果一致。
+
+确定性假嵌入没有网络开销，用 --embed-latency-ms 模拟每次嵌入请求的往返耗时（DashScope 每次请求最多25条）。
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.batch_search_benchmark
+    python -m benchmarks.batch_search_benchmark --queries 100 --embed-latency-ms 50 --stores chroma
+
+输出指标：
+    seconds        完成全部查询的总耗时
+    per_query_ms   平均每个查询的耗时（毫秒）
+    embed_calls    嵌入请求次数
+    search_calls   向量数据库检索请求次数
+    match          批量结果与逐条结果一致的比例
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+from benchmarks.corpus import generate_pages
+from benchmarks.local_stack import configure_local_stack
+
+DASHSCOPE_BATCH_SIZE = 25
+
+
+class SlowEmbeddings:
+    """为底层嵌入模型的每次请求加上固定延迟并计数"""
+
+    def __init__(self, embeddings, latency: float):
+        self.embeddings = embeddings
+        self.latency = latency
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        requests = (len(texts) + DASHSCOPE_BATCH_SIZE - 1) // DASHSCOPE_BATCH_SIZE
+        self.calls += requests
+        time.sleep(self.latency * requests)
+        return self.embeddings.embed_documents(texts)
+
+
+def _count_calls(target, name: str, counter: Dict[str, int]) -> None:
+    original = getattr(target, name)
+
+    def counted(*args, **kwargs):
+        counter["search_calls"] += 1
+        return original(*args, **kwargs)
+
+    setattr(target, name, counted)
+
+
+def run_store(store_type: str, args, db, user, queries: List[str]) -> List[Dict[str, Any]]:
+    from fastapi import UploadFile
+
+    from app.crud.knowledge import KnowledgeBaseDB
+    from app.models.knowledge import VectorDatabaseType
+    from app.services.rag.document_processing_service import DocumentProcessingService
+    from app.vector_store.text_vector_store import TextVectorStore
+
+    knowledge_base = KnowledgeBaseDB(db).create_knowledge_base(
+        name=f"batch-{store_type}", uuid=f"batch-{store_type}", description="batch search benchmark",
+        tags=["benchmark"], vector_db_type=VectorDatabaseType(store_type), user_id=user.id,
+        chunk_size=args.chunk_size, chunk_overlap=20, is_public=False,
+    )
+    service = DocumentProcessingService(db_session=db)
+    for index in range(args.files):
+        text = "\n\n".join(generate_pages(args.lang, args.pages, args.seed + index))
+        asyncio.run(service.process_documents(processing_params={
+            "knowledge_id": knowledge_base.id,
+            "files": [UploadFile(file=io.BytesIO(text.encode("utf-8")), filename=f"doc_{index}.txt")],
+            "kb_uuid": knowledge_base.uuid,
+            "chunk_size": args.chunk_size,
+            "chunk_overlap": 20,
+            "vector_store_type": store_type,
+            "tags": knowledge_base.tags,
+        }))
+
+    store = TextVectorStore.for_knowledge_base(knowledge_id=knowledge_base.id, store_type=store_type)
+    embeddings = SlowEmbeddings(store.embeddings, args.embed_latency_ms / 1000)
+    store.embeddings = embeddings
+    vector_store = store.get_vector_store()
+    store.get_vector_store = lambda: vector_store
+    counter = {"search_calls": 0}
+    if store_type == "milvus":
+        _count_calls(vector_store.client, "search", counter)
+    else:
+        _count_calls(vector_store._collection, "query", counter)
+    store.similarity_search(queries[0], k=args.k)  # 预热
+
+    rows = []
+    for mode in ("sequential", "batch"):
+        embeddings.calls, counter["search_calls"] = 0, 0
+        started = time.perf_counter()
+        if mode == "sequential":
+            results = [store.similarity_search(query, k=args.k) for query in queries]
+        else:
+            results = store.batch_similarity_search(queries, k=args.k)
+        seconds = time.perf_counter() - started
+        ids = [[document.page_content for document, _ in query_results] for query_results in results]
+        rows.append({"case": f"{store_type}_{mode}", "seconds": round(seconds, 3),
+                     "per_query_ms": round(seconds * 1000 / len(queries), 2), "embed_calls": embeddings.calls,
+                     "search_calls": counter["search_calls"], "ids": ids})
+    expected = rows[0]["ids"]
+    for row in rows:
+        matched = sum(len(set(got) & set(want)) for got, want in zip(row.pop("ids"), expected))
+        row["match"] = round(matched / max(sum(len(want) for want in expected), 1), 4)
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="批量检索基准测试")
+    parser.add_argument("--stores", nargs="+", default=["chroma", "milvus"], choices=["chroma", "milvus"])
+    parser.add_argument("--lang", default="zh", choices=["zh", "en"])
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embed-latency-ms", type=float, default=30, help="模拟的每次嵌入请求往返耗时")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    work_dir = configure_local_stack(Path(tempfile.mkdtemp(prefix="batch-search-bench-")))
+    os.environ["MILVUS_CLIENT"] = str(work_dir / "milvus.db")
+
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from benchmarks.local_stack import init_database, create_user
+
+    db = init_database()()
+    try:
+        user = create_user(db, "bench", "13800000000", "bench-password")
+        rng = random.Random(args.seed)
+        pages = generate_pages(args.lang, args.pages, args.seed)
+        queries = []
+        for _ in range(args.queries):
+            page = rng.choice(pages)
+            start = rng.randrange(max(len(page) - 40, 1))
+            queries.append(page[start:start + 40])
+
+        columns = ("seconds", "per_query_ms", "embed_calls", "search_calls", "match")
+        print(f"查询数: {len(queries)}，k={args.k}，模拟嵌入往返: {args.embed_latency_ms}ms")
+        print("case".ljust(20) + "".join(column.rjust(14) for column in columns))
+        for store_type in args.stores:
+            rows = run_store(store_type, args, db, user, queries)
+            for row in rows:
+                print(row["case"].ljust(20) + "".join(str(row[column]).rjust(14) for column in columns), flush=True)
+            print(f"  批量检索耗时为逐条检索的 {rows[1]['seconds'] / rows[0]['seconds']:.3f}x")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Milvus 批量导入路径检查
+
+在本地替身环境中用 Milvus Lite 向一个尚不存在的集合首次写入大量文档，检查只有第一批
+（VECTOR_INSERT_BATCH_SIZE 条，用于创建集合）以普通方式写入，其余记录都交给 MilvusBulkImporter。
+Milvus Lite 没有批量导入服务，导入器被替换为记录收到的行后以普通方式写入，保证集合数据完整。
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.bulk_import_check
+    python -m benchmarks.bulk_import_check --documents 5000 --threshold 1000
+
+检查失败时返回非0退出码。
+"""
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.local_stack import configure_local_stack
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Milvus 批量导入路径检查")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--threshold", type=int, default=1000, help="批量导入阈值（MILVUS_BULK_IMPORT_THRESHOLD）")
+    parser.add_argument("--batch-size", type=int, default=256, help="写入批次大小（VECTOR_INSERT_BATCH_SIZE）")
+    args = parser.parse_args()
+
+    work_dir = configure_local_stack(Path(tempfile.mkdtemp(prefix="bulk-import-check-")))
+    os.environ.update({
+        "MILVUS_CLIENT": str(work_dir / "milvus.db"),
+        "MILVUS_BULK_IMPORT_THRESHOLD": str(args.threshold),
+        "MILVUS_BULK_ENDPOINT": "127.0.0.1:9000",
+        "VECTOR_INSERT_BATCH_SIZE": str(args.batch_size),
+    })
+
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from langchain_core.documents import Document
+
+    from app.vector_store import text_vector_store
+    from app.vector_store.text_vector_store import TextVectorStore
+
+    inserted_rows, imported_rows = [], []
+    original_add_records = TextVectorStore.add_records
+
+    def recording_add_records(self, records):
+        inserted_rows.extend(records)
+        return original_add_records(self, records)
+
+    def recording_import_records(self, records, primary_field, text_field, vector_field):
+        rows = list(records)
+        imported_rows.extend(rows)
+        field_names = {field["name"] for field in
+                       self.client.describe_collection(collection_name=self.collection_name)["fields"]}
+        self.client.insert(collection_name=self.collection_name, data=[{
+            primary_field: str(row["id"]), text_field: row["text"], vector_field: row["embedding"],
+            **{key: value for key, value in row["metadata"].items() if key in field_names},
+        } for row in rows])
+        return len(rows)
+
+    TextVectorStore.add_records = recording_add_records
+    text_vector_store.MilvusBulkImporter.import_records = recording_import_records
+
+    store = TextVectorStore.for_knowledge_base(knowledge_id=1, store_type="milvus")
+    documents = [Document(page_content=f"批量导入检查文档 {index}", metadata={"document_id": 1, "chunk_index": index})
+                 for index in range(args.documents)]
+    store.add_documents(documents)
+
+    expected_inserted = min(args.batch_size, args.documents)
+    checks = {
+        "inserted_rows": (len(inserted_rows), expected_inserted),
+        "imported_rows": (len(imported_rows), args.documents - expected_inserted),
+        "collection_rows": (store.count(), args.documents),
+    }
+    failed = False
+    for name, (actual, expected) in checks.items():
+        ok = actual == expected
+        failed = failed or not ok
+        print(f"{name.ljust(16)}{str(actual).rjust(8)}  期望 {expected}  {'OK' if ok else 'FAIL'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+知识库问答流式输出基准测试
+
+用逐字输出的假聊天模型（LLM_PROVIDER=fake）对比一次性返回完整回答与 SSE 流式输出时客户端看到第一个字的耗时，
+并以多个并发请求检查流式输出是否互不阻塞。不依赖数据库、向量数据库和外部模型服务，检索结果为合成数据。
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.chat_stream_benchmark
+    python -m benchmarks.chat_stream_benchmark --token-delay-ms 50 --concurrency 32
+
+输出指标：
+    ttft_p50_ms    首字耗时中位数（毫秒），一次性返回时等于总耗时
+    total_p50_ms   完整回答耗时中位数（毫秒）
+    tokens         每个请求输出的 token 数
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.local_stack import configure_local_stack
+
+
+async def run_blocking(llm, prepared):
+    # 等完整回答生成后才返回：客户端看到第一个字的时间即总耗时（假模型只在流式输出时模拟逐字间隔）
+    started = time.perf_counter()
+    chunks = [chunk async for chunk in llm.astream(prepared["messages"]) if chunk.content]
+    elapsed = (time.perf_counter() - started) * 1000
+    return elapsed, elapsed, len(chunks)
+
+
+async def run_streaming(llm, prepared):
+    from app.services.rag.rag_chat_service import stream_chat_answer
+
+    started = time.perf_counter()
+    ttft_ms, tokens = None, 0
+    async for message in stream_chat_answer(llm, prepared, started):
+        if message.startswith("event: token"):
+            tokens += 1
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+    return ttft_ms, (time.perf_counter() - started) * 1000, tokens
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="知识库问答流式输出基准测试")
+    parser.add_argument("--token-delay-ms", type=float, default=20, help="假模型每个字的输出间隔")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    configure_local_stack(Path(tempfile.mkdtemp(prefix="chat-stream-bench-")))
+    os.environ.update({"LLM_PROVIDER": "fake", "FAKE_LLM_TOKEN_DELAY": str(args.token_delay_ms / 1000)})
+
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from app.llm.model_client import get_model_client
+    from app.services.rag.rag_chat_service import RagChatService
+
+    results = [{"content": f"第{index}段参考资料。"} for index in range(4)]
+    prepared = {"messages": RagChatService.build_messages("问题", results), "sources": [], "knowledge_bases": [],
+                "retrieval_ms": 0.0}
+
+    async def run_case(runner):
+        return await asyncio.gather(*(runner(get_model_client(), prepared) for _ in range(args.concurrency)))
+
+    columns = ("ttft_p50_ms", "total_p50_ms", "tokens")
+    print(f"并发请求数: {args.concurrency}，模拟每字输出间隔: {args.token_delay_ms}ms")
+    print("case".ljust(12) + "".join(column.rjust(14) for column in columns))
+    for name, runner in (("blocking", run_blocking), ("streaming", run_streaming)):
+        rows = asyncio.run(run_case(runner))
+        row = {
+            "ttft_p50_ms": round(statistics.median(ttft for ttft, _, _ in rows), 1),
+            "total_p50_ms": round(statistics.median(total for _, total, _ in rows), 1),
+            "tokens": rows[0][2],
+        }
+        print(name.ljust(12) + "".join(str(row[column]).rjust(14) for column in columns), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
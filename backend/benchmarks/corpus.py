@@ -0,0 +1,226 @@
+"""
+合成语料生成器
+
+按固定随机种子生成中英文的 TXT / MD / PDF / CSV / JSONL / DOCX 文档，保证每次运行的输入完全一致。
+PDF 生成依赖 reportlab（pip install reportlab），未安装时跳过 PDF；DOCX 只用标准库生成最小的 Word 文档。
+"""
+import csv
+import json
+import random
+import zipfile
+from xml.sax.saxutils import escape
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+from loguru import logger
+
+# 各规格的页数
+CORPUS_SIZES = {
+    "small": 5,
+    "medium": 50,
+    "large": 200,
+}
+
+# 每页字符数，中文按字计，英文按字母计
+PAGE_CHARS = {
+    "zh": 1200,
+    "en": 3000,
+}
+
+CORPUS_LANGS = ("zh", "en")
+CORPUS_FORMATS = ("txt", "md", "pdf", "csv", "jsonl", "docx")
+
+_ZH_PHRASES = [
+    "知识库", "向量检索", "文档切片", "元数据增强", "嵌入模型", "召回率", "数据洞察", "用户权限",
+    "系统通过", "可以有效提升", "在实际业务场景中", "需要特别注意", "根据配置参数", "自动完成",
+    "查询性能", "存储成本", "并发请求", "分布式部署", "索引构建", "语义相似度", "检索增强生成",
+    "操作手册", "版本更新", "故障排查", "运维人员", "日志记录", "数据一致性", "批量导入",
+    "文件解析", "页面内容", "表格数据", "关键指标", "业务流程", "配置说明", "安全策略",
+]
+_ZH_PUNCTUATION = ["，", "，", "，", "。", "。", "；", "！", "？"]
+
+_EN_WORDS = [
+    "knowledge", "base", "vector", "search", "document", "chunk", "metadata", "embedding", "model",
+    "recall", "insight", "platform", "user", "permission", "system", "query", "performance", "storage",
+    "cost", "concurrent", "request", "deployment", "index", "semantic", "similarity", "retrieval",
+    "manual", "release", "troubleshooting", "operator", "log", "consistency", "import", "parser",
+    "page", "table", "metric", "workflow", "configuration", "security", "the", "a", "of", "and",
+    "to", "in", "is", "for", "with", "on", "that", "by", "this", "from",
+]
+
+
+@dataclass
+class CorpusFile:
+    """合成语料文件描述"""
+    path: Path
+    lang: str
+    size: str
+    file_format: str
+    pages: int
+
+
+def _generate_zh_page(rng: random.Random, chars: int) -> str:
+    parts = []
+    length = 0
+    while length < chars:
+        phrase = rng.choice(_ZH_PHRASES) + rng.choice(_ZH_PHRASES) + rng.choice(_ZH_PUNCTUATION)
+        parts.append(phrase)
+        length += len(phrase)
+        if rng.random() < 0.05:
+            parts.append("\n\n")
+    return "".join(parts)
+
+
+def _generate_en_page(rng: random.Random, chars: int) -> str:
+    sentences = []
+    length = 0
+    while length < chars:
+        words = [rng.choice(_EN_WORDS) for _ in range(rng.randint(8, 20))]
+        sentence = " ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"])
+        sentences.append(sentence)
+        length += len(sentence) + 1
+        if rng.random() < 0.1:
+            sentences.append("\n\n")
+    return " ".join(sentences)
+
+
+def generate_pages(lang: str, pages: int, seed: int) -> List[str]:
+    """
+    生成指定语言和页数的文本
+
+    Args:
+        lang: 语言，zh 或 en
+        pages: 页数
+        seed: 随机种子
+
+    Returns:
+        每页文本组成的列表
+    """
+    rng = random.Random(f"{seed}-{lang}-{pages}")
+    generate_page = _generate_zh_page if lang == "zh" else _generate_en_page
+    return [generate_page(rng, PAGE_CHARS[lang]) for _ in range(pages)]
+
+
+def _write_text(path: Path, pages: List[str]) -> None:
+    path.write_text("\n\n".join(pages), encoding="utf-8")
+
+
+def _write_markdown(path: Path, pages: List[str], lang: str) -> None:
+    heading = "章节" if lang == "zh" else "Section"
+    sections = [f"## {heading} {index + 1}\n\n{page}" for index, page in enumerate(pages)]
+    path.write_text("# Synthetic Corpus\n\n" + "\n\n".join(sections), encoding="utf-8")
+
+
+def _write_csv(path: Path, pages: List[str]) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["page", "paragraph", "content"])
+        for page_index, page in enumerate(pages):
+            for paragraph_index, paragraph in enumerate(page.split("\n")):
+                writer.writerow([page_index + 1, paragraph_index + 1, paragraph])
+
+
+def _write_jsonl(path: Path, pages: List[str]) -> None:
+    # 保持默认的 ASCII 转义，与常见导出工具的输出一致
+    with open(path, "w", encoding="utf-8") as file:
+        for page_index, page in enumerate(pages):
+            for paragraph in page.split("\n"):
+                file.write(json.dumps({"page": page_index + 1, "content": paragraph}) + "\n")
+
+
+def _write_docx(path: Path, pages: List[str]) -> None:
+    namespace = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    paragraphs = "".join(f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(paragraph)}</w:t></w:r></w:p>"
+                         for page in pages for paragraph in page.split("\n"))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'))
+        archive.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="word/document.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'))
+        archive.writestr("word/document.xml", (
+            f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{namespace}">'
+            f'<w:body>{paragraphs}</w:body></w:document>'))
+
+
+def _write_pdf(path: Path, pages: List[str], lang: str) -> None:
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+        from reportlab.pdfgen import canvas
+    except ImportError as error:
+        # 不能静默跳过：PDF 是解析最慢的格式，缺少它的结果与基线不可比
+        raise ImportError("生成 PDF 语料需要 reportlab（dev 依赖组），请执行 uv sync 安装，"
+                          "或用 --formats 排除 pdf") from error
+
+    if lang == "zh":
+        pdfmetrics.registerFont(UnicodeCIDFont("STSong-Light"))
+        font_name, line_chars = "STSong-Light", 40
+    else:
+        font_name, line_chars = "Helvetica", 95
+
+    pdf = canvas.Canvas(str(path), pagesize=A4)
+    _, height = A4
+    for page in pages:
+        text = pdf.beginText(40, height - 40)
+        text.setFont(font_name, 10)
+        flat = page.replace("\n", " ")
+        for start in range(0, len(flat), line_chars):
+            text.textLine(flat[start:start + line_chars])
+        pdf.drawText(text)
+        pdf.showPage()
+    pdf.save()
+
+
+def generate_corpus(output_dir: Path, langs, sizes, formats, seed: int = 42) -> List[CorpusFile]:
+    """
+    生成合成语料
+
+    Args:
+        output_dir: 输出目录
+        langs: 语言列表
+        sizes: 规格列表，取值见 CORPUS_SIZES
+        formats: 文件格式列表，取值见 CORPUS_FORMATS
+        seed: 随机种子
+
+    Returns:
+        生成的语料文件列表
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    corpus_files = []
+    for lang in langs:
+        for size in sizes:
+            pages = generate_pages(lang, CORPUS_SIZES[size], seed)
+            for file_format in formats:
+                path = output_dir / f"{lang}_{size}.{file_format}"
+                if file_format == "txt":
+                    _write_text(path, pages)
+                elif file_format == "md":
+                    _write_markdown(path, pages, lang)
+                elif file_format == "csv":
+                    _write_csv(path, pages)
+                elif file_format == "jsonl":
+                    _write_jsonl(path, pages)
+                elif file_format == "docx":
+                    _write_docx(path, pages)
+                elif file_format == "pdf":
+                    _write_pdf(path, pages, lang)
+                else:
+                    raise ValueError(f"不支持的语料格式: {file_format}")
+                corpus_files.append(CorpusFile(path, lang, size, file_format, len(pages)))
+
+    logger.info(f"合成语料生成完成，共 {len(corpus_files)} 个文件: {output_dir}")
+    return corpus_files
@@ -0,0 +1,233 @@
+"""
+近重复知识块检测基准测试
+
+生成一组含大量重复内容的语料（同一报告的多个修订版本，每个文件开头和结尾带相同的免责声明，另有若干无关文档），
+分别在关闭和开启近重复检测时入库，对比嵌入次数、向量数据库占用和入库耗时。
+
+假嵌入由文本哈希生成，近似文本的向量并不相近，无法用向量检索衡量召回，这里用覆盖率代替：
+每个知识块记录都应能找到一个有向量的块（自身或代表块），且近重复块与代表块的内容相似度（4字符 shingle 的 Jaccard）足够高。
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.dedup_benchmark
+    python -m benchmarks.dedup_benchmark --langs zh --versions 5 --pages 30 --max-distance 6
+
+输出指标：
+    chunks            知识块记录数
+    embedded          嵌入并写入向量数据库的知识块数
+    duplicates        被判为近重复、未嵌入的知识块数
+    index_mb          向量数据库目录占用（MB）
+    seconds           入库总耗时
+    orphans           找不到有向量的块的知识块记录数（应为0）
+    min_sim/mean_sim  近重复块与其代表块的最小/平均内容相似度
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Any, List
+
+from benchmarks.corpus import generate_pages
+from benchmarks.local_stack import configure_local_stack
+
+MODES = ("off", "on")
+
+
+def _mutate(rng: random.Random, text: str, edits: int) -> str:
+    """随机替换若干个字符（取自原文的字符），模拟修订版本中的小改动"""
+    characters = list(text)
+    for _ in range(edits):
+        position = rng.randrange(len(characters))
+        characters[position] = rng.choice(text)
+    return "".join(characters)
+
+
+def build_corpus(output_dir: Path, lang: str, versions: int, pages: int, unrelated: int, seed: int) -> List[Path]:
+    """
+    生成带重复内容的语料
+
+    Args:
+        output_dir: 输出目录
+        lang: 语言
+        versions: 同一报告的修订版本数
+        pages: 每个文件的页数
+        unrelated: 无关文档数
+        seed: 随机种子
+
+    Returns:
+        文件路径列表
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(f"{seed}-{lang}-dedup")
+    disclaimer = generate_pages(lang, 1, seed + 1)[0]
+    report = generate_pages(lang, pages, seed)
+    paths = []
+    for version in range(versions):
+        # 每个修订版本改动约 1/5 的页面，每页改动几个字符
+        revised = [_mutate(rng, page, 3) if version and rng.random() < 0.2 else page for page in report]
+        path = output_dir / f"{lang}_report_v{version + 1}.txt"
+        path.write_text("\n\n".join([disclaimer] + revised + [disclaimer]), encoding="utf-8")
+        paths.append(path)
+    for index in range(unrelated):
+        path = output_dir / f"{lang}_unrelated_{index + 1}.txt"
+        path.write_text("\n\n".join([disclaimer] + generate_pages(lang, pages, seed + 100 + index)),
+                        encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def _shingles(text: str, size: int = 4) -> set:
+    normalized = " ".join(text.lower().split())
+    return {normalized[start:start + size] for start in range(max(len(normalized) - size + 1, 1))}
+
+
+def _directory_mb(path: Path) -> float:
+    return round(sum(file.stat().st_size for file in path.rglob("*") if file.is_file()) / 1024 / 1024, 2)
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    在子进程中以指定模式入库全部语料
+
+    Args:
+        case: 用例参数，包含模式、语料文件、工作目录和切片参数
+
+    Returns:
+        用例指标
+    """
+    work_dir = configure_local_stack(Path(case["work_dir"]))
+    os.environ["CHUNK_DEDUP_ENABLED"] = "true" if case["mode"] == "on" else "false"
+    os.environ["CHUNK_DEDUP_MAX_DISTANCE"] = str(case["max_distance"])
+    os.environ["CHUNK_DEDUP_SCOPE"] = case["scope"]
+
+    from fastapi import UploadFile
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from benchmarks.local_stack import init_database, create_user
+    from app.crud.docs import DocsCRUD
+    from app.crud.knowledge import KnowledgeBaseDB
+    from app.models.knowledge import VectorDatabaseType
+    from app.services.rag.document_processing_service import DocumentProcessingService
+
+    session_factory = init_database()
+    db = session_factory()
+    try:
+        user = create_user(db, "bench", "13800000000", "bench-password")
+        knowledge_base = KnowledgeBaseDB(db).create_knowledge_base(
+            name=f"dedup-{case['mode']}",
+            uuid=f"dedup-{case['mode']}",
+            description="dedup benchmark",
+            tags=["benchmark"],
+            vector_db_type=VectorDatabaseType.CHROMA,
+            user_id=user.id,
+            chunk_size=case["chunk_size"],
+            chunk_overlap=case["chunk_overlap"],
+            is_public=False,
+        )
+
+        service = DocumentProcessingService(db_session=db)
+        embedded = 0
+        store_documents = service._store_documents_to_vector_db
+
+        async def counting_store(**kwargs):
+            nonlocal embedded
+            embedded += len(kwargs["chunks"])
+            return await store_documents(**kwargs)
+
+        service._store_documents_to_vector_db = counting_store
+
+        started = time.perf_counter()
+        for file_path in case["files"]:
+            with open(file_path, "rb") as file_handle:
+                asyncio.run(service.process_documents(processing_params={
+                    "knowledge_id": knowledge_base.id,
+                    "files": [UploadFile(file=file_handle, filename=Path(file_path).name)],
+                    "kb_uuid": knowledge_base.uuid,
+                    "chunk_size": case["chunk_size"],
+                    "chunk_overlap": case["chunk_overlap"],
+                    "vector_store_type": "chroma",
+                    "tags": knowledge_base.tags,
+                }))
+        seconds = time.perf_counter() - started
+
+        docs_crud = DocsCRUD(db)
+        rows = [chunk for document in docs_crud.get_documents_by_knowledge_id(knowledge_base.id)
+                for chunk in docs_crud.get_chunks_by_document_id(document.id)]
+        canonical_texts = {row.chunk_id: row.content for row in rows if row.duplicate_of is None}
+        similarities, orphans = [], 0
+        for row in rows:
+            if row.duplicate_of is None:
+                continue
+            canonical_text = canonical_texts.get(row.duplicate_of)
+            if canonical_text is None:
+                orphans += 1
+                continue
+            left, right = _shingles(row.content), _shingles(canonical_text)
+            similarities.append(len(left & right) / len(left | right))
+
+        return {
+            "chunks": len(rows),
+            "embedded": embedded,
+            "duplicates": len(rows) - len(canonical_texts),
+            "index_mb": _directory_mb(work_dir / "chroma"),
+            "seconds": round(seconds, 2),
+            "orphans": orphans,
+            "min_sim": round(min(similarities), 3) if similarities else "-",
+            "mean_sim": round(sum(similarities) / len(similarities), 3) if similarities else "-",
+        }
+    finally:
+        db.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="近重复知识块检测基准测试")
+    parser.add_argument("--langs", nargs="+", default=["zh", "en"], choices=["zh", "en"])
+    parser.add_argument("--versions", type=int, default=4, help="同一报告的修订版本数")
+    parser.add_argument("--pages", type=int, default=20, help="每个文件的页数")
+    parser.add_argument("--unrelated", type=int, default=2, help="无关文档数")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--chunk-overlap", type=int, default=20)
+    parser.add_argument("--max-distance", type=int, default=3, help="SimHash 海明距离阈值")
+    parser.add_argument("--scope", default="knowledge_base", choices=["document", "knowledge_base"],
+                        help="近重复检测范围，语料中跨文件的修订版本和免责声明只有 knowledge_base 范围能检出")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    work_root = Path(tempfile.mkdtemp(prefix="dedup-bench-"))
+    columns = ("chunks", "embedded", "duplicates", "index_mb", "seconds", "orphans", "min_sim", "mean_sim")
+    print("case".ljust(12) + "".join(column.rjust(12) for column in columns))
+    spawn_context = get_context("spawn")
+    for lang in args.langs:
+        files = build_corpus(work_root / "corpus" / lang, lang, args.versions, args.pages, args.unrelated, args.seed)
+        results = {}
+        for mode in MODES:
+            case = {
+                "mode": mode,
+                "files": [str(path) for path in files],
+                "work_dir": str(work_root / "runs" / f"{lang}_{mode}"),
+                "chunk_size": args.chunk_size,
+                "chunk_overlap": args.chunk_overlap,
+                "max_distance": args.max_distance,
+                "scope": args.scope,
+            }
+            # 配置在导入时读取，每种模式使用全新的子进程
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn_context) as executor:
+                results[mode] = executor.submit(run_case, case).result()
+            name = f"{lang}_{mode}"
+            print(name.ljust(12) + "".join(str(results[mode][column]).rjust(12) for column in columns), flush=True)
+        embedded_ratio = results["on"]["embedded"] / results["off"]["embedded"]
+        print(f"  开启近重复检测后嵌入次数为关闭时的 {embedded_ratio:.2f}x，"
+              f"向量数据库占用 {results['off']['index_mb']} -> {results['on']['index_mb']} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+多知识库联合检索基准测试
+
+在本地替身环境中创建多个知识库（Chroma 与 Milvus Lite 交替），对比逐个知识库串行检索与
+FederatedSearchService 并发检索同一批查询的耗时。向量数据库在本机没有网络往返，
+用 --search-latency-ms 模拟每个知识库检索的远程往返耗时。
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.federated_search_benchmark
+    python -m benchmarks.federated_search_benchmark --knowledge-bases 8 --search-latency-ms 80
+
+输出指标：
+    per_query_ms   平均每个查询的耗时（毫秒）
+    speedup        相对串行检索的加速比
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import generate_pages
+from benchmarks.local_stack import configure_local_stack
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="多知识库联合检索基准测试")
+    parser.add_argument("--knowledge-bases", type=int, default=6)
+    parser.add_argument("--lang", default="zh", choices=["zh", "en"])
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--search-latency-ms", type=float, default=50, help="模拟的每个知识库检索往返耗时")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    work_dir = configure_local_stack(Path(tempfile.mkdtemp(prefix="federated-search-bench-")))
+    os.environ["MILVUS_CLIENT"] = str(work_dir / "milvus.db")
+
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from fastapi import UploadFile
+
+    from app.crud.knowledge import KnowledgeBaseDB
+    from app.models.knowledge import VectorDatabaseType
+    from app.services.multi_rag import federated_search_service
+    from app.services.multi_rag.federated_search_service import FederatedSearchService
+    from app.services.rag.document_processing_service import DocumentProcessingService
+    from app.services.rag.knowledge_search_service import KnowledgeSearchService
+    from benchmarks.local_stack import init_database, create_user
+
+    latency = args.search_latency_ms / 1000
+    original_search = federated_search_service._search_knowledge_base
+
+    def slow_search(*search_args, **search_kwargs):
+        time.sleep(latency)
+        return original_search(*search_args, **search_kwargs)
+
+    federated_search_service._search_knowledge_base = slow_search
+
+    db = init_database()()
+    try:
+        user = create_user(db, "bench", "13800000000", "bench-password")
+        knowledge_ids = []
+        for index in range(args.knowledge_bases):
+            store_type = ("chroma", "milvus")[index % 2]
+            knowledge_base = KnowledgeBaseDB(db).create_knowledge_base(
+                name=f"federated-{index}", uuid=f"federated-{index}", description="federated search benchmark",
+                tags=["benchmark"], vector_db_type=VectorDatabaseType(store_type), user_id=user.id,
+                chunk_size=256, chunk_overlap=20, is_public=False,
+            )
+            text = "\n\n".join(generate_pages(args.lang, args.pages, args.seed + index))
+            asyncio.run(DocumentProcessingService(db_session=db).process_documents(processing_params={
+                "knowledge_id": knowledge_base.id,
+                "files": [UploadFile(file=io.BytesIO(text.encode("utf-8")), filename=f"doc_{index}.txt")],
+                "kb_uuid": knowledge_base.uuid,
+                "chunk_size": 256,
+                "chunk_overlap": 20,
+                "vector_store_type": store_type,
+                "tags": knowledge_base.tags,
+            }))
+            knowledge_ids.append(knowledge_base.id)
+
+        rng = random.Random(args.seed)
+        pages = generate_pages(args.lang, args.pages, args.seed)
+        queries = [page[start:start + 40] for page in (rng.choice(pages) for _ in range(args.queries))
+                   for start in [rng.randrange(max(len(page) - 40, 1))]]
+
+        search_service = KnowledgeSearchService(db)
+        federated = FederatedSearchService(db)
+        federated.search(user.id, queries[0], knowledge_ids, k=args.k)  # 预热
+
+        started = time.perf_counter()
+        for query in queries:
+            for knowledge_id in knowledge_ids:
+                time.sleep(latency)
+                search_service.search(knowledge_id, query, k=args.k)
+        sequential = (time.perf_counter() - started) * 1000 / len(queries)
+
+        started = time.perf_counter()
+        for query in queries:
+            federated.search(user.id, query, knowledge_ids, k=args.k, timeout=60)
+        parallel = (time.perf_counter() - started) * 1000 / len(queries)
+
+        print(f"知识库数: {len(knowledge_ids)}，查询数: {len(queries)}，k={args.k}，"
+              f"模拟检索往返: {args.search_latency_ms}ms")
+        print("case".ljust(16) + "per_query_ms".rjust(14) + "speedup".rjust(10))
+        print("sequential".ljust(16) + str(round(sequential, 2)).rjust(14) + "1.0".rjust(10))
+        print("federated".ljust(16) + str(round(parallel, 2)).rjust(14)
+              + str(round(sequential / parallel, 2)).rjust(10))
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
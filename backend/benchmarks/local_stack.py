@@ -0,0 +1,105 @@
+"""
+本地替身环境
+
+用 SQLite（或本地MySQL）、临时目录下的 Chroma 和确定性假嵌入替代
+MySQL、Milvus 和 DashScope，使基准测试和压测无需任何外部服务即可运行。
+
+注意：configure_local_stack 必须在导入任何 app 模块之前调用，
+因为 app.core.config 在导入时读取环境变量。
+"""
+import os
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_METADATA_EXCLUDE_FIELDS = "file_path,file_type,file_size,last_modified_date,last_accessed_date"
+
+# 本地运行时不会被用到、但配置类要求存在的占位配置
+PLACEHOLDER_ENV = {
+    "MYSQL_USER": "bench",
+    "MYSQL_PASSWORD": "bench",
+    "MYSQL_HOST": "127.0.0.1",
+    "MYSQL_PORT": "3306",
+    "MYSQL_DB": "bench",
+    "JWT_SECRET_KEY": "local-bench-secret",
+    "JWT_ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    "DASHSCOPE_API_KEY": "unused",
+    "LLM_BASE_URL": "http://127.0.0.1:9/unused",
+    "MILVUS_CLIENT": "http://127.0.0.1:19530",
+    "MILVUS_USER": "unused",
+    "MILVUS_PASSWORD": "unused",
+    "METADATA_EXCLUDE_FIELDS": DEFAULT_METADATA_EXCLUDE_FIELDS,
+}
+
+
+def configure_local_stack(work_dir: Path, database_url: Optional[str] = None) -> Path:
+    """
+    设置本地替身环境变量
+
+    Args:
+        work_dir: 工作目录，数据库文件、上传文件、Chroma数据和日志都写在这里
+        database_url: 数据库连接串，默认为工作目录下的SQLite文件
+
+    Returns:
+        工作目录的绝对路径
+    """
+    work_dir = Path(work_dir).resolve()
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    for key, value in PLACEHOLDER_ENV.items():
+        os.environ.setdefault(key, value)
+
+    os.environ.update({
+        "DATABASE_URL": database_url or f"sqlite:///{work_dir / 'bench.db'}",
+        "EMBEDDING_PROVIDER": "fake",
+        "KNOWLEDGE_FILE_PATH": str(work_dir / "knowledge"),
+        "CHROMA_FILE_PATH": str(work_dir / "chroma"),
+        "VECTOR_FILE_PATH": str(work_dir / "vector"),
+        "LOG_FILE_PATH": str(work_dir / "logs"),
+    })
+    return work_dir
+
+
+def init_database():
+    """
+    创建全部数据表并返回会话工厂
+
+    Returns:
+        SessionLocal 会话工厂
+    """
+    from sqlmodel import SQLModel
+
+    import app.models  # noqa: F401  注册全部模型
+    from app.core.database import engine, SessionLocal
+
+    SQLModel.metadata.create_all(engine)
+    return SessionLocal
+
+
+def create_user(db, username: str, mobile_phone: str, password: str):
+    """
+    创建用户，用户已存在时直接返回
+
+    Args:
+        db: 数据库会话
+        username: 用户名
+        mobile_phone: 手机号
+        password: 明文密码
+
+    Returns:
+        用户对象
+    """
+    from app.core.security import hash_password
+    from app.crud.auth import auth_crud
+    from app.models.auth import User
+
+    user = auth_crud.get_user_by_mobile_phone(db, mobile_phone)
+    if user:
+        return user
+    return auth_crud.create_user(db, User(
+        username=username,
+        mobile_phone=mobile_phone,
+        password_hash=hash_password(password),
+        is_active=True,
+    ))
@@ -0,0 +1,122 @@
+"""
+知识库向量降维离线评估
+
+对比不同目标维度下 PCA 投影和 Matryoshka 截断的召回率、精确检索耗时和向量内存，用于决定知识库是否降维、降到多少维。
+以原始维度的精确检索（与 Milvus FLAT 索引一致）结果为基准计算 recall@k，不依赖数据库和向量数据库。
+
+向量来源：
+    默认    合成语料按字符 3-gram 哈希得到的词袋向量（有真实的相似结构，确定性假嵌入是随机向量，不适合评估降维）
+    --snapshot DIR  知识库快照（app.services.rag.knowledge_snapshot_service 导出）中的真实向量，查询为随机抽取的已有向量
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.projection_benchmark
+    python -m benchmarks.projection_benchmark --dims 768 512 256 128 --k 10
+    python -m benchmarks.projection_benchmark --snapshot /data/snapshots/kb_12 --sample-size 5000
+
+输出指标：
+    recall            recall@k，相对原始维度精确检索
+    full_ms           原始维度单次查询耗时（毫秒）
+    projected_ms      降维后单次查询耗时（毫秒）
+    bytes_per_vector  每条向量占用字节数（float32）
+    memory_ratio      降维后与原始维度的向量内存之比
+"""
+import argparse
+import random
+import sys
+import tempfile
+from hashlib import blake2b
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from benchmarks.corpus import generate_pages
+from benchmarks.local_stack import configure_local_stack
+
+SYNTHETIC_DIMENSION = 1536
+CHUNK_CHARS = {"zh": 300, "en": 800}
+
+
+def _ngram_embed(texts: List[str], dimension: int, n: int = 3) -> np.ndarray:
+    """字符 n-gram 特征哈希到固定维度并归一化，哈希值的最高位决定符号"""
+    vectors = np.zeros((len(texts), dimension), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for start in range(max(len(text) - n + 1, 1)):
+            value = int.from_bytes(blake2b(text[start:start + n].encode("utf-8"), digest_size=8).digest(), "big")
+            vectors[row, value % dimension] += 1.0 if value >> 63 else -1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def synthetic_vectors(pages: int, queries: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    生成合成语料的知识块向量和查询向量，查询为随机截取的知识块片段
+
+    Returns:
+        (知识块向量, 查询向量)
+    """
+    rng = random.Random(seed)
+    chunks = []
+    for lang in ("zh", "en"):
+        size = CHUNK_CHARS[lang]
+        for page in generate_pages(lang, pages, seed):
+            chunks.extend(page[start:start + size] for start in range(0, len(page), size))
+    query_texts = []
+    for chunk in rng.sample(chunks, min(queries, len(chunks))):
+        start = rng.randrange(max(len(chunk) // 2, 1))
+        query_texts.append(chunk[start:start + len(chunk) // 3])
+    return _ngram_embed(chunks, SYNTHETIC_DIMENSION), _ngram_embed(query_texts, SYNTHETIC_DIMENSION)
+
+
+def snapshot_vectors(snapshot_dir: Path, queries: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """读取快照中的向量（跳过没有向量的近重复块），随机抽取其中一部分作为查询"""
+    import pyarrow.parquet
+
+    table = pyarrow.parquet.read_table(snapshot_dir / "chunks.parquet", columns=["embedding"])
+    column = table.column("embedding").combine_chunks()
+    column = column.filter(column.is_valid())
+    vectors = column.flatten().to_numpy(zero_copy_only=False).reshape(len(column), -1).astype(np.float32)
+    rows = np.random.default_rng(seed).choice(len(vectors), size=min(queries, len(vectors)), replace=False)
+    return vectors, vectors[rows]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="知识库向量降维离线评估")
+    parser.add_argument("--snapshot", type=Path, default=None, help="知识库快照目录，默认使用合成语料")
+    parser.add_argument("--pages", type=int, default=200, help="合成语料每种语言的页数")
+    parser.add_argument("--dims", nargs="+", type=int, default=[768, 512, 256, 128])
+    parser.add_argument("--methods", nargs="+", default=["pca", "truncate"], choices=["pca", "truncate"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--sample-size", type=int, default=5000, help="拟合 PCA 的样本量")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    configure_local_stack(Path(tempfile.mkdtemp(prefix="projection-bench-")))
+    from app.llm.projected_embeddings import EmbeddingProjection
+    from app.services.rag.embedding_projection_service import evaluate_projection
+
+    vectors, queries = (snapshot_vectors(args.snapshot, args.queries, args.seed) if args.snapshot
+                        else synthetic_vectors(args.pages, args.queries, args.seed))
+    print(f"向量数: {len(vectors)}，原始维度: {vectors.shape[1]}，查询数: {len(queries)}，k={args.k}")
+
+    rng = np.random.default_rng(args.seed)
+    sample = vectors[rng.choice(len(vectors), size=min(args.sample_size, len(vectors)), replace=False)]
+    columns = ("recall", "full_ms", "projected_ms", "bytes_per_vector", "memory_ratio")
+    print("case".ljust(16) + "".join(column.rjust(18) for column in columns))
+    for method in args.methods:
+        for dimension in args.dims:
+            name = f"{method}_{dimension}"
+            try:
+                projection = (EmbeddingProjection.fit_pca(sample, dimension) if method == "pca"
+                              else EmbeddingProjection.truncate(vectors.shape[1], dimension))
+            except ValueError as error:
+                print(name.ljust(16) + f"  跳过: {error}")
+                continue
+            result = evaluate_projection(vectors, queries, projection, k=args.k)
+            print(name.ljust(16) + "".join(str(result[column]).rjust(18) for column in columns), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+多进程分片检索基准测试
+
+生成随机向量写成分片，对比单进程精确检索与不同工作进程数的分片检索：并发查询吞吐、结果是否与单进程一致，
+以及工作进程的内存占用（按 /proc/<pid>/smaps_rollup 的 Pss 统计，共享的页缓存按进程数分摊，不会重复计算）。
+不依赖数据库和向量数据库。
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.sharded_search_benchmark
+    python -m benchmarks.sharded_search_benchmark --vectors 500000 --dimension 256 --workers 1 2 4 8
+
+输出指标：
+    qps           并发查询吞吐（次/秒）
+    p50_ms        单次查询耗时中位数（毫秒）
+    match         前 k 个结果与单进程精确检索一致的比例
+    index_mb      分片文件大小（MB）
+    worker_pss_mb 全部工作进程的 Pss 之和（MB），内存共享时应接近 index_mb 而不是 index_mb × 工作进程数
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List
+
+import numpy as np
+
+from benchmarks.local_stack import configure_local_stack
+
+
+def _record_batches(vectors: np.ndarray, batch_size: int = 10000):
+    for start in range(0, len(vectors), batch_size):
+        yield [{"id": f"chunk-{start + offset}", "embedding": vector, "metadata": {"document_id": (start + offset) % 100}}
+               for offset, vector in enumerate(vectors[start:start + batch_size])]
+
+
+def _pss_mb(pids: List[int]) -> float:
+    total_kb = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as rollup:
+                total_kb += next(int(line.split()[1]) for line in rollup if line.startswith("Pss:"))
+        except (FileNotFoundError, StopIteration):
+            continue
+    return round(total_kb / 1024, 1)
+
+
+def run_case(pool, shard_key: str, queries: np.ndarray, k: int, concurrency: int,
+             expected: List[List[str]]) -> Dict[str, Any]:
+    """以 concurrency 个并发客户端逐条提交查询，统计吞吐、耗时和结果一致率"""
+    pool.search(shard_key, queries[:1], k)  # 预热：启动进程并映射分片
+
+    def one(index: int):
+        started = time.perf_counter()
+        hits = pool.search(shard_key, queries[index:index + 1], k)[0]
+        return index, [record_id for record_id, _ in hits], (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(len(queries))))
+    seconds = time.perf_counter() - started
+    matched = sum(len(set(ids) & set(expected[index])) for index, ids, _ in results)
+    return {
+        "qps": round(len(queries) / seconds, 1),
+        "p50_ms": round(statistics.median(latency for _, _, latency in results), 2),
+        "match": round(matched / (len(queries) * k), 4),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="多进程分片检索基准测试")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--workers", nargs="+", type=int, default=None, help="工作进程数，默认 1 到 CPU 核数逐倍增加")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    configure_local_stack(Path(tempfile.mkdtemp(prefix="sharded-search-bench-")))
+    from app.vector_store.sharded_search import ShardedSearchPool, build_shards, get_shard_root, search_segment
+
+    cpu_count = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({2 ** power for power in range(cpu_count.bit_length())} | {cpu_count})
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.standard_normal((args.vectors, args.dimension), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dimension), dtype=np.float32)
+    print(f"向量数: {args.vectors}，维度: {args.dimension}，查询数: {args.queries}，k={args.k}，CPU 核数: {cpu_count}")
+
+    # 基准：单个分片段在当前进程内精确检索
+    baseline_manifest = build_shards("baseline", _record_batches(vectors), 1)
+    baseline_dir = str(get_shard_root("baseline") / baseline_manifest["build_id"])
+    expected, latencies = [], []
+    started = time.perf_counter()
+    for index in range(len(queries)):
+        query_started = time.perf_counter()
+        _, rows = search_segment(baseline_dir, 0, args.vectors, args.dimension, queries[index:index + 1], args.k)
+        latencies.append((time.perf_counter() - query_started) * 1000)
+        expected.append([f"chunk-{row}" for row in rows[0]])
+    baseline_qps = round(len(queries) / (time.perf_counter() - started), 1)
+
+    index_mb = round(vectors.nbytes / 1024 / 1024, 1)
+    columns = ("qps", "p50_ms", "match", "index_mb", "worker_pss_mb")
+    print("case".ljust(16) + "".join(column.rjust(16) for column in columns))
+    baseline = {"qps": baseline_qps, "p50_ms": round(statistics.median(latencies), 2), "match": 1.0,
+                "index_mb": index_mb, "worker_pss_mb": "-"}
+    print("single_process".ljust(16) + "".join(str(baseline[column]).rjust(16) for column in columns), flush=True)
+
+    for workers in worker_counts:
+        shard_key = f"workers_{workers}"
+        build_shards(shard_key, _record_batches(vectors), workers)
+        pool = ShardedSearchPool(workers)
+        try:
+            result = run_case(pool, shard_key, queries, args.k, concurrency=workers * 2, expected=expected)
+            result["index_mb"] = index_mb
+            result["worker_pss_mb"] = _pss_mb(list(pool._get_executor()._processes))
+        finally:
+            pool.shutdown()
+        print(f"shards_{workers}".ljust(16) + "".join(str(result[column]).rjust(16) for column in columns),
+              flush=True)
+        print(f"  吞吐为单进程的 {result['qps'] / baseline_qps:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""
+Chroma 持久化目录维护工具
+
+统计各集合的大小、有效/已删除记录比例和索引健康状态，压缩碎片化的集合，删除孤立段目录并 VACUUM 元数据库。
+压缩分批进行、批间暂停，可在服务运行时执行；批大小和暂停时间见 CHROMA_MAINTENANCE_* 配置。
+
+用法（在 backend 目录下执行）:
+    python -m scripts.chroma_maintenance stats
+    python -m scripts.chroma_maintenance run
+    python -m scripts.chroma_maintenance run --collections kb_3 kb_7 --force --no-vacuum
+    python -m scripts.chroma_maintenance vacuum
+"""
+import argparse
+import json
+import sys
+
+from app.services.rag.chroma_maintenance_service import chroma_maintenance
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Chroma 持久化目录维护")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("stats", help="输出各集合和元数据库的统计")
+
+    run_parser = subparsers.add_parser("run", help="压缩碎片化的集合，删除孤立段目录并 VACUUM 元数据库")
+    run_parser.add_argument("--collections", nargs="+", default=None, help="只处理这些集合")
+    run_parser.add_argument("--force", action="store_true", help="指定集合时忽略碎片化判断，直接压缩")
+    run_parser.add_argument("--no-vacuum", action="store_true", help="不执行 VACUUM")
+
+    subparsers.add_parser("vacuum", help="只对元数据库执行 VACUUM")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        result = chroma_maintenance.collect_stats()
+    elif args.command == "run":
+        result = chroma_maintenance.run(collection_names=args.collections, force=args.force,
+                                        vacuum=not args.no_vacuum)
+    else:
+        result = chroma_maintenance.vacuum()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 1 if result.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
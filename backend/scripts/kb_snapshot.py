@@ -0,0 +1,66 @@
+"""
+知识库快照导出/导入工具
+
+快照包含知识库配置、文档、知识块和原始向量（Parquet），导入时不调用嵌入模型。
+
+用法（在 backend 目录下执行）:
+    python -m scripts.kb_snapshot export 3 /data/snapshots/kb3
+    python -m scripts.kb_snapshot export 3 /data/snapshots/kb3 --no-files
+    python -m scripts.kb_snapshot import /data/snapshots/kb3 --owner-id 1
+    python -m scripts.kb_snapshot import /data/snapshots/kb3 --owner-id 1 --name 产品手册-副本 --vector-db milvus
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from app.core.database import SessionLocal
+from app.models.knowledge import VectorDatabaseType
+from app.services.rag.knowledge_snapshot_service import KnowledgeSnapshotService
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="知识库快照导出/导入")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="导出知识库快照")
+    export_parser.add_argument("knowledge_id", type=int)
+    export_parser.add_argument("output_dir", type=Path)
+    export_parser.add_argument("--batch-size", type=int, default=1000)
+    export_parser.add_argument("--no-files", action="store_true", help="不导出原始文件和解析产物")
+
+    import_parser = subparsers.add_parser("import", help="从快照导入为新的知识库")
+    import_parser.add_argument("snapshot_dir", type=Path)
+    import_parser.add_argument("--owner-id", type=int, required=True)
+    import_parser.add_argument("--name", default=None, help="默认沿用快照中的名称")
+    import_parser.add_argument("--vector-db", choices=[item.value for item in VectorDatabaseType], default=None,
+                               help="默认沿用快照中的向量数据库类型")
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        service = KnowledgeSnapshotService(db_session=db)
+        if args.command == "export":
+            manifest = service.export_snapshot(args.knowledge_id, args.output_dir, batch_size=args.batch_size,
+                                               include_files=not args.no_files)
+            print(json.dumps(manifest, ensure_ascii=False, indent=2))
+        else:
+            knowledge_base = service.import_snapshot(
+                args.snapshot_dir,
+                user_id=args.owner_id,
+                name=args.name,
+                vector_db_type=VectorDatabaseType(args.vector_db) if args.vector_db else None,
+                batch_size=args.batch_size,
+            )
+            print(f"已导入为知识库 {knowledge_base.id}（{knowledge_base.name}, uuid: {knowledge_base.uuid}）")
+    finally:
+        db.close()
+    print(f"耗时: {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
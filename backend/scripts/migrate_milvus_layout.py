@@ -0,0 +1,138 @@
+"""
+Milvus 集合布局迁移工具
+
+将每个知识库独立的 kb_{id} 集合迁移到以 kb_id 为分区键的共享集合，直接复制已有向量，不重新嵌入。
+
+用法（在 backend 目录下执行）:
+    python -m scripts.migrate_milvus_layout                    # 迁移全部 Milvus 知识库
+    python -m scripts.migrate_milvus_layout --knowledge-ids 3 5
+    python -m scripts.migrate_milvus_layout --drop-source      # 校验数量一致后删除原集合
+    python -m scripts.migrate_milvus_layout --bulk             # 以 Milvus 批量导入写入，需配置 MILVUS_BULK_*
+    python -m scripts.migrate_milvus_layout --dry-run
+
+迁移完成后设置 MILVUS_LAYOUT=shared 并重启服务。迁移期间应暂停对相关知识库的写入。
+"""
+import argparse
+import sys
+import time
+from typing import List, Optional, Dict, Any
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.knowledge import KnowledgeBase, KnowledgeDocument, VectorDatabaseType
+from app.vector_store.text_vector_store import TextVectorStore
+
+
+def migrate_knowledge_base(knowledge_id: int, batch_size: int, drop_source: bool,
+                           bulk: bool = False) -> Dict[str, Any]:
+    """
+    迁移单个知识库的向量到共享集合
+
+    目标集合中该知识库的已有数据会先被清除，因此重复执行是安全的。
+
+    Args:
+        knowledge_id: 知识库ID
+        batch_size: 每批复制的记录数量
+        drop_source: 校验通过后是否删除原集合
+        bulk: 是否以批量导入方式写入共享集合
+
+    Returns:
+        迁移结果
+    """
+    started = time.perf_counter()
+    source = TextVectorStore(store_type="milvus", collection_name=f"kb_{knowledge_id}")
+    target = TextVectorStore(store_type="milvus", collection_name=settings.milvus_shared_collection,
+                             knowledge_id=knowledge_id)
+
+    target.delete_by_metadata(field="kb_id", values=[knowledge_id])
+
+    copied_count = 0
+    if bulk:
+        copied_count = target.bulk_import_records(source.iter_records(batch_size=batch_size))
+    else:
+        for records in source.iter_records(batch_size=batch_size):
+            target.add_records(records)
+            copied_count += len(records)
+            logger.info(f"知识库 {knowledge_id} 已复制 {copied_count} 条记录")
+
+    source_count, target_count = source.count(), target.count()
+    verified = source_count == target_count
+    if not verified:
+        logger.error(f"知识库 {knowledge_id} 迁移后数量不一致: 原集合 {source_count}, 共享集合 {target_count}")
+    else:
+        update_vector_path(knowledge_id, settings.milvus_shared_collection)
+        if drop_source and source_count:
+            source.delete_collection()
+            logger.info(f"已删除原集合 kb_{knowledge_id}")
+
+    return {
+        "knowledge_id": knowledge_id,
+        "copied": copied_count,
+        "source_count": source_count,
+        "target_count": target_count,
+        "verified": verified,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def update_vector_path(knowledge_id: int, collection_name: str) -> None:
+    """将知识库下文档记录的向量集合名称更新为共享集合"""
+    db = SessionLocal()
+    try:
+        db.query(KnowledgeDocument).filter(KnowledgeDocument.knowledge_base_id == knowledge_id).update(
+            {KnowledgeDocument.vector_path: collection_name}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def list_milvus_knowledge_ids(knowledge_ids: Optional[List[int]]) -> List[int]:
+    """获取需要迁移的 Milvus 知识库ID"""
+    db = SessionLocal()
+    try:
+        query = db.query(KnowledgeBase.id).filter(
+            KnowledgeBase.vector_db_type == VectorDatabaseType.MILVUS,
+            KnowledgeBase.is_deleted == False
+        )
+        if knowledge_ids:
+            query = query.filter(KnowledgeBase.id.in_(knowledge_ids))
+        return [row[0] for row in query.order_by(KnowledgeBase.id).all()]
+    finally:
+        db.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="将 kb_* 集合迁移到以 kb_id 为分区键的共享集合")
+    parser.add_argument("--knowledge-ids", nargs="+", type=int, default=None, help="默认迁移全部 Milvus 知识库")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--drop-source", action="store_true", help="校验数量一致后删除原集合")
+    parser.add_argument("--bulk", action="store_true", help="以 Milvus 批量导入写入共享集合")
+    parser.add_argument("--dry-run", action="store_true", help="只列出待迁移的知识库")
+    args = parser.parse_args()
+
+    knowledge_ids = list_milvus_knowledge_ids(args.knowledge_ids)
+    print(f"待迁移知识库 {len(knowledge_ids)} 个，目标集合: {settings.milvus_shared_collection}")
+    if args.dry_run:
+        print(knowledge_ids)
+        return 0
+
+    failed = []
+    for knowledge_id in knowledge_ids:
+        result = migrate_knowledge_base(knowledge_id, batch_size=args.batch_size, drop_source=args.drop_source,
+                                        bulk=args.bulk)
+        print(result, flush=True)
+        if not result["verified"]:
+            failed.append(knowledge_id)
+
+    if failed:
+        print(f"\n以下知识库迁移校验失败，请检查后重新执行: {failed}")
+        return 1
+    print("\n迁移完成，请设置 MILVUS_LAYOUT=shared 后重启服务")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())